@@ -0,0 +1,298 @@
+import os
+import math
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib  # fourni par chroma-hnswlib, dépendance de chromadb
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# Index approximatifs disponibles (VECTOR_INDEX) ; "exact" : recherche exhaustive
+ANN_KINDS = ("exact", "ivf", "hnsw")
+
+
+def create_ann_index(kind: str, nlist: int = 0, nprobe: int = 32, ef: int = 128, m: int = 16,
+                     min_chunks: int = 10_000):
+    """Index approximatif demandé, ou None pour la recherche exacte"""
+    if kind == "exact":
+        return None
+    if kind == "ivf":
+        return IVFIndex(nlist=nlist, nprobe=nprobe, min_chunks=min_chunks)
+    if kind == "hnsw":
+        return HNSWIndex(ef=ef, m=m, min_chunks=min_chunks)
+    raise ValueError(f"Index vectoriel inconnu: {kind} (attendu: {', '.join(ANN_KINDS)})")
+
+
+def _top_k(positions: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Les k meilleurs (positions, scores), triés par score décroissant"""
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+        positions, scores = positions[top], scores[top]
+    order = np.argsort(-scores, kind="stable")
+    return positions[order], scores[order]
+
+
+class IVFIndex:
+    """
+    Index IVF (inverted file) en numpy : les vecteurs sont répartis entre nlist centroïdes
+    (k-means sphérique sur un échantillon) et une requête ne score que les chunks des nprobe listes
+    les plus proches. nprobe règle le compromis rappel / vitesse (nprobe = nlist : recherche exacte).
+
+    L'index ne stocke que les centroïdes et la liste de chaque position de la collection : les
+    scores sont calculés sur les vecteurs de la collection (mmap), exacts pour les candidats.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, nlist: int = 0, nprobe: int = 32, min_chunks: int = 10_000,
+                 iterations: int = 10, sample_per_list: int = 64, seed: int = 42):
+        # nlist = 0 : 4 * sqrt(nombre de chunks) au moment de l'entraînement
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_chunks = min_chunks
+        self.iterations = iterations
+        self.sample_per_list = sample_per_list
+        self.seed = seed
+
+        self._centroids: Optional[np.ndarray] = None
+        # position -> liste (-1 : position libre) ; positions triées par liste, recalculées après écriture
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._order: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self.fitted_size = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    def reset(self):
+        """Oublie l'index (collection rechargée depuis le disque)"""
+        self._centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._order = self._offsets = None
+        self.fitted_size = 0
+
+    def needs_fit(self, size: int) -> bool:
+        """Pas encore entraîné, ou collection doublée depuis (centroïdes et nlist à revoir)"""
+        return size >= self.min_chunks and (not self.ready or size >= 2 * self.fitted_size)
+
+    def _nearest(self, vectors: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for offset in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[offset:offset + batch_size], dtype=np.float32)
+            assign[offset:offset + batch_size] = np.argmax(batch @ self._centroids.T, axis=1)
+        return assign
+
+    def fit(self, vectors: np.ndarray):
+        """Entraîne les centroïdes puis affecte toutes les positions [0, len(vectors))"""
+        size = len(vectors)
+        nlist = self.nlist or max(1, int(4 * math.sqrt(size)))
+        nlist = min(nlist, size)
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(size, nlist * self.sample_per_list)
+        sample = np.asarray(vectors[np.sort(rng.choice(size, sample_size, replace=False))], dtype=np.float32)
+
+        self._centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assign = self._nearest(sample)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=nlist)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            filled = counts > 0
+            sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+            centroids = self._centroids.copy()
+            centroids[filled] = sums
+            # Listes vides : réinitialisées sur des points de l'échantillon
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._centroids = (centroids / norms).astype(np.float32)
+
+        self._assign = self._nearest(vectors)
+        self._order = None
+        self.fitted_size = size
+        logger.info(f"🧭 Index IVF entraîné: {size} chunks, {nlist} listes")
+
+    def _ensure_capacity(self, size: int):
+        if size > len(self._assign):
+            grown = np.full(max(size, len(self._assign) * 2), -1, dtype=np.int32)
+            grown[:len(self._assign)] = self._assign
+            self._assign = grown
+
+    def update(self, positions: np.ndarray, vectors: np.ndarray):
+        """(Ré)affecte des positions écrites ou déplacées par la collection"""
+        if not self.ready or not len(positions):
+            return
+        positions = np.asarray(positions)
+        self._ensure_capacity(int(positions.max()) + 1)
+        self._assign[positions] = self._nearest(vectors)
+        self._order = None
+
+    def remove(self, positions: np.ndarray):
+        if not self.ready:
+            return
+        positions = np.asarray(positions)
+        self._assign[positions[positions < len(self._assign)]] = -1
+        self._order = None
+
+    def _lists(self, size: int):
+        """Positions triées par liste et bornes de chaque liste (recalculées après des écritures)"""
+        if self._order is None or self._offsets[-1] != size:
+            self._ensure_capacity(size)
+            assign = self._assign[:size]
+            self._order = np.argsort(assign, kind="stable").astype(np.int32)
+            counts = np.bincount(assign[assign >= 0], minlength=len(self._centroids))
+            free = size - int(counts.sum())
+            self._offsets = free + np.concatenate(([0], np.cumsum(counts)))
+        return self._order, self._offsets
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int,
+               mask: Optional[np.ndarray] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Top-k (positions, scores) parmi les nprobe listes les plus proches de la requête ;
+        None si le filtre laisse moins de k candidats dans ces listes (recherche exacte)
+        """
+        order, offsets = self._lists(len(vectors))
+        nprobe = min(self.nprobe, len(self._centroids))
+        centroid_scores = self._centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([order[offsets[probe]:offsets[probe + 1]] for probe in probes])
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+            if len(candidates) < k:
+                return None
+        if not len(candidates):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        candidates.sort()  # lecture séquentielle du mmap
+        return _top_k(candidates, vectors[candidates] @ query, k)
+
+    def save(self, path: str, size: int):
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, centroids=self._centroids, assign=self._assign[:size],
+                     fitted_size=np.array(self.fitted_size))
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, path: str, size: int, dimension: int):
+        """Charge l'index persisté ; ValueError (index inchangé) s'il ne correspond pas à la collection"""
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            assign = data["assign"].astype(np.int32)
+            fitted_size = int(data["fitted_size"])
+        if len(assign) != size:
+            raise ValueError(f"Index IVF de {len(assign)} positions pour {size} chunks")
+        if centroids.shape[1] != dimension:
+            raise ValueError(f"Index IVF de dimension {centroids.shape[1]} pour des vecteurs de dimension {dimension}")
+        self._centroids, self._assign, self.fitted_size = centroids, assign, fitted_size
+        self._order = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "ready": self.ready, "nlist": 0 if self._centroids is None else len(self._centroids),
+                "nprobe": self.nprobe, "fitted_size": self.fitted_size, "min_chunks": self.min_chunks}
+
+
+class HNSWIndex:
+    """
+    Index HNSW (hnswlib, produit scalaire sur vecteurs normalisés) : les labels sont les positions
+    de la collection, mises à jour en place quand une position est réécrite ou déplacée.
+    ef règle le compromis rappel / vitesse à la recherche, m la connectivité du graphe.
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, ef: int = 128, m: int = 16, ef_construction: int = 100, min_chunks: int = 10_000):
+        if hnswlib is None:
+            raise ImportError("hnswlib est requis pour VECTOR_INDEX=hnsw (pip install chroma-hnswlib)")
+        self.ef = ef
+        self.m = m
+        self.ef_construction = ef_construction
+        self.min_chunks = min_chunks
+        self._index = None
+        self.fitted_size = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._index is not None
+
+    def reset(self):
+        """Oublie l'index (collection rechargée depuis le disque)"""
+        self._index = None
+        self.fitted_size = 0
+
+    def needs_fit(self, size: int) -> bool:
+        return size >= self.min_chunks and not self.ready
+
+    def _new_index(self, dimension: int, capacity: int):
+        index = hnswlib.Index(space="ip", dim=dimension)
+        index.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.m)
+        return index
+
+    def fit(self, vectors: np.ndarray, batch_size: int = 10_000):
+        size = len(vectors)
+        self._index = self._new_index(vectors.shape[1], max(1024, int(size * 1.25)))
+        for offset in range(0, size, batch_size):
+            batch = np.asarray(vectors[offset:offset + batch_size], dtype=np.float32)
+            self._index.add_items(batch, np.arange(offset, offset + len(batch)))
+        self.fitted_size = size
+        logger.info(f"🧭 Index HNSW construit: {size} chunks (M={self.m})")
+
+    def update(self, positions: np.ndarray, vectors: np.ndarray):
+        if not self.ready or not len(positions):
+            return
+        positions = np.asarray(positions)
+        needed = int(positions.max()) + 1
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, self._index.get_max_elements() * 2))
+        # Un label existant (même supprimé) est remplacé et réactivé
+        self._index.add_items(np.asarray(vectors, dtype=np.float32), positions)
+
+    def remove(self, positions: np.ndarray):
+        if not self.ready:
+            return
+        for position in positions:
+            try:
+                self._index.mark_deleted(int(position))
+            except RuntimeError:
+                pass  # label absent ou déjà supprimé
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int,
+               mask: Optional[np.ndarray] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k (positions, scores) ; None si le graphe ne fournit pas k résultats (filtre sélectif)"""
+        self._index.set_ef(max(self.ef, k))
+        label_filter = (lambda label: bool(mask[label])) if mask is not None else None
+        try:
+            # Un seul thread : le filtre est une fonction Python
+            labels, distances = self._index.knn_query(query, k=k, num_threads=1, filter=label_filter)
+        except RuntimeError:
+            return None
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def save(self, path: str, size: int):
+        self._index.save_index(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, path: str, size: int, dimension: int):
+        """Charge l'index persisté ; ValueError (index inchangé) s'il ne correspond pas à la collection"""
+        index = hnswlib.Index(space="ip", dim=dimension)
+        index.load_index(path)
+        labels = np.asarray(index.get_ids_list(), dtype=np.int64)
+        if np.count_nonzero(labels < size) != size:
+            raise ValueError(f"Index HNSW de {np.count_nonzero(labels < size)} positions pour {size} chunks")
+        # Positions au-delà de la collection (libérées par une suppression) : exclues des recherches
+        for label in labels[labels >= size]:
+            try:
+                index.mark_deleted(int(label))
+            except RuntimeError:
+                pass  # déjà supprimée
+        self._index = index
+        self.fitted_size = size
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "ready": self.ready, "ef": self.ef, "m": self.m,
+                "fitted_size": self.fitted_size, "min_chunks": self.min_chunks}
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark des index approximatifs du backend numpy : rappel@10 par rapport à la recherche exacte
+et latence, pour plusieurs valeurs de nprobe (IVF) et de ef (HNSW), sans filtre puis restreintes à
+un tag porté par une petite fraction des chunks (nombre moyen de résultats rendus sur k).
+
+Les embeddings synthétiques imitent la structure d'un corpus réel : des thèmes (centres) de tailles
+inégales, des chunks dispersés autour de leur thème, et des requêtes proches de chunks existants
+sans en être des copies. Les index sont construits et persistés comme par /reload (NumpyCollection).
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from typing import List, Sequence
+
+import numpy as np
+
+from ann_index import create_ann_index
+from numpy_vectorstore import NumpyCollection
+
+
+def generate_vectors(count: int, dimension: int, topics: int, seed: int = 42) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dimension), dtype=np.float32)
+    weights = 1.0 / np.arange(1, topics + 1)
+    assignment = rng.choice(topics, size=count, p=weights / weights.sum())
+    vectors = np.empty((count, dimension), dtype=np.float32)
+    for offset in range(0, count, 50_000):
+        batch = assignment[offset:offset + 50_000]
+        vectors[offset:offset + len(batch)] = centers[batch] + rng.standard_normal((len(batch), dimension), dtype=np.float32)
+    return vectors
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(label: str, collection: NumpyCollection, queries: np.ndarray, expected: List[set], k: int,
+        tags: Sequence[str] = ()):
+    latencies, found, returned = [], 0, 0
+    for query, relevant in zip(queries, expected):
+        start = time.perf_counter()
+        hits = collection.search([query], k, tags)[0]
+        latencies.append(time.perf_counter() - start)
+        found += len(relevant & {document.id for document, _ in hits})
+        returned += len(hits)
+    print(f"{label:>18} | {found / (k * len(queries)):>9.1%} | {returned / len(queries):>9.1f} | "
+          f"{statistics.median(latencies) * 1000:>8.2f} | {percentile(latencies, 0.95) * 1000:>8.2f}")
+
+
+def run_all(collections: dict, queries: np.ndarray, k: int, tags: Sequence[str] = ()):
+    exact = collections["exact"]
+    expected = [{document.id for document, _ in exact.search([query], k, tags)[0]} for query in queries]
+
+    print(f"\n{'recherche':>18} | {'rappel@' + str(k):>9} | {'résultats':>9} | {'p50 (ms)':>8} | {'p95 (ms)':>8}")
+    print("-" * 66)
+    run("exacte", exact, queries, expected, k, tags)
+    ivf = collections["ivf"]
+    for nprobe in (4, 8, 16, 32, 64):
+        ivf._ann.nprobe = nprobe
+        run(f"ivf nprobe={nprobe}", ivf, queries, expected, k, tags)
+    hnsw = collections["hnsw"]
+    for ef in (16, 32, 64, 128, 256):
+        hnsw._ann.ef = ef
+        run(f"hnsw ef={ef}", hnsw, queries, expected, k, tags)
+
+
+def directory_size(path: str, prefix: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.startswith(prefix)) / 1e6
+
+
+def main(count: int, dimension: int, topics: int, queries_count: int, k: int, tagged: float):
+    print(f"🧪 Benchmark index approximatifs - {count} chunks de dimension {dimension}, rappel@{k}")
+    vectors = generate_vectors(count, dimension, topics)
+    ids = [f"catalogue_{i // 50}.md::{i % 50}" for i in range(count)]
+    rng = np.random.default_rng(7)
+    # Tag sélectif porté par une fraction des chunks, répartis au hasard entre les thèmes
+    metadatas = [{"tags": "promo"} if is_tagged else {} for is_tagged in rng.random(count) < tagged]
+    queries = vectors[rng.integers(0, count, queries_count)] + 0.5 * rng.standard_normal((queries_count, dimension), dtype=np.float32)
+
+    tmp = tempfile.mkdtemp()
+    try:
+        collections = {}
+        for kind in ("exact", "ivf", "hnsw"):
+            start = time.perf_counter()
+            collection = NumpyCollection(os.path.join(tmp, kind), ann_index=create_ann_index(kind, min_chunks=0))
+            for offset in range(0, count, 10_000):
+                collection.upsert(ids[offset:offset + 10_000], vectors[offset:offset + 10_000],
+                                  metadatas=metadatas[offset:offset + 10_000])
+            collection.persist()
+            elapsed = time.perf_counter() - start
+            index_size = directory_size(os.path.join(tmp, kind), "ann-")
+            print(f"   {kind:>5}: écriture + index en {elapsed:.1f}s, index sur disque {index_size:.1f} Mo")
+            # Réouverture comme au démarrage d'un worker (index chargé depuis le disque)
+            collections[kind] = NumpyCollection(os.path.join(tmp, kind), ann_index=create_ann_index(kind, min_chunks=0))
+
+        run_all(collections, queries, k)
+        print(f"\n🏷️ Filtre tag 'promo' ({tagged:.0%} des chunks)")
+        run_all(collections, queries, k, ["promo"])
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=2000, help="Nombre de thèmes (centres) du corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--tagged", type=float, default=0.02, help="Fraction des chunks portant le tag filtré")
+    args = parser.parse_args()
+
+    main(args.chunks, args.dimension, args.topics, args.queries, args.k, args.tagged)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test de charge du endpoint /query : handler bloquant (ancien comportement) vs pipeline asynchrone.
+
+Le LLM est remplacé par un faux modèle local à latence configurable et les embeddings par
+des embeddings déterministes : aucun appel réseau n'est effectué. La base ChromaDB du dépôt
+est copiée dans un dossier temporaire, ainsi que la base de sessions.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Any, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench-fake-key")
+
+import httpx
+from fastapi import FastAPI
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import main
+from main import RAGSystem, QueryRequest, QueryResponse
+
+FAKE_ANSWER = '{"template": "centered", "components": [{"type": "Heading", "props": {"children": "Réponse simulée"}}], "templateProps": {}}'
+
+
+class FakeLatencyChatModel(BaseChatModel):
+    """Faux modèle de chat qui simule la latence d'un appel LLM distant"""
+
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=FAKE_ANSWER))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=FAKE_ANSWER))])
+
+
+def build_blocking_app(rag: RAGSystem) -> FastAPI:
+    """Reproduit l'ancien handler : async def qui appelle la version synchrone"""
+    legacy_app = FastAPI()
+
+    @legacy_app.post("/query", response_model=QueryResponse)
+    async def query_knowledge_base(request: QueryRequest):
+        result = rag.query(question=request.query, session_id=request.session_id, max_results=request.max_results)
+        return QueryResponse(**result)
+
+    return legacy_app
+
+
+async def run_load(app: FastAPI, queries: List[str], concurrency: int):
+    """Envoie toutes les requêtes avec un nombre borné de requêtes simultanées"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    llm_calls = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(query: str):
+            nonlocal errors, llm_calls
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/query", json={"query": query})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+                else:
+                    llm_calls += response.json()["metadata"].get("llm_calls", 0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(query) for query in queries))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "rps": len(queries) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "errors": errors,
+        "llm_calls": llm_calls / len(queries)
+    }
+
+
+def print_result(label: str, stats: dict):
+    print(f"{label:<12} | {stats['elapsed']:>7.2f}s | {stats['rps']:>8.1f} req/s | "
+          f"p50 {stats['p50'] * 1000:>8.0f}ms | p95 {stats['p95'] * 1000:>8.0f}ms | "
+          f"appels LLM/req {stats['llm_calls']:.2f} | erreurs {stats['errors']}")
+
+
+def main_bench(requests_count: int, concurrency: int, latency: float, use_cache: bool = False):
+    workdir = tempfile.mkdtemp(prefix="bench_async_")
+    try:
+        chroma_path = os.path.join(workdir, "chroma_langchain_db")
+        shutil.copytree("chroma_langchain_db", chroma_path)
+
+        rag = RAGSystem(
+            llm=FakeLatencyChatModel(latency=latency),
+            embeddings=DeterministicFakeEmbedding(size=1536),
+            chroma_db_path=chroma_path,
+            session_db_path=os.path.join(workdir, "sessions.db")
+        )
+        if not use_cache:
+            # Les requêtes se répètent : sans cela, les caches servent presque toutes les réponses
+            rag.prompt_cache = None
+            rag.semantic_cache.similarity_threshold = float("inf")
+
+        # Mélange de requêtes produit (index de tags) et générales (similarité)
+        queries = [
+            "Quels smartphones sont disponibles ?" if i % 2 == 0 else "Comment fonctionne la garantie sur les commandes livrées ?"
+            for i in range(requests_count)
+        ]
+
+        print("🧪 Test de charge /query")
+        print(f"   requêtes={requests_count}, concurrence={concurrency}, latence LLM simulée={latency * 1000:.0f}ms\n")
+
+        blocking = asyncio.run(run_load(build_blocking_app(rag), queries, concurrency))
+        print_result("bloquant", blocking)
+
+        # Le handler /query de l'application utilise l'instance globale : on la remplace
+        main.rag_system = rag
+        non_blocking = asyncio.run(run_load(main.app, queries, concurrency))
+        print_result("asynchrone", non_blocking)
+
+        print(f"\n✅ Gain de débit: x{non_blocking['rps'] / blocking['rps']:.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="Latence du faux LLM en secondes")
+    parser.add_argument("--cache", action="store_true", help="Garder les caches sémantique et exact actifs")
+    args = parser.parse_args()
+
+    main_bench(args.requests, args.concurrency, args.latency, args.cache)
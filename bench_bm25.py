@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la recherche hybride : rappel@k et latence de la recherche vectorielle seule, de BM25
+seul et de leur fusion RRF, sur un corpus synthétique de fiches produit (100k chunks par défaut).
+
+Deux jeux de requêtes locales, dont le chunk pertinent est connu :
+- noms exacts de produits ("Avez-vous le Dell XPS 13 9340 ?"), le cas qui échoue aujourd'hui ;
+- reformulations partielles de la description d'un produit.
+
+Les descriptions tirent leurs mots d'un vocabulaire de fréquence zipfienne (quelques mots très
+courants, une longue traîne de mots rares), comme un catalogue réel.
+
+Les embeddings sont simulés localement (aucun appel OpenAI) : moyenne de vecteurs aléatoires par
+mot, où les nombres et références alphanumériques partagent --ref-buckets vecteurs, car les modèles
+denses distinguent mal les identifiants proches. Les chiffres de rappel vectoriel dépendent donc
+de cette hypothèse ; ceux de BM25 et la latence sont ceux de l'index réel.
+"""
+
+import argparse
+import random
+import re
+import statistics
+import time
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+BRANDS = {
+    "Dell": ["XPS", "Inspiron", "Latitude", "Vostro"], "Lenovo": ["ThinkPad", "IdeaPad", "Yoga", "Legion"],
+    "HP": ["Spectre", "Envy", "Pavilion", "EliteBook"], "Apple": ["MacBook Air", "MacBook Pro", "iMac"],
+    "Samsung": ["Galaxy S", "Galaxy A", "Galaxy Tab"], "Asus": ["ZenBook", "VivoBook", "ROG"],
+    "Sony": ["Xperia", "WH", "Bravia"], "Acer": ["Swift", "Aspire", "Predator"],
+}
+WORDS = ("ordinateur portable écran tactile batterie autonomie heures processeur mémoire stockage ssd "
+         "léger étudiant professionnel gaming graphique clavier rétroéclairé garantie livraison gratuite "
+         "couleur argent noir bleu poids kilo caméra haute définition son audio réduction bruit "
+         "smartphone appareil photo capteur zoom recharge rapide sans fil tablette stylet bureautique "
+         "création contenu montage vidéo performance silencieux compact robuste élégant aluminium").split()
+SYLLABLES = ("ba be bi bo ca ce ci co da de di do fa fe fi la le li lo ma me mi mo na ne ni no pa pe pi po "
+             "ra re ri ro sa se si so ta te ti to va ve vi vo").split()
+DIM = 128
+
+
+def build_vocabulary(size: int, rng: random.Random) -> Tuple[List[str], np.ndarray]:
+    """Mots du catalogue suivis de pseudo-mots, avec des probabilités zipfiennes (rang^-1)"""
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    probabilities = 1.0 / np.arange(1, size + 1)
+    return words, probabilities / probabilities.sum()
+
+
+def generate_corpus(count: int, vocabulary_size: int = 30_000,
+                    seed: int = 42) -> Tuple[List[str], List[Document], List[str]]:
+    """Fiches produit synthétiques : un nom de produit unique par chunk"""
+    rng = random.Random(seed)
+    words, probabilities = build_vocabulary(vocabulary_size, rng)
+    lengths = [rng.randint(40, 90) for _ in range(count)]
+    draws = np.random.default_rng(seed).choice(len(words), size=sum(lengths), p=probabilities)
+    ids, documents, names = [], [], []
+    brands = list(BRANDS)
+    offset = 0
+    for i in range(count):
+        brand = rng.choice(brands)
+        name = f"{brand} {rng.choice(BRANDS[brand])} {rng.randint(1, 99)} {rng.choice('ABCDEFGHKMPSTXZ')}{rng.randint(100, 9999)}"
+        description = " ".join(words[index] for index in draws[offset:offset + lengths[i]])
+        offset += lengths[i]
+        content = f"### {name}\nPrix : {rng.randint(99, 2999)} €\n{description.capitalize()}."
+        ids.append(f"catalogue_{i // 50}.md::{i % 50}")
+        documents.append(Document(page_content=content, metadata={"source": f"catalogue_{i // 50}.md", "tags": "product"}))
+        names.append(name)
+    return ids, documents, names
+
+
+class LocalEmbeddings:
+    """Embeddings simulés : moyenne normalisée de vecteurs aléatoires stables par mot"""
+
+    def __init__(self, ref_buckets: int):
+        self.ref_buckets = ref_buckets
+        self._cache = {}
+
+    def word_vector(self, word: str) -> np.ndarray:
+        # Nombres et références alphanumériques : quelques vecteurs partagés
+        if any(char.isdigit() for char in word):
+            word = f"<ref{zlib.crc32(word.encode('utf-8')) % self.ref_buckets}>"
+        rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")))
+        return rng.standard_normal(DIM).astype(np.float32)
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(DIM, dtype=np.float32)
+        for word in tokenize(text):
+            cached = self._cache.get(word)
+            if cached is None:
+                cached = self._cache[word] = self.word_vector(word)
+            vector += cached
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def generate_queries(documents: List[Document], names: List[str], count: int, seed: int = 7):
+    """(requête, index du chunk pertinent) : noms exacts puis reformulations partielles"""
+    rng = random.Random(seed)
+    name_queries, description_queries = [], []
+    for _ in range(count):
+        target = rng.randrange(len(documents))
+        template = rng.choice(["Avez-vous le {} ?", "Quel est le prix du {} ?", "{} disponible ?", "fiche {}"])
+        name_queries.append((template.format(names[target]), target))
+        words = re.findall(r"\w+", documents[target].page_content.split("\n", 2)[2])
+        description_queries.append((" ".join(rng.sample(words, min(6, len(words)))), target))
+    return name_queries, description_queries
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def evaluate(label: str, queries, ids: List[str], index: BM25Index, matrix: np.ndarray,
+             embeddings: LocalEmbeddings, k: int):
+    hits = {"vectoriel": 0, "BM25": 0, "hybride (RRF)": 0}
+    bm25_latencies, fusion_latencies = [], []
+    for query, target in queries:
+        scores = matrix @ embeddings.embed(query)
+        top = np.argpartition(-scores, k)[:k]
+        vector_ids = [ids[i] for i in top[np.argsort(-scores[top])]]
+
+        start = time.perf_counter()
+        lexical_ids = [chunk_id for chunk_id, _ in index.search(query, k)]
+        bm25_latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        fused_ids = reciprocal_rank_fusion([vector_ids, lexical_ids], limit=k, key=str)
+        fusion_latencies.append(time.perf_counter() - start)
+
+        hits["vectoriel"] += ids[target] in vector_ids
+        hits["BM25"] += ids[target] in lexical_ids
+        hits["hybride (RRF)"] += ids[target] in fused_ids
+
+    print(f"\n🔎 {label} ({len(queries)} requêtes)")
+    for method, count in hits.items():
+        print(f"   rappel@{k} {method:>14}: {count / len(queries):.1%}")
+    print(f"   latence BM25: p50 {statistics.median(bm25_latencies) * 1000:.2f}ms, "
+          f"p95 {percentile(bm25_latencies, 0.95) * 1000:.2f}ms ; fusion RRF: "
+          f"{statistics.median(fusion_latencies) * 1e6:.0f}µs")
+
+
+def main(chunks: int, queries_count: int, k: int, ref_buckets: int):
+    print(f"🧪 Benchmark recherche hybride - {chunks} chunks, rappel@{k}")
+    ids, documents, names = generate_corpus(chunks)
+
+    index = BM25Index()
+    start = time.perf_counter()
+    for offset in range(0, len(ids), 5000):
+        index.add_documents(ids[offset:offset + 5000], documents[offset:offset + 5000])
+    print(f"   index BM25 construit en {time.perf_counter() - start:.1f}s: {index.get_stats()}")
+
+    embeddings = LocalEmbeddings(ref_buckets)
+    start = time.perf_counter()
+    matrix = np.stack([embeddings.embed(document.page_content) for document in documents])
+    print(f"   embeddings simulés calculés en {time.perf_counter() - start:.1f}s")
+
+    name_queries, description_queries = generate_queries(documents, names, queries_count)
+    evaluate("Noms exacts de produits", name_queries, ids, index, matrix, embeddings, k)
+    evaluate("Reformulations de descriptions", description_queries, ids, index, matrix, embeddings, k)
+
+    # Maintien de l'index : remplacement de 1% des chunks (comme /reload)
+    updated = ids[:chunks // 100]
+    start = time.perf_counter()
+    index.add_documents(updated, documents[:chunks // 100])
+    print(f"\n🔄 Mise à jour de {len(updated)} chunks: {(time.perf_counter() - start) * 1000:.0f}ms")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ref-buckets", type=int, default=64,
+                        help="Vecteurs partagés par les nombres et références dans les embeddings simulés")
+    args = parser.parse_args()
+
+    main(args.chunks, args.queries, args.k, args.ref_buckets)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la construction du contexte des prompts : concaténation des chunks ("\\n\\n".join) vs
+ContextPacker (chevauchement du découpage retiré, budget de tokens contexte + historique).
+
+Les candidats sont ceux de bench_reranker.py (fusion BM25 + tag sur les chunks réels du dossier
+knowledges) ; l'historique simule une longue conversation. Mesure les tokens du contexte, le temps de
+construction avec un cache de comptes de tokens froid puis chaud, et le rappel des chunks pertinents.
+Les comptes sont ceux de tiktoken si l'encodage du modèle est disponible, estimés sinon.
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from bench_reranker import QUERIES, load_chunks
+from context_packer import ContextPacker, TokenCounter
+from tag_index import TagIndex
+
+
+def build_history(turns: int) -> str:
+    lines = []
+    for turn in range(turns):
+        lines.append(f"Utilisateur: Question {turn} sur la livraison et les délais de retour des commandes")
+        lines.append("Assistant: [Réponse JSON générée]")
+    return "\n".join(lines)
+
+
+def main(knowledge_path: str, budget: int, turns: int):
+    ids, documents = load_chunks(Path(knowledge_path))
+    bm25, tags = BM25Index(), TagIndex()
+    bm25.add_documents(ids, documents)
+    tags.add_documents(ids, documents)
+    candidates = [
+        reciprocal_rank_fusion([bm25.search_documents(question, k=10), tags.get(tag, limit=15)], limit=15)
+        for question, tag, _ in QUERIES
+    ]
+    history = build_history(turns)
+
+    counter = TokenCounter()
+    mode = "tiktoken" if counter.exact else "estimation"
+    print(f"🧪 Benchmark contexte - {len(documents)} chunks, {len(QUERIES)} questions, budget {budget} tokens, "
+          f"historique de {turns} tours ({mode})")
+
+    joined = [counter.count("\n\n".join(document.page_content for document in docs)) for docs in candidates]
+    history_tokens = counter.count(history)
+    print(f"\n📄 Concaténation: {statistics.mean(joined):.0f} tokens de contexte + {history_tokens} d'historique")
+
+    for label, packer_budget in (("dédup. seule", 10 ** 9), (f"budget {budget}", budget)):
+        counter = TokenCounter()
+        packer = ContextPacker(counter, budget=packer_budget)
+        timings = {}
+        for run in ("froid", "chaud"):
+            latencies, tokens, kept_relevant, relevant = [], [], 0, 0
+            for (_, _, phrase), docs in zip(QUERIES, candidates):
+                start = time.perf_counter()
+                _, kept, fitted, report = packer.pack(docs, history)
+                latencies.append(time.perf_counter() - start)
+                tokens.append(report["context_tokens"] + report["history_tokens"])
+                relevant += sum(1 for doc in docs if phrase.lower() in doc.page_content.lower())
+                kept_relevant += sum(1 for doc in kept if phrase.lower() in doc.page_content.lower())
+            timings[run] = statistics.median(latencies) * 1000
+        print(f"📦 {label:>13}: {statistics.mean(tokens):.0f} tokens (contexte + historique), "
+              f"{kept_relevant / relevant:.0%} des chunks pertinents, {timings['froid']:.2f}ms cache froid, "
+              f"{timings['chaud']:.2f}ms cache chaud (hit rate {counter.get_stats()['hit_rate']:.0%})")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--knowledges", default="./knowledges")
+    parser.add_argument("--budget", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=40, help="Tours de conversation dans l'historique")
+    args = parser.parse_args()
+
+    main(args.knowledges, args.budget, args.turns)
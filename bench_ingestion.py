@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'ingestion du dossier knowledges : chargement complet (ancien comportement) vs
+pipeline en flux (pool de processus, embeddings concurrents, écritures ChromaDB groupées).
+
+Le corpus est synthétique et les embeddings sont simulés : chaque requête d'embedding coûte
+une latence fixe plus un temps par texte, et un appel sur N textes est découpé en requêtes
+séquentielles de 1000 textes comme le fait OpenAIEmbeddings. Chaque mode tourne dans son
+propre processus pour mesurer le pic mémoire (RSS).
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+WORDS = ("produit prix livraison garantie paiement carte iphone samsung commande retour client "
+         "service catalogue stock disponible remboursement délai adresse facture").split()
+
+
+class LatencyEmbeddings(DeterministicFakeEmbedding):
+    """Embeddings déterministes avec une latence réseau simulée"""
+
+    request_latency: float = 0.05
+    per_text_latency: float = 0.0002
+    request_size: int = 1000
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        for start in range(0, len(texts), self.request_size):
+            time.sleep(self.request_latency + self.per_text_latency * len(texts[start:start + self.request_size]))
+        return super().embed_documents(texts)
+
+
+def generate_corpus(root: Path, files: int, paragraphs: int, seed: int = 42):
+    """Crée des fichiers markdown synthétiques"""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    for i in range(files):
+        name = rng.choice(["product", "faq", "customer", "ecommerce", "notes"])
+        body = "\n\n".join(" ".join(rng.choices(WORDS, k=rng.randint(40, 120))) for _ in range(paragraphs))
+        (root / f"{name}_{i:07d}.md").write_text(f"# Document {i}\n\n{body}\n", encoding="utf-8")
+
+
+def run_legacy(corpus: Path, db_path: str, embeddings) -> dict:
+    """Ancien comportement : tout charger, tout découper, tout embedder en un appel"""
+    from langchain_community.document_loaders import TextLoader, DirectoryLoader
+    from langchain_community.vectorstores import Chroma
+    from ingestion import build_text_splitter, enrich_metadata
+
+    loader = DirectoryLoader(str(corpus), glob="*.md", loader_cls=TextLoader, loader_kwargs={"encoding": "utf-8"})
+    documents = loader.load()
+    texts = enrich_metadata(build_text_splitter().split_documents(documents))
+    # Même limite de lot ChromaDB que le pipeline
+    vectorstore = Chroma(persist_directory=db_path, embedding_function=embeddings)
+    for start in range(0, len(texts), 5000):
+        vectorstore.add_documents(texts[start:start + 5000])
+    return {"chunks": vectorstore._collection.count()}
+
+
+def run_pipeline(corpus: Path, db_path: str, embeddings, workers: int, max_in_flight: int) -> dict:
+    """Pipeline en flux partagé par l'API et le script d'initialisation"""
+    from langchain_community.vectorstores import Chroma
+    from ingestion import IngestionPipeline
+    from knowledge_sync import KnowledgeSync
+
+    vectorstore = Chroma(persist_directory=db_path, embedding_function=embeddings)
+    pipeline = IngestionPipeline(vectorstore, workers=workers, max_in_flight=max_in_flight)
+    sync = KnowledgeSync(vectorstore, corpus, os.path.join(db_path, "kb_manifest.json"), pipeline=pipeline)
+    stats = sync.sync()
+    return {"chunks": vectorstore._collection.count(), "added": stats["added"]}
+
+
+def child(args):
+    """Exécute un mode et imprime ses mesures (JSON sur la dernière ligne)"""
+    embeddings = LatencyEmbeddings(size=args.dim, request_latency=args.latency)
+    db_path = tempfile.mkdtemp(prefix=f"bench_ingestion_{args.mode}_")
+    try:
+        start = time.perf_counter()
+        if args.mode == "legacy":
+            result = run_legacy(Path(args.corpus), db_path, embeddings)
+        else:
+            result = run_pipeline(Path(args.corpus), db_path, embeddings, args.workers, args.max_in_flight)
+        result["elapsed"] = time.perf_counter() - start
+        result["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(json.dumps(result))
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def main(args):
+    print("🧪 Benchmark ingestion - chargement complet vs pipeline en flux")
+    workdir = tempfile.mkdtemp(prefix="bench_ingestion_")
+    try:
+        corpus = Path(workdir) / "knowledges"
+        start = time.perf_counter()
+        generate_corpus(corpus, args.files, args.paragraphs)
+        print(f"   corpus: {args.files} fichiers générés en {time.perf_counter() - start:.1f}s, "
+              f"workers: {args.workers}, requêtes en vol: {args.max_in_flight}\n")
+
+        results = {}
+        for mode in ("legacy", "pipeline"):
+            command = [sys.executable, __file__, "--child", mode, "--corpus", str(corpus),
+                       "--workers", str(args.workers), "--max-in-flight", str(args.max_in_flight),
+                       "--latency", str(args.latency), "--dim", str(args.dim)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+        print(f"{'mode':>10} | {'chunks':>8} | {'durée (s)':>10} | {'chunks/s':>9} | {'pic RSS (Mo)':>12}")
+        print("-" * 62)
+        for mode, result in results.items():
+            print(f"{mode:>10} | {result['chunks']:>8} | {result['elapsed']:>10.2f} | "
+                  f"{result['chunks'] / result['elapsed']:>9.0f} | {result['max_rss_mb']:>12.0f}")
+        print(f"\n   gain: {results['legacy']['elapsed'] / results['pipeline']['elapsed']:.1f}x")
+        print("\n✅ Benchmark terminé")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--paragraphs", type=int, default=6, help="Paragraphes par fichier")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latence simulée par requête d'embedding (s)")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--child", choices=["legacy", "pipeline"], dest="mode", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args)
+    else:
+        main(args)
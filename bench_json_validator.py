@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la validation JSON des réponses : validation après la génération complète
+(comme test_component_structure.py, puis relance) vs validation en flux (JSONGenerationGuard,
+interruption dès que la sortie devient invalide).
+
+Un faux LLM local renvoie les exemples JSON de la base de connaissances fragment par fragment
+(environ un token chacun, avec une latence par fragment), dont une proportion configurable
+est cassée : texte avant le JSON, template inconnu, composant sans type, JSON tronqué.
+Mesure aussi le débit du validateur incrémental comparé à json.loads.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import random
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from json_validator import JSONGenerationGuard, StreamingJSONValidator, validate_ui_json
+
+
+def load_examples() -> List[str]:
+    """Réponses JSON complètes présentes dans la documentation"""
+    examples = []
+    for path in sorted(glob.glob("knowledges/*.md")) + ["example_json_response.md"]:
+        with open(path, "r", encoding="utf-8") as f:
+            for block in re.findall(r"```json\n(.*?)```", f.read(), re.S):
+                if validate_ui_json(block) is None:
+                    examples.append(block.strip())
+    return examples
+
+
+def corrupt(answer: str, rng: random.Random) -> str:
+    """Une sortie invalide typique d'un LLM"""
+    kind = rng.choice(["prose", "template", "type", "truncated"])
+    if kind == "prose":
+        return "Voici l'interface demandée :\n" + answer
+    if kind == "template":
+        return re.sub(r'"template": "[a-z]+"', '"template": "homepage"', answer, count=1)
+    if kind == "type":
+        return re.sub(r'"type": "[A-Za-z]+",', "", answer, count=1)
+    return answer[:int(len(answer) * rng.uniform(0.3, 0.9))] + "\n\nJ'espère que cela vous aide !"
+
+
+class FakeStreamingLLM(BaseChatModel):
+    """Faux modèle qui renvoie sa réponse par fragments de 4 caractères, avec une latence par fragment"""
+
+    answers: List[str]
+    invalid_rate: float = 0.2
+    fragment_latency: float = 0.002
+    seed: int = 42
+    fragments: int = 0
+    _rng: Optional[random.Random] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _answer(self) -> str:
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        answer = self._rng.choice(self.answers)
+        return corrupt(answer, self._rng) if self._rng.random() < self.invalid_rate else answer
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        answer = self._answer()
+        for i in range(0, len(answer), 4):
+            time.sleep(self.fragment_latency)
+            self.fragments += 1
+            yield ChatGenerationChunk(message=AIMessageChunk(content=answer[i:i + 4]))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+def validate_after(llm: FakeStreamingLLM, prompt: str, max_retries: int):
+    """Ancien schéma : génération complète, validation, relance si invalide"""
+    for attempt in range(max_retries + 1):
+        answer = llm.invoke(prompt).content
+        if validate_ui_json(answer) is None:
+            return answer, True, attempt + 1
+    return answer, False, attempt + 1
+
+
+def run(label: str, generate, llm: FakeStreamingLLM, requests_count: int):
+    start = time.perf_counter()
+    invalid = retries = 0
+    for _ in range(requests_count):
+        _, valid, attempts = generate("prompt")
+        invalid += not valid
+        retries += attempts - 1
+    elapsed = time.perf_counter() - start
+    print(f"{label:>22} | {elapsed:>8.2f} | {llm.fragments:>10} | {retries:>8} | {invalid:>9}")
+    return elapsed, llm.fragments
+
+
+def main(requests_count: int, invalid_rate: float, fragment_latency: float, max_retries: int, parse_rounds: int):
+    # Les rejets sont comptés par le benchmark : pas de log par tentative
+    logging.getLogger("json_validator").setLevel(logging.ERROR)
+    examples = load_examples()
+    print("🧪 Benchmark validation JSON - après génération vs en flux")
+    print(f"   {requests_count} requêtes, {len(examples)} réponses types, {invalid_rate:.0%} de sorties invalides, "
+          f"{fragment_latency * 1000:.1f}ms par fragment, {max_retries} relance(s) max\n")
+
+    print(f"{'validation':>22} | {'durée (s)':>8} | {'fragments':>10} | {'relances':>8} | {'invalides':>9}")
+    print("-" * 70)
+    after_llm = FakeStreamingLLM(answers=examples, invalid_rate=invalid_rate, fragment_latency=fragment_latency)
+    after_time, after_fragments = run("après génération", lambda prompt: validate_after(after_llm, prompt, max_retries),
+                                      after_llm, requests_count)
+
+    stream_llm = FakeStreamingLLM(answers=examples, invalid_rate=invalid_rate, fragment_latency=fragment_latency)
+    guard = JSONGenerationGuard(max_retries=max_retries)
+    stream_time, stream_fragments = run("en flux", lambda prompt: guard.invoke(stream_llm, prompt),
+                                        stream_llm, requests_count)
+
+    stats = guard.get_stats()
+    print(f"\n📊 Métriques du validateur: {stats}")
+    print(f"   fragments évités: {after_fragments - stream_fragments} mesurés, {stats['tokens_saved']} estimés "
+          f"({1 - stream_fragments / after_fragments:.1%}), durée x{after_time / stream_time:.2f}")
+
+    # Coût CPU du validateur incrémental
+    text = max(examples, key=len)
+    fragments = [text[i:i + 4] for i in range(0, len(text), 4)]
+    start = time.perf_counter()
+    for _ in range(parse_rounds):
+        validator = StreamingJSONValidator()
+        for fragment in fragments:
+            validator.feed(fragment)
+        validator.close()
+    incremental = (time.perf_counter() - start) / parse_rounds
+    start = time.perf_counter()
+    for _ in range(parse_rounds):
+        json.loads(text)
+    loads = (time.perf_counter() - start) / parse_rounds
+    print(f"\n⏱️ Réponse de {len(text)} caractères en {len(fragments)} fragments: validateur en flux "
+          f"{incremental * 1e6:.0f}µs, json.loads {loads * 1e6:.0f}µs "
+          f"(soit {incremental / len(fragments) * 1e6:.1f}µs par fragment)")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--invalid-rate", type=float, default=0.2, help="Proportion de sorties invalides")
+    parser.add_argument("--fragment-latency", type=float, default=0.002, help="Latence par fragment en secondes")
+    parser.add_argument("--max-retries", type=int, default=1)
+    parser.add_argument("--parse-rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    main(args.requests, args.invalid_rate, args.fragment_latency, args.max_retries, args.parse_rounds)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark du routage des requêtes : anciennes vérifications `any(mot in requête)` liste par liste
+(mots-clés produit, fallback puis listes de scénarios, chaque étape re-minusculant la requête)
+vs QueryRouter (toutes les listes compilées en un KeywordMatcher, une passe par requête).
+
+Rejoue des requêtes synthétiques, vérifie que les intentions reconnues sont identiques et
+affiche les compteurs par intention du routeur.
+"""
+
+import argparse
+import random
+import time
+from typing import List, FrozenSet
+
+from query_router import QueryRouter, DEFAULT_INTENTS
+
+FILLER = ("je voudrais savoir comment est ce que vous pouvez me dire quel est le la les un une des pour "
+          "avec sans mon ma mes votre vos site compte commande délai couleur taille modèle merci svp "
+          "what is the how can i get my account please").split()
+
+
+def legacy_route(query: str) -> FrozenSet[str]:
+    """Ancienne logique : une liste après l'autre, requête re-minusculée à chaque étape"""
+    intents = set()
+    for name, keywords in DEFAULT_INTENTS.items():
+        query_lower = query.lower()
+        if any(keyword in query_lower for keyword in keywords):
+            intents.add(name)
+    return frozenset(intents)
+
+
+def generate_queries(count: int, keyword_rate: float, seed: int = 42) -> List[str]:
+    """Requêtes synthétiques de 3 à 20 mots avec une proportion donnée de mots-clés"""
+    rng = random.Random(seed)
+    keywords = sorted({keyword for group in DEFAULT_INTENTS.values() for keyword in group})
+    # Un pool de requêtes distinctes rejoué, comme un trafic réel
+    pool = []
+    for _ in range(min(count, 50_000)):
+        words = [rng.choice(keywords) if rng.random() < keyword_rate else rng.choice(FILLER)
+                 for _ in range(rng.randint(3, 20))]
+        query = " ".join(words)
+        pool.append(query.capitalize() + rng.choice(["?", " ?", "", "."]))
+    return [pool[i % len(pool)] for i in range(count)]
+
+
+def main(queries_count: int, keyword_rate: float):
+    print("🧪 Benchmark routeur de requêtes - vérifications successives vs KeywordMatcher")
+    queries = generate_queries(queries_count, keyword_rate)
+    print(f"   {len(queries)} requêtes, {keyword_rate:.0%} de mots-clés\n")
+
+    start = time.perf_counter()
+    expected = [legacy_route(query) for query in queries]
+    legacy_time = time.perf_counter() - start
+
+    print(f"{'implémentation':>24} | {'durée (s)':>9} | {'requêtes/s':>11} | {'µs/requête':>10} | identique")
+    print("-" * 78)
+    print(f"{'ancienne logique':>24} | {legacy_time:>9.2f} | {len(queries) / legacy_time:>11.0f} | "
+          f"{legacy_time / len(queries) * 1e6:>10.2f} | -")
+
+    for strategy in ("regex", "substring"):
+        router = QueryRouter(strategy=strategy)
+        route = router.route
+        start = time.perf_counter()
+        results = [route(query) for query in queries]
+        elapsed = time.perf_counter() - start
+        label = f"QueryRouter ({strategy})"
+        print(f"{label:>24} | {elapsed:>9.2f} | {len(queries) / elapsed:>11.0f} | "
+              f"{elapsed / len(queries) * 1e6:>10.2f} | {results == expected}")
+        if strategy == "regex":
+            stats = router.get_stats()
+
+    print(f"\n📊 Compteurs du routeur ({stats['queries']} requêtes, {stats['keywords']} mots-clés)")
+    for name, count in sorted(stats["matches"].items(), key=lambda item: -item[1]):
+        print(f"   {name:>15}: {count:>9} ({count / stats['queries']:.1%})")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=1_000_000)
+    parser.add_argument("--keyword-rate", type=float, default=0.15, help="Proportion de mots-clés dans les requêtes")
+    args = parser.parse_args()
+
+    main(args.queries, args.keyword_rate)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark du reranking des chunks récupérés : tokens de contexte retirés du prompt, chunks pertinents
+conservés et latence du scoring, sur les chunks réels du dossier knowledges.
+
+Pour chaque question, les candidats sont ceux que le chemin hybride met dans le prompt (fusion RRF de
+BM25 et de la récupération par tag, 15 chunks) ; un chunk est pertinent s'il contient l'expression
+attendue (nom du produit, question de la FAQ). Les embeddings ne sont pas utilisés : aucun appel OpenAI.
+Avec --model-path, le cross-encoder ONNX (model.onnx + tokenizer.json) est mesuré en plus.
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+from langchain.schema import Document
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from ingestion import FileTask, prepare_file
+from knowledge_sync import iter_knowledge_files, chunk_id
+from reranker import Reranker, LexicalScorer, CrossEncoderScorer, estimate_tokens
+from tag_index import TagIndex
+
+# (question, tag de la récupération, expression contenue dans les chunks pertinents)
+QUERIES = [
+    ("Avez-vous le Dell XPS 13 ?", "product", "Dell XPS 13"),
+    ("Quel est le prix de l'iPhone 15 Pro ?", "product", "iPhone 15 Pro"),
+    ("Je cherche un Samsung Galaxy S24 Ultra", "product", "Galaxy S24 Ultra"),
+    ("Quels sont les modes de livraison ?", "faq", "modes de livraison"),
+    ("Puis-je retourner un produit ?", "faq", "retourner un produit"),
+    ("Quels moyens de paiement acceptez-vous ?", "faq", "moyens de paiement"),
+    ("J'ai oublié mon mot de passe", "faq", "mot de passe"),
+    ("Comment suivre ma commande ?", "faq", "suivre ma commande"),
+]
+
+
+def load_chunks(knowledge_path: Path):
+    ids, documents = [], []
+    for path in iter_knowledge_files(knowledge_path):
+        stat = path.stat()
+        relpath = path.relative_to(knowledge_path).as_posix()
+        prepared = prepare_file(FileTask(str(path), relpath, stat.st_mtime, stat.st_size))
+        for index, (content, metadata) in enumerate(prepared.chunks):
+            ids.append(chunk_id(relpath, index))
+            documents.append(Document(page_content=content, metadata=metadata))
+    return ids, documents
+
+
+def run(label: str, reranker: Reranker, candidates: List[List[Document]]):
+    latencies, before, after, relevant, kept_relevant = [], 0, 0, 0, 0
+    for (question, _, phrase), documents in zip(QUERIES, candidates):
+        start = time.perf_counter()
+        kept, _ = reranker.rerank(question, documents)
+        latencies.append(time.perf_counter() - start)
+        before += sum(estimate_tokens(document.page_content) for document in documents)
+        after += sum(estimate_tokens(document.page_content) for document in kept)
+        relevant += sum(1 for document in documents if phrase.lower() in document.page_content.lower())
+        kept_relevant += sum(1 for document in kept if phrase.lower() in document.page_content.lower())
+    queries = len(candidates)
+    print(f"{label:>22} | {before / queries:>7.0f} | {after / queries:>7.0f} | {1 - after / before:>8.1%} | "
+          f"{kept_relevant / relevant if relevant else 1:>9.1%} | {statistics.median(latencies) * 1000:>8.2f}")
+
+
+def main(knowledge_path: str, top_n: int, threshold: float, min_keep: int, model_path: str):
+    ids, documents = load_chunks(Path(knowledge_path))
+    bm25, tags = BM25Index(), TagIndex()
+    bm25.add_documents(ids, documents)
+    tags.add_documents(ids, documents)
+    print(f"🧪 Benchmark reranking - {len(documents)} chunks, {len(QUERIES)} questions, "
+          f"top_n={top_n}, seuil={threshold}, min_keep={min_keep}")
+
+    candidates = [
+        reciprocal_rank_fusion([bm25.search_documents(question, k=10), tags.get(tag, limit=15)], limit=15)
+        for question, tag, _ in QUERIES
+    ]
+
+    scorers = [("lexical (idf BM25)", LexicalScorer(bm25)), ("lexical (sans idf)", LexicalScorer())]
+    if model_path:
+        scorers.append(("cross-encoder", CrossEncoderScorer(model_path)))
+
+    print(f"\n{'reranker':>22} | {'tokens':>7} | {'gardés':>7} | {'économie':>8} | {'pertinents':>9} | {'p50 (ms)':>8}")
+    print("-" * 78)
+    for label, scorer in scorers:
+        run(label, Reranker(scorer, top_n=top_n, threshold=threshold, min_keep=min_keep), candidates)
+
+    # Coût du scoring groupé selon le nombre de candidats
+    print()
+    for label, scorer in scorers:
+        for count in (15, 50, 100):
+            pool = (documents * (count // len(documents) + 1))[:count]
+            start = time.perf_counter()
+            for question, _, _ in QUERIES:
+                scorer.score(question, pool)
+            elapsed = (time.perf_counter() - start) / len(QUERIES)
+            print(f"⏱️ {label}: {count} candidats scorés en {elapsed * 1000:.2f}ms")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--knowledges", default="./knowledges")
+    parser.add_argument("--top-n", type=int, default=6)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--min-keep", type=int, default=3)
+    parser.add_argument("--model-path", default="", help="Dossier du cross-encoder ONNX (model.onnx, tokenizer.json)")
+    args = parser.parse_args()
+
+    main(args.knowledges, args.top_n, args.threshold, args.min_keep, args.model_path)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark du cache des sessions actives : accès SQLite d'un tour de conversation (existence,
+premier tour, question, contexte, réponse, puis historique affiché) sans cache et avec le cache LRU
+du SessionManager, sur des conversations déjà longues réparties sur plusieurs sessions actives.
+
+Vérifie aussi la cohérence entre deux workers sur la même base : un second SessionManager écrit
+dans les sessions, le premier doit relire ses messages (version de la session changée).
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from bench_session_context import build_answer
+from session_manager import SessionManager
+
+
+def chat_turn(manager: SessionManager, session_id: str, turn: int) -> float:
+    """Tour complet tel que l'exécutent /query puis l'interface ; retourne la durée des lectures"""
+    start = time.perf_counter()
+    manager.session_exists(session_id)
+    manager.get_session_history(session_id, limit=1)
+    reads = time.perf_counter() - start
+    manager.add_message(session_id, "user", f"Question {turn} sur la livraison")
+    start = time.perf_counter()
+    manager.get_session_context(session_id, max_messages=5)
+    reads += time.perf_counter() - start
+    manager.add_message(session_id, "assistant", build_answer(turn))
+    start = time.perf_counter()
+    manager.get_session_history(session_id, limit=50)
+    return reads + time.perf_counter() - start
+
+
+def run(db_path: str, cache_sessions: int, sessions: int, history: int, turns: int):
+    manager = SessionManager(db_path, cache_sessions=cache_sessions)
+    session_ids = [manager.create_session(f"bench-{i}") for i in range(sessions)]
+    for session_id in session_ids:
+        for turn in range(history):
+            manager.add_message(session_id, "user" if turn % 2 == 0 else "assistant", build_answer(turn))
+    manager.cache.clear()
+
+    rng = random.Random(0)
+    latencies = []
+    start = time.perf_counter()
+    for turn in range(turns):
+        latencies.append(chat_turn(manager, rng.choice(session_ids), turn))
+    elapsed = time.perf_counter() - start
+    stats = manager.cache.get_stats()
+    manager.close()
+    return turns / elapsed, statistics.median(latencies) * 1000, stats
+
+
+def check_workers(db_path: str) -> bool:
+    first, second = SessionManager(db_path), SessionManager(db_path)
+    session_id = first.create_session("workers")
+    first.add_message(session_id, "user", "Bonjour")
+    first.get_session_context(session_id)
+    second.add_message(session_id, "user", "Message du second worker")
+    second.update_session_title(session_id, "Titre du second worker")
+    consistent = (first.get_session_history(session_id, limit=1)[0]["content"] == "Message du second worker"
+                  and first.get_session_info(session_id)["title"] == "Titre du second worker")
+    second.delete_session(session_id)
+    consistent = consistent and not first.session_exists(session_id) and first.get_session_context(session_id) == ""
+    first.close()
+    second.close()
+    return consistent
+
+
+def main(sessions: int, history: int, turns: int, cache_sessions: int):
+    print(f"🧪 Benchmark cache de sessions - {sessions} sessions actives de {history} messages, {turns} tours")
+    print(f"\n{'cache':>14} | {'tours/s':>8} | {'lectures p50 (ms)':>17} | {'hit rate':>8} | évictions")
+    print("-" * 68)
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, size in (("désactivé", 0), (f"{cache_sessions} sessions", cache_sessions)):
+            rate, latency, stats = run(os.path.join(workdir, f"{size}.db"), size, sessions, history, turns)
+            print(f"{label:>14} | {rate:>8.0f} | {latency:>17.3f} | {stats['hit_rate']:>8.1%} | {stats['evictions']}")
+
+        print(f"\n🔀 Cohérence entre deux workers: {'✅' if check_workers(os.path.join(workdir, 'workers.db')) else '❌'}")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="Sessions actives")
+    parser.add_argument("--history", type=int, default=200, help="Messages déjà présents par session")
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--cache-sessions", type=int, default=1000)
+    args = parser.parse_args()
+
+    main(args.sessions, args.history, args.turns, args.cache_sessions)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark du contexte de session envoyé au prompt : ancien calcul (derniers messages relus et
+formatés à chaque requête, réponses JSON longues remplacées par "[Réponse JSON générée]") vs
+contexte glissant précalculé (résumé + derniers messages, mis à jour à l'écriture).
+
+Pour des conversations de plus en plus longues, mesure la taille du contexte, le temps de lecture
+et le nombre de produits présentés par l'assistant encore visibles dans le contexte.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from context_packer import estimate_tokens
+from session_manager import SessionManager
+
+PRODUCTS = [("iPhone 15 Pro", "1229€"), ("Samsung Galaxy S24 Ultra", "1419€"), ("MacBook Air M3", "1299€"),
+            ("Dell XPS 13", "1199€"), ("AirPods Pro", "279€"), ("Magic Keyboard", "109€"),
+            ("iPad Air", "699€"), ("Apple Watch Series 9", "449€")]
+
+
+def build_answer(turn: int) -> str:
+    """Réponse JSON de l'assistant présentant deux produits (plus de 500 caractères)"""
+    cards = [{"type": "ProductCard", "props": {"title": name, "price": price, "image": "/images/product.jpg",
+                                               "description": f"Description détaillée de {name}",
+                                               "className": "shadow-lg rounded-lg"}}
+             for name, price in (PRODUCTS[turn % len(PRODUCTS)], PRODUCTS[(turn + 3) % len(PRODUCTS)])]
+    return json.dumps({
+        "template": "grid",
+        "components": [
+            {"type": "Heading", "props": {"level": 1, "children": f"Sélection n°{turn}", "className": "text-2xl"}},
+            {"type": "Grid", "props": {"cols": 2, "gap": 6, "children": cards}},
+            {"type": "Text", "props": {"children": "Livraison gratuite dès 50€", "className": "mt-6"}}
+        ],
+        "templateProps": {"maxWidth": "lg"}
+    }, ensure_ascii=False)
+
+
+def legacy_context(manager: SessionManager, session_id: str, max_messages: int) -> str:
+    """Ancien get_session_context (derniers messages, dans l'ordre)"""
+    with manager._connection() as conn:
+        rows = conn.execute("""
+            SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?
+        """, (session_id, max_messages)).fetchall()
+    parts = []
+    for role, content in reversed(rows):
+        if role == "user":
+            parts.append(f"Utilisateur: {content}")
+        elif len(content) > 500:
+            parts.append("Assistant: [Réponse JSON générée]")
+        else:
+            parts.append(f"Assistant: {content}")
+    return "\n".join(parts)
+
+
+def measure(read, repeats: int):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        context = read()
+        latencies.append(time.perf_counter() - start)
+    products = sum(1 for name, _ in PRODUCTS if name in context)
+    return estimate_tokens(context), statistics.median(latencies) * 1000, products
+
+
+def main(turns_list, max_messages: int, repeats: int):
+    print(f"🧪 Benchmark contexte de session - {max_messages} derniers messages, {len(PRODUCTS)} produits présentés")
+    print(f"\n{'tours':>6} | {'ancien (tokens)':>15} | {'ancien (ms)':>11} | {'produits':>8} | "
+          f"{'glissant (tokens)':>17} | {'glissant (ms)':>13} | {'produits':>8} | écriture (msg/s)")
+    print("-" * 118)
+
+    for turns in turns_list:
+        with tempfile.TemporaryDirectory() as workdir:
+            manager = SessionManager(os.path.join(workdir, "sessions.db"))
+            session_id = manager.create_session("bench")
+            start = time.perf_counter()
+            for turn in range(turns):
+                product = PRODUCTS[turn % len(PRODUCTS)][0]
+                manager.add_message(session_id, "user", f"Quel est le prix de {product} ? (question {turn})")
+                manager.add_message(session_id, "assistant", build_answer(turn))
+            write_rate = 2 * turns / (time.perf_counter() - start)
+
+            legacy = measure(lambda: legacy_context(manager, session_id, max_messages), repeats)
+            rolling = measure(lambda: manager.get_session_context(session_id, max_messages), repeats)
+            manager.close()
+
+        print(f"{turns:>6} | {legacy[0]:>15} | {legacy[1]:>11.3f} | {legacy[2]:>8} | "
+              f"{rolling[0]:>17} | {rolling[1]:>13.3f} | {rolling[2]:>8} | {write_rate:>10.0f}")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--max-messages", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    main(args.turns, args.max_messages, args.repeats)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la lecture de l'historique d'une session selon sa longueur : ancienne requête
+(ORDER BY timestamp ASC LIMIT sur l'index session_id : tri de toute la session, et premiers messages
+au lieu des derniers), historique complet relu pour en garder la fin, et pagination par curseur sur
+l'index (session_id, id DESC) du SessionManager actuel (dernière page et page au milieu de la session).
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from bench_session_manager import LegacySessionManager
+from session_manager import SessionManager
+
+
+def fill(conn: sqlite3.Connection, session_id: str, other_id: str, messages: int):
+    """Messages de la session mesurée, entrelacés avec ceux d'une autre session"""
+    rows = []
+    for i in range(messages):
+        rows.append((session_id, "user" if i % 2 == 0 else "assistant", f"Message {i} " + "x" * 200, "{}"))
+        rows.append((other_id, "user", f"Autre {i}", "{}"))
+    with conn:
+        conn.executemany("INSERT INTO messages (session_id, role, content, metadata) VALUES (?, ?, ?, ?)", rows)
+
+
+def timed(query, repeats: int) -> float:
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        query()
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+def main(sizes, page: int, repeats: int):
+    print(f"🧪 Benchmark historique de session - pages de {page} messages (médiane de {repeats} lectures)")
+    print(f"\n{'messages':>9} | {'ancien ASC (ms)':>15} | {'tout + fin (ms)':>15} | "
+          f"{'dernière page (ms)':>18} | {'page milieu (ms)':>16}")
+    print("-" * 86)
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            legacy = LegacySessionManager(os.path.join(workdir, "legacy.db"))
+            legacy_id, legacy_other = legacy.create_session(), legacy.create_session()
+            legacy_conn = sqlite3.connect(legacy.db_path)
+            fill(legacy_conn, legacy_id, legacy_other, size)
+
+            manager = SessionManager(os.path.join(workdir, "sessions.db"))
+            session_id, other_id = manager.create_session(), manager.create_session()
+            fill(manager._get_connection(), session_id, other_id, size)
+
+            def legacy_history():
+                legacy_conn.execute("""
+                    SELECT id, timestamp, role, content, metadata FROM messages
+                    WHERE session_id = ? ORDER BY timestamp ASC LIMIT ?
+                """, (legacy_id, page)).fetchall()
+
+            def full_history():
+                legacy_conn.execute("""
+                    SELECT id, timestamp, role, content, metadata FROM messages
+                    WHERE session_id = ? ORDER BY id ASC
+                """, (legacy_id,)).fetchall()[-page:]
+
+            history = manager.get_session_history(session_id, limit=size // 2 + 1)
+            middle_cursor = history[0]["id"]
+            results = (
+                timed(legacy_history, repeats),
+                timed(full_history, max(1, repeats // 10)),
+                timed(lambda: manager.get_session_history(session_id, limit=page), repeats),
+                timed(lambda: manager.get_session_history(session_id, limit=page, before_id=middle_cursor), repeats),
+            )
+            legacy_conn.close()
+            manager.close()
+
+        print(f"{size:>9} | {results[0]:>15.3f} | {results[1]:>15.3f} | {results[2]:>18.3f} | {results[3]:>16.3f}")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=100)
+    args = parser.parse_args()
+
+    main(args.sizes, args.page, args.repeats)
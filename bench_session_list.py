@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la liste des sessions (GET /sessions) selon le nombre de messages stockés : ancienne
+requête (LEFT JOIN messages + COUNT ... GROUP BY sur toute la table des messages, pour 20 sessions)
+et get_sessions du SessionManager actuel (compteurs dénormalisés sur la ligne de la session, index
+(updated_at, id) parcouru à partir du curseur) : première page, page au milieu de la liste et page filtrée.
+
+La base est créée avec l'ancien schéma puis ouverte par le SessionManager : la durée de la migration
+(colonnes ajoutées et compteurs calculés une fois depuis les messages) est aussi mesurée.
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from bench_session_history import timed
+from bench_session_manager import LegacySessionManager
+from session_manager import SessionManager
+from session_store import encode_session_cursor
+
+
+def fill(db_path: str, sessions: int, messages: int):
+    """Sessions de dates de mise à jour distinctes, messages répartis entre elles"""
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO sessions (id, updated_at, title, metadata) VALUES (?, datetime('now', ?), ?, ?)",
+            [(session_id, f"-{index} minutes", f"Session {index}", "{}") for index, session_id in enumerate(session_ids)]
+        )
+        for start in range(0, messages, 100_000):
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, metadata) VALUES (?, ?, ?, ?)",
+                [(session_ids[i % sessions], "user", f"Message {i}", "{}")
+                 for i in range(start, min(start + 100_000, messages))]
+            )
+    conn.close()
+
+
+def main(sizes, sessions: int, page: int, repeats: int):
+    print(f"🧪 Benchmark liste des sessions - {sessions} sessions, pages de {page} (médiane de {repeats} lectures)")
+    print(f"\n{'messages':>9} | {'ancien GROUP BY (ms)':>20} | {'migration (s)':>13} | {'1re page (ms)':>13} | "
+          f"{'page milieu (ms)':>16} | {'filtrée (ms)':>12}")
+    print("-" * 100)
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            db_path = os.path.join(workdir, "sessions.db")
+            LegacySessionManager(db_path)
+            fill(db_path, sessions, size)
+
+            conn = sqlite3.connect(db_path)
+
+            def legacy_list():
+                conn.execute("""
+                    SELECT s.id, s.created_at, s.updated_at, s.title, s.metadata,
+                           COUNT(m.id) as message_count
+                    FROM sessions s
+                    LEFT JOIN messages m ON s.id = m.session_id
+                    GROUP BY s.id, s.created_at, s.updated_at, s.title, s.metadata
+                    ORDER BY s.updated_at DESC
+                    LIMIT ?
+                """, (page,)).fetchall()
+
+            legacy = timed(legacy_list, max(1, repeats // 10))
+            expected = {row[0]: row[5] for row in conn.execute("""
+                SELECT s.id, s.created_at, s.updated_at, s.title, s.metadata, COUNT(m.id)
+                FROM sessions s LEFT JOIN messages m ON s.id = m.session_id GROUP BY s.id
+            """)}
+            conn.close()
+
+            start = time.perf_counter()
+            manager = SessionManager(db_path)
+            migration = time.perf_counter() - start
+
+            listed = manager.get_sessions(limit=sessions)
+            assert all(session["message_count"] == expected[session["id"]] for session in listed)
+            middle_cursor = encode_session_cursor(listed[len(listed) // 2])
+            results = (
+                timed(lambda: manager.get_sessions(limit=page), repeats),
+                timed(lambda: manager.get_sessions(limit=page, cursor=middle_cursor), repeats),
+                timed(lambda: manager.get_sessions(limit=page, title="Session 1", min_messages=1), repeats),
+            )
+            manager.close()
+
+        print(f"{size:>9} | {legacy:>20.3f} | {migration:>13.2f} | {results[0]:>13.3f} | "
+              f"{results[1]:>16.3f} | {results[2]:>12.3f}")
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--sessions", type=int, default=5_000)
+    parser.add_argument("--page", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=100)
+    args = parser.parse_args()
+
+    main(args.sizes, args.sessions, args.page, args.repeats)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark du stockage des sessions : messages/seconde avec plusieurs écrivains concurrents.
+
+Compare l'ancienne conception (une connexion SQLite par appel, journal par défaut,
+vérification d'existence dans une connexion séparée) au SessionManager actuel
+(connexions persistantes par thread, WAL, pragmas ajustés, group commit des messages).
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Any
+
+from session_manager import SessionManager
+
+
+class LegacySessionManager:
+    """Copie de l'ancienne implémentation : une connexion par opération"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    title TEXT,
+                    metadata TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    metadata TEXT,
+                    FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp)")
+
+    def create_session(self, title: str = None) -> str:
+        session_id = str(uuid.uuid4())
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("INSERT INTO sessions (id, title, metadata) VALUES (?, ?, ?)", (session_id, title, "{}"))
+        return session_id
+
+    def session_exists(self, session_id: str) -> bool:
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute("SELECT COUNT(*) FROM sessions WHERE id = ?", (session_id,))
+            return cursor.fetchone()[0] > 0
+
+    def add_message(self, session_id: str, role: str, content: str, metadata: Dict[str, Any] = None) -> int:
+        if not self.session_exists(session_id):
+            raise ValueError(f"Session {session_id} n'existe pas")
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO messages (session_id, role, content, metadata) VALUES (?, ?, ?, ?)",
+                           (session_id, role, content, json.dumps(metadata or {})))
+            cursor.execute("UPDATE sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (session_id,))
+            conn.commit()
+            return cursor.lastrowid
+
+
+def run_writers(manager, writers: int, messages_per_writer: int) -> Dict[str, float]:
+    """Lance plusieurs threads écrivains, chacun sur sa propre session"""
+    session_ids = [manager.create_session(f"bench-{i}") for i in range(writers)]
+    errors = []
+    barrier = threading.Barrier(writers + 1)
+
+    def writer(session_id: str):
+        barrier.wait()
+        for i in range(messages_per_writer):
+            role = "user" if i % 2 == 0 else "assistant"
+            try:
+                manager.add_message(session_id, role, f"Message {i} " + "x" * 200, {"scenario": "bench"})
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(session_id,)) for session_id in session_ids]
+    for thread in threads:
+        thread.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = writers * messages_per_writer - len(errors)
+    return {"elapsed": elapsed, "messages_per_second": total / elapsed, "errors": len(errors)}
+
+
+def main(writers_list, messages_per_writer: int, durability: str):
+    print("🧪 Benchmark SessionManager - écrivains concurrents")
+    print(f"   messages par écrivain: {messages_per_writer}, durabilité: {durability}\n")
+    print(f"{'écrivains':>10} | {'ancien (msg/s)':>15} | {'actuel (msg/s)':>15} | {'gain':>6} | erreurs")
+    print("-" * 68)
+
+    for writers in writers_list:
+        with tempfile.TemporaryDirectory() as workdir:
+            legacy = LegacySessionManager(os.path.join(workdir, "legacy.db"))
+            legacy_stats = run_writers(legacy, writers, messages_per_writer)
+
+            pooled = SessionManager(os.path.join(workdir, "pooled.db"), durability=durability)
+            pooled_stats = run_writers(pooled, writers, messages_per_writer)
+            # En mode async, le temps de vidage fait partie de la mesure
+            start = time.perf_counter()
+            pooled.close()
+            pooled_stats["elapsed"] += time.perf_counter() - start
+            pooled_stats["messages_per_second"] = (writers * messages_per_writer - pooled_stats["errors"]) / pooled_stats["elapsed"]
+
+        speedup = pooled_stats["messages_per_second"] / legacy_stats["messages_per_second"]
+        print(f"{writers:>10} | {legacy_stats['messages_per_second']:>15.0f} | "
+              f"{pooled_stats['messages_per_second']:>15.0f} | {speedup:>5.1f}x | "
+              f"{legacy_stats['errors']}/{pooled_stats['errors']}")
+
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--messages", type=int, default=200, help="Messages par écrivain")
+    parser.add_argument("--durability", choices=["sync", "async"], default="sync")
+    args = parser.parse_args()
+
+    main(args.writers, args.messages, args.durability)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark : récupération par tag via l'index inversé vs scan complet de la collection.
+
+Par défaut la collection est simulée en mémoire : chaque appel à get() reconstruit
+toutes les lignes, comme le fait ChromaDB en désérialisant la collection entière.
+L'option --chroma utilise une vraie collection ChromaDB éphémère (beaucoup plus lente à remplir).
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import List, Dict, Any
+
+from langchain.schema import Document
+
+from tag_index import TagIndex
+
+TAG_POOL = ['general', 'faq', 'support', 'shipping', 'payment', 'pricing', 'warranty', 'ecommerce']
+
+
+class InMemoryCollection:
+    """Collection simulée exposant le sous-ensemble de l'API ChromaDB utilisé par RAGSystem"""
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        self._ids = ids
+        self._documents = documents
+        self._metadatas = metadatas
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get(self, include=None, limit=None, offset=None):
+        start = offset or 0
+        end = start + limit if limit else len(self._ids)
+        # Copie des lignes pour reproduire le coût de désérialisation de ChromaDB
+        return {
+            "ids": list(self._ids[start:end]),
+            "documents": [str(doc) for doc in self._documents[start:end]],
+            "metadatas": [dict(meta) for meta in self._metadatas[start:end]],
+        }
+
+
+def generate_corpus(size: int, product_ratio: float, seed: int = 42):
+    """Génère un corpus synthétique de chunks tagués"""
+    rng = random.Random(seed)
+    ids, documents, metadatas = [], [], []
+    for i in range(size):
+        tags = set(rng.sample(TAG_POOL, 2))
+        if rng.random() < product_ratio:
+            tags.update(['product', 'catalog'])
+        ids.append(f"chunk-{i}")
+        documents.append(f"Chunk {i} " + "lorem ipsum " * 40)
+        metadatas.append({
+            "source": f"knowledges/file_{i % 500}.md",
+            "tags": ','.join(sorted(tags)),
+            "content_type": 'product' if 'product' in tags else 'general'
+        })
+    return ids, documents, metadatas
+
+
+def build_chroma_collection(ids, documents, metadatas):
+    """Remplit une collection ChromaDB éphémère avec des embeddings factices"""
+    import chromadb
+
+    collection = chromadb.EphemeralClient().get_or_create_collection("bench_tag_index")
+    batch_size = 5000
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.add(
+            ids=ids[start:end],
+            documents=documents[start:end],
+            metadatas=metadatas[start:end],
+            embeddings=[[float(i % 7), 1.0, 0.0, 0.0] for i in range(start, min(end, len(ids)))]
+        )
+    return collection
+
+
+def scan_by_tag(collection, tag: str, limit: int) -> List[Document]:
+    """Ancienne implémentation de RAGSystem.get_chunks_by_tag (scan complet)"""
+    results = collection.get(include=["documents", "metadatas"])
+
+    filtered_docs = []
+    for i, metadata in enumerate(results.get('metadatas', [])):
+        if metadata and 'tags' in metadata:
+            if tag in metadata['tags'].split(','):
+                filtered_docs.append(Document(page_content=results['documents'][i], metadata=metadata))
+                if len(filtered_docs) >= limit:
+                    break
+    return filtered_docs
+
+
+def measure(func, repeat: int) -> Dict[str, float]:
+    """Mesure p50/p95 en millisecondes"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    }
+
+
+def run_benchmark(sizes: List[int], repeat: int, limit: int, product_ratio: float, use_chroma: bool):
+    print("🧪 Benchmark index de tags vs scan complet")
+    print(f"   tag='product', limit={limit}, ratio produits={product_ratio:.0%}, répétitions={repeat}")
+    print(f"   backend: {'ChromaDB éphémère' if use_chroma else 'collection simulée en mémoire'}\n")
+    print(f"{'chunks':>10} | {'scan p50':>10} | {'scan p95':>10} | {'index p50':>10} | {'index p95':>10} | {'build':>8} | {'gain':>8}")
+    print("-" * 84)
+
+    for size in sizes:
+        ids, documents, metadatas = generate_corpus(size, product_ratio)
+        if use_chroma:
+            collection = build_chroma_collection(ids, documents, metadatas)
+        else:
+            collection = InMemoryCollection(ids, documents, metadatas)
+
+        index = TagIndex()
+        start = time.perf_counter()
+        index.build_from_collection(collection)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # Vérifier que les deux méthodes renvoient les mêmes chunks
+        expected = [doc.page_content for doc in scan_by_tag(collection, 'product', limit)]
+        actual = [doc.page_content for doc in index.get('product', limit=limit)]
+        if expected != actual:
+            print(f"❌ Résultats divergents pour {size} chunks")
+            return
+
+        scan_stats = measure(lambda: scan_by_tag(collection, 'product', limit), repeat)
+        index_stats = measure(lambda: index.get('product', limit=limit), repeat * 10)
+        speedup = scan_stats["p50"] / max(index_stats["p50"], 1e-6)
+
+        print(f"{size:>10} | {scan_stats['p50']:>8.2f}ms | {scan_stats['p95']:>8.2f}ms | "
+              f"{index_stats['p50']:>8.3f}ms | {index_stats['p95']:>8.3f}ms | {build_ms / 1000:>6.1f}s | {speedup:>7.0f}x")
+
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=15)
+    parser.add_argument("--product-ratio", type=float, default=0.1)
+    parser.add_argument("--chroma", action="store_true", help="Utiliser une vraie collection ChromaDB")
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.repeat, args.limit, args.product_ratio, args.chroma)
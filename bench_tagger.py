@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de l'étiquetage des chunks : ancienne boucle `any(mot in contenu)` par groupe
+de mots-clés vs Tagger (règles de tagging_rules.json compilées en KeywordMatcher).
+
+Vérifie aussi que les tags produits sont identiques à ceux de l'ancienne implémentation, puis
+mesure les deux stratégies du KeywordMatcher quand le nombre de mots-clés augmente ("regex", en une
+passe, est la stratégie par défaut ; "substring" fait un parcours du texte par mot-clé).
+"""
+
+import argparse
+import random
+import string
+import time
+from typing import List, Tuple
+
+from tagger import Tagger, KeywordMatcher, DEFAULT_RULES_PATH
+
+FILLER = ("le la les des une commande client service catalogue stock disponible remboursement délai "
+          "adresse facture bonjour merci question réponse informations détails article taille couleur "
+          "modèle produit boutique retour échange compte").split()
+KEYWORDS = ["prix", "price", "€", "euro", "iphone", "samsung", "macbook", "dell", "airpods", "livraison",
+            "delivery", "shipping", "garantie", "warranty", "sav", "paiement", "payment", "carte"]
+FILENAMES = ["product_catalog.md", "faq.md", "customer_service.md", "ecommerce_knowledge.md", "notes.md"]
+
+
+def legacy_tags(source_file: str, content: str) -> Tuple[List[str], str]:
+    """Copie de l'ancienne boucle de main.py / init_knowledge_base.py"""
+    content = content.lower()
+    tags = []
+    if 'product' in source_file or 'catalog' in source_file:
+        tags.extend(['product', 'catalog'])
+    if 'ecommerce' in source_file:
+        tags.extend(['ecommerce', 'general'])
+    if 'faq' in source_file:
+        tags.extend(['faq', 'support'])
+    if 'customer' in source_file:
+        tags.extend(['customer_service', 'support'])
+    if any(word in content for word in ['prix', 'price', '€', 'euro']):
+        tags.append('pricing')
+    if any(word in content for word in ['iphone', 'samsung', 'macbook', 'dell', 'airpods']):
+        tags.extend(['product', 'electronics'])
+    if any(word in content for word in ['livraison', 'delivery', 'shipping']):
+        tags.append('shipping')
+    if any(word in content for word in ['garantie', 'warranty', 'sav']):
+        tags.append('warranty')
+    if any(word in content for word in ['paiement', 'payment', 'carte']):
+        tags.append('payment')
+    unique_tags = sorted(set(tags))
+    return (unique_tags or ['general']), ('product' if 'product' in tags else 'general')
+
+
+def generate_chunks(count: int, chunk_chars: int, keyword_rate: float, seed: int = 42) -> List[Tuple[str, str]]:
+    """Chunks synthétiques (nom de fichier, contenu) avec une proportion donnée de mots-clés"""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        words = []
+        length = 0
+        while length < chunk_chars:
+            word = rng.choice(KEYWORDS) if rng.random() < keyword_rate else rng.choice(FILLER)
+            if rng.random() < 0.1:
+                word = word.capitalize()
+            words.append(word)
+            length += len(word) + 1
+        chunks.append((rng.choice(FILENAMES), " ".join(words)))
+    return chunks
+
+
+def timed(function, items) -> Tuple[float, list]:
+    start = time.perf_counter()
+    results = [function(*item) for item in items]
+    return time.perf_counter() - start, results
+
+
+def main(chunks_count: int, chunk_chars: int, keyword_rate: float, scaling_texts: int):
+    print("🧪 Microbenchmark tagger - ancienne boucle vs KeywordMatcher")
+    chunks = generate_chunks(chunks_count, chunk_chars, keyword_rate)
+    print(f"   {len(chunks)} chunks de ~{chunk_chars} caractères, {keyword_rate:.0%} de mots-clés\n")
+
+    legacy_time, expected = timed(legacy_tags, chunks)
+    print(f"{'implémentation':>22} | {'durée (s)':>9} | {'chunks/s':>10} | identique")
+    print("-" * 60)
+    print(f"{'ancienne boucle':>22} | {legacy_time:>9.2f} | {len(chunks) / legacy_time:>10.0f} | -")
+
+    tagger = Tagger.from_file(DEFAULT_RULES_PATH)
+    for strategy in ("regex", "substring"):
+        tagger._content_matcher = KeywordMatcher([rule["keywords"] for rule in tagger.content_rules], strategy)
+        elapsed, results = timed(tagger.tag, chunks)
+        label = f"Tagger ({strategy})"
+        print(f"{label:>22} | {elapsed:>9.2f} | {len(chunks) / elapsed:>10.0f} | {results == expected}")
+
+    # Passage à l'échelle : groupes de 5 mots-clés aléatoires
+    print(f"\n📈 KeywordMatcher selon le nombre de mots-clés ({scaling_texts} textes)")
+    print(f"{'mots-clés':>10} | {'substring (s)':>13} | {'regex (s)':>9} | identique")
+    print("-" * 50)
+    rng = random.Random(7)
+    texts = [content.lower() for _, content in chunks[:scaling_texts]]
+    alphabet = string.ascii_lowercase + "éè"
+    for keywords in (20, 40, 80, 160, 320):
+        groups = [["".join(rng.choices(alphabet, k=rng.randint(3, 9))) for _ in range(5)] for _ in range(keywords // 5)]
+        # Quelques vrais mots pour avoir des occurrences
+        groups[0] = KEYWORDS[:5]
+        substring = KeywordMatcher(groups, "substring")
+        regex = KeywordMatcher(groups, "regex")
+        substring_time, substring_results = timed(substring.match, [(text,) for text in texts])
+        regex_time, regex_results = timed(regex.match, [(text,) for text in texts])
+        print(f"{keywords:>10} | {substring_time:>13.3f} | {regex_time:>9.3f} | {substring_results == regex_results}")
+
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--keyword-rate", type=float, default=0.01, help="Proportion de mots-clés dans le texte")
+    parser.add_argument("--scaling-texts", type=int, default=20_000)
+    args = parser.parse_args()
+
+    main(args.chunks, args.chunk_chars, args.keyword_rate, args.scaling_texts)
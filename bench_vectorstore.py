@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark des backends de base vectorielle : Chroma (client + SQLite, comme chroma_langchain_db)
+vs NumpyCollection (vecteurs float32 normalisés en mmap, top-k par argpartition).
+
+Mesure, sur des embeddings aléatoires de la dimension de text-embedding-3-small :
+- l'ouverture d'une base existante (démarrage d'un worker) ;
+- la latence d'une recherche top-k, documents et métadonnées compris, avec et sans filtre par tag ;
+- le débit de recherche par lots de requêtes (backend numpy).
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from numpy_vectorstore import NumpyCollection
+from tag_index import tag_fields, tag_filter
+
+TAGS = ["product", "faq", "support", "shipping", "payment", "restaurant"]
+
+
+def generate_rows(count: int, dimension: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dimension), dtype=np.float32)
+    ids = [f"catalogue_{i // 50}.md::{i % 50}" for i in range(count)]
+    documents = [f"Chunk {i} du catalogue" for i in range(count)]
+    metadatas = []
+    for i in range(count):
+        tags = [tag for j, tag in enumerate(TAGS) if i % (j + 2) == 0]
+        metadatas.append({"source": f"catalogue_{i // 50}.md", "tags": ",".join(tags), **tag_fields(tags)})
+    return ids, vectors, documents, metadatas
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(label: str, search: Callable[[np.ndarray], list], queries: np.ndarray):
+    search(queries[0])  # échauffement (pages du mmap, caches du client)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    print(f"{label:>34} | {statistics.median(latencies) * 1000:>8.2f} | {percentile(latencies, 0.95) * 1000:>8.2f}")
+
+
+def main(count: int, dimension: int, queries_count: int, k: int, batch: int):
+    print(f"🧪 Benchmark base vectorielle - {count} chunks de dimension {dimension}, top-{k}")
+    ids, vectors, documents, metadatas = generate_rows(count, dimension)
+    queries = np.random.default_rng(7).standard_normal((queries_count, dimension), dtype=np.float32)
+    tmp = tempfile.mkdtemp()
+    try:
+        import chromadb
+
+        chroma_path = os.path.join(tmp, "chroma")
+        start = time.perf_counter()
+        collection = chromadb.PersistentClient(path=chroma_path).get_or_create_collection("bench_vectorstore")
+        for offset in range(0, count, 5000):
+            collection.upsert(ids=ids[offset:offset + 5000], embeddings=vectors[offset:offset + 5000].tolist(),
+                              documents=documents[offset:offset + 5000], metadatas=metadatas[offset:offset + 5000])
+        chroma_write = time.perf_counter() - start
+
+        numpy_path = os.path.join(tmp, "numpy")
+        start = time.perf_counter()
+        store = NumpyCollection(numpy_path)
+        for offset in range(0, count, 5000):
+            store.upsert(ids[offset:offset + 5000], vectors[offset:offset + 5000],
+                         documents[offset:offset + 5000], metadatas[offset:offset + 5000])
+        store.persist()
+        numpy_write = time.perf_counter() - start
+        print(f"   écriture: chroma {chroma_write:.1f}s, numpy {numpy_write:.1f}s")
+
+        # Démarrage d'un nouveau worker sur une base existante
+        start = time.perf_counter()
+        chroma = chromadb.PersistentClient(path=chroma_path).get_collection("bench_vectorstore")
+        chroma.query(query_embeddings=[queries[0].tolist()], n_results=k)
+        chroma_open = time.perf_counter() - start
+        start = time.perf_counter()
+        store = NumpyCollection(numpy_path)
+        store.search([queries[0]], k)
+        numpy_open = time.perf_counter() - start
+        print(f"   ouverture + première requête: chroma {chroma_open * 1000:.0f}ms, numpy {numpy_open * 1000:.0f}ms\n")
+
+        print(f"{'recherche':>34} | {'p50 (ms)':>8} | {'p95 (ms)':>8}")
+        print("-" * 58)
+        measure("chroma", lambda query: chroma.query(
+            query_embeddings=[query.tolist()], n_results=k, include=["documents", "metadatas", "distances"]), queries)
+        measure("numpy", lambda query: store.search([query], k), queries)
+        measure("chroma (where tag_product)", lambda query: chroma.query(
+            query_embeddings=[query.tolist()], n_results=k, where=tag_filter(["product"]),
+            include=["documents", "metadatas", "distances"]), queries)
+        measure("chroma (tag_product + tag_faq)", lambda query: chroma.query(
+            query_embeddings=[query.tolist()], n_results=k, where=tag_filter(["product", "faq"]),
+            include=["documents", "metadatas", "distances"]), queries)
+        measure("numpy (tag 'product')", lambda query: store.search([query], k, tags=["product"]), queries)
+        measure("numpy (tags 'product'+'faq')", lambda query: store.search([query], k, tags=["product", "faq"]), queries)
+
+        # Un champ booléen par tag : le filtre Chroma retrouve tous les chunks 'product', multi-tags compris
+        # (un filtre sur la chaîne 'tags' ne trouve que les chunks taggés uniquement 'product')
+        by_field = len(chroma.get(where=tag_filter(["product"]), include=[])["ids"])
+        by_string = len(chroma.get(where={"tags": "product"}, include=[])["ids"])
+        print(f"\n🏷️ Chunks 'product': {int(store.tag_mask(['product']).sum())} avec le masque numpy, "
+              f"{by_field} avec le champ tag_product, {by_string} avec le filtre sur la chaîne de tags")
+
+        start = time.perf_counter()
+        for offset in range(0, queries_count, batch):
+            store.search(queries[offset:offset + batch], k)
+        elapsed = time.perf_counter() - start
+        print(f"📦 numpy par lots de {batch}: {queries_count / elapsed:.0f} requêtes/s "
+              f"({elapsed / queries_count * 1000:.2f}ms par requête)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print("\n✅ Benchmark terminé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32, help="Requêtes par lot pour la recherche groupée")
+    args = parser.parse_args()
+
+    main(args.chunks, args.dimension, args.queries, args.k, args.batch)
@@ -0,0 +1,292 @@
+import re
+import math
+import threading
+import unicodedata
+import logging
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Optional, Iterable, Callable, Tuple, Hashable
+
+import numpy as np
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+# Mots vides français / anglais : très fréquents, ils coûtent cher à scorer et n'apportent rien
+STOPWORDS = frozenset("""
+le la les un une des du de d l au aux et ou en dans sur pour par avec sans ce ces cet cette son sa ses
+leur leurs mon ma mes ton ta tes notre nos votre vos je tu il elle on nous vous ils elles qui que quoi
+quel quelle quels quelles est sont être a ont avoir fait faire pas ne plus se s y n c qu j m t
+the a an and or of to in on for with by at from is are be was were it this that these those as
+""".split())
+
+
+def _fold_table() -> Dict[int, str]:
+    """Table de suppression des accents (é -> e, ç -> c...) pour les caractères latins"""
+    table = {}
+    for code in range(0xC0, 0x250):
+        base = unicodedata.normalize("NFKD", chr(code))[0]
+        if base.isascii() and base != chr(code):
+            table[code] = base
+    return table
+
+
+_FOLD = _fold_table()
+
+
+def tokenize(text: str) -> List[str]:
+    """Termes indexés : minuscules sans accents, mots vides et lettres isolées retirés"""
+    text = text.lower()
+    if not text.isascii():
+        text = text.translate(_FOLD)
+    return [token for token in _TOKEN.findall(text)
+            if token not in STOPWORDS and (len(token) > 1 or token.isdigit())]
+
+
+def document_key(document: Document) -> Tuple[str, str]:
+    """Clé d'un chunk pour la fusion : les résultats du retriever LangChain n'ont pas d'id"""
+    return document.metadata.get("source", ""), document.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List[Any]], k: int = 60, limit: Optional[int] = None,
+                           key: Callable[[Any], Hashable] = document_key) -> List[Any]:
+    """
+    Fusion de classements (Reciprocal Rank Fusion) : score = somme des 1 / (k + rang).
+    Les éléments (documents par défaut, ou ids avec key=str) présents dans plusieurs listes
+    sont dédupliqués, la première occurrence est conservée.
+    """
+    scores: Dict[Hashable, float] = {}
+    documents: Dict[Hashable, Any] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            doc_key = key(document)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(doc_key, document)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [documents[doc_key] for doc_key in ordered[:limit]]
+
+
+class BM25Index:
+    """
+    Index lexical BM25 en mémoire, synchronisé avec la collection comme l'index de tags.
+
+    Chaque chunk occupe un emplacement ; les listes de postings (emplacements et fréquences) sont
+    stockées en tableaux compacts. À la première requête sur un terme, ses poids BM25 par chunk sont
+    précalculés en numpy et gardés jusqu'à la prochaine modification de l'index : une requête ne fait
+    plus qu'additionner ces poids, puis le top-k est extrait avec argpartition. Les chunks retirés
+    laissent un emplacement mort, exclu des scores et de la fréquence documentaire, jusqu'au compactage.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, compact_ratio: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+
+        # id -> emplacement ; emplacement -> (id, contenu, métadonnées) ou None si retiré
+        self._slots: Dict[str, int] = {}
+        self._entries: List[Optional[tuple]] = []
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._total_length = 0.0
+        self._dead = 0
+
+        # terme -> (emplacements, fréquences) ; terme -> (emplacements, poids BM25) vidé à chaque modification
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._weights: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._entries = []
+            self._lengths = np.zeros(0, dtype=np.float32)
+            self._live = np.zeros(0, dtype=bool)
+            self._total_length = 0.0
+            self._dead = 0
+            self._postings.clear()
+            self._weights.clear()
+
+    def add_documents(self, ids: List[str], documents: List[Document]):
+        """Ajoute (ou remplace) des chunks"""
+        if len(ids) != len(documents):
+            raise ValueError("Le nombre d'ids ne correspond pas au nombre de documents")
+
+        # Tokenisation hors verrou
+        counts = [Counter(tokenize(document.page_content)) for document in documents]
+        with self._lock:
+            self.remove([chunk_id for chunk_id in ids if chunk_id in self._slots])
+            self._weights.clear()
+            start = len(self._entries)
+            self._grow(start + len(ids))
+            for offset, (chunk_id, document, terms) in enumerate(zip(ids, documents, counts)):
+                slot = start + offset
+                self._slots[chunk_id] = slot
+                self._entries.append((chunk_id, document.page_content, document.metadata or {}))
+                length = sum(terms.values())
+                self._lengths[slot] = length
+                self._live[slot] = True
+                self._total_length += length
+                for term, frequency in terms.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array("i"), array("f"))
+                    postings[0].append(slot)
+                    postings[1].append(frequency)
+
+    def remove(self, ids: Iterable[str]):
+        """Retire des chunks (emplacements marqués morts, compactés au-delà de compact_ratio)"""
+        with self._lock:
+            self._weights.clear()
+            for chunk_id in ids:
+                slot = self._slots.pop(chunk_id, None)
+                if slot is None:
+                    continue
+                self._entries[slot] = None
+                self._live[slot] = False
+                self._total_length -= float(self._lengths[slot])
+                self._dead += 1
+            if self._dead > 1000 and self._dead > self.compact_ratio * len(self._entries):
+                self._compact()
+
+    def _grow(self, size: int):
+        if size <= len(self._lengths):
+            return
+        capacity = max(size, len(self._lengths) * 2, 1024)
+        lengths = np.zeros(capacity, dtype=np.float32)
+        lengths[:len(self._lengths)] = self._lengths
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live
+        self._lengths, self._live = lengths, live
+
+    def _compact(self):
+        """Renumérote les emplacements vivants et filtre les postings (sans retokeniser)"""
+        count = len(self._entries)
+        live = self._live[:count]
+        remap = np.full(count, -1, dtype=np.int32)
+        remap[live] = np.arange(int(live.sum()), dtype=np.int32)
+
+        for term, (slots, frequencies) in list(self._postings.items()):
+            slots = np.frombuffer(slots, dtype=np.int32)
+            frequencies = np.frombuffer(frequencies, dtype=np.float32)
+            keep = live[slots]
+            if not keep.any():
+                del self._postings[term]
+                continue
+            self._postings[term] = (array("i", remap[slots[keep]].tobytes()),
+                                    array("f", frequencies[keep].tobytes()))
+
+        self._entries = [entry for entry in self._entries if entry is not None]
+        self._slots = {entry[0]: slot for slot, entry in enumerate(self._entries)}
+        lengths = self._lengths[:count][live]
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._grow(len(self._entries))
+        self._lengths[:len(lengths)] = lengths
+        self._live[:len(lengths)] = True
+        self._dead = 0
+        logger.info(f"🗜️ Index BM25 compacté: {len(self._entries)} chunks")
+
+    def _term_weights(self, term: str, average_length: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Emplacements vivants du terme et poids BM25 (idf inclus), calculés une fois par version de l'index"""
+        cached = self._weights.get(term)
+        if cached is None:
+            slots, frequencies = self._postings[term]
+            slots = np.array(slots, dtype=np.int32)
+            frequencies = np.array(frequencies, dtype=np.float32)
+            if self._dead:
+                alive = self._live[slots]
+                slots, frequencies = slots[alive], frequencies[alive]
+            documents = len(self._slots)
+            idf = math.log(1 + (documents - len(slots) + 0.5) / (len(slots) + 0.5))
+            norms = self.k1 * (1 - self.b + self.b * self._lengths[slots] / average_length)
+            cached = (slots, (idf * frequencies * (self.k1 + 1) / (frequencies + norms)).astype(np.float32))
+            self._weights[term] = cached
+        return cached
+
+    def idf(self, terms: Iterable[str]) -> Dict[str, float]:
+        """idf BM25 des termes dans l'index ; un terme absent a l'idf d'un terme vu une fois"""
+        with self._lock:
+            documents = len(self._slots)
+            result = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                frequency = len(postings[0]) if postings is not None else 1
+                if postings is not None and self._dead:
+                    frequency = int(self._live[np.frombuffer(postings[0], dtype=np.int32)].sum())
+                result[term] = math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+            return result
+
+    def search(self, query: str, k: int = 10,
+               predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k (id, score) pour la requête ; predicate filtre sur les métadonnées
+        (appliqué aux meilleurs candidats, dans l'ordre des scores)
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms or k <= 0:
+            return []
+
+        with self._lock:
+            documents = len(self._slots)
+            terms = [term for term in query_terms if term in self._postings]
+            if not documents or not terms:
+                return []
+            average_length = self._total_length / documents
+            scores = np.zeros(len(self._entries), dtype=np.float32)
+            for term in terms:
+                slots, weights = self._term_weights(term, average_length)
+                # Chaque emplacement n'apparaît qu'une fois par terme : affectation vectorielle sûre
+                scores[slots] += weights
+
+            # Top-k parmi les seuls chunks contenant au moins un terme
+            candidates = np.flatnonzero(scores)
+            candidate_scores = scores[candidates]
+            window = k if predicate is None else k * 4
+            while True:
+                window = min(window, len(candidates))
+                if window < len(candidates):
+                    top = np.argpartition(-candidate_scores, window - 1)[:window]
+                else:
+                    top = np.arange(len(candidates))
+                top = top[np.argsort(-candidate_scores[top], kind="stable")]
+                results = []
+                for index in top:
+                    entry = self._entries[candidates[index]]
+                    if predicate is not None and not predicate(entry[2]):
+                        continue
+                    results.append((entry[0], float(candidate_scores[index])))
+                    if len(results) == k:
+                        return results
+                if window >= len(candidates):
+                    return results
+                window *= 4
+
+    def get_documents(self, ids: List[str]) -> List[Document]:
+        """Documents indexés correspondant aux ids (ids inconnus ignorés)"""
+        with self._lock:
+            documents = []
+            for chunk_id in ids:
+                slot = self._slots.get(chunk_id)
+                if slot is not None:
+                    _, content, metadata = self._entries[slot]
+                    documents.append(Document(page_content=content, metadata=dict(metadata)))
+            return documents
+
+    def search_documents(self, query: str, k: int = 10,
+                         predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Document]:
+        """Top-k documents pour la requête"""
+        return self.get_documents([chunk_id for chunk_id, _ in self.search(query, k, predicate)])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "chunks": len(self._slots),
+                "terms": len(self._postings),
+                "dead_slots": self._dead,
+                "average_length": round(self._total_length / len(self._slots), 1) if self._slots else 0.0
+            }
@@ -0,0 +1,225 @@
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation du nombre de tokens d'un texte (environ 4 caractères par token)"""
+    return (len(text) + 3) // 4
+
+
+class TokenCounter:
+    """
+    Compte de tokens tiktoken pour le modèle du LLM, avec cache LRU par texte (empreinte du chunk) :
+    les chunks de la base reviennent d'une requête à l'autre et ne sont encodés qu'une fois.
+    L'encodage est chargé à la première utilisation ; s'il est indisponible (tiktoken absent,
+    fichier d'encodage non téléchargeable), le compte est estimé à 4 caractères par token.
+    """
+
+    def __init__(self, model: str = "gpt-4o-mini", max_entries: int = 50_000):
+        self.model = model
+        self.max_entries = max_entries
+        self._encoding = None
+        self._loaded = False
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _load_encoding(self):
+        self._loaded = True
+        if tiktoken is None:
+            logger.warning("⚠️ tiktoken non installé : nombre de tokens estimé")
+            return
+        try:
+            try:
+                name = tiktoken.encoding_name_for_model(self.model)
+            except KeyError:
+                name = "o200k_base"
+            self._encoding = tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.warning(f"⚠️ Encodage tiktoken de {self.model} indisponible, nombre de tokens estimé: {e}")
+
+    @property
+    def exact(self) -> bool:
+        """Comptes tiktoken (False : estimation)"""
+        with self._lock:
+            if not self._loaded:
+                self._load_encoding()
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return tokens
+            self._stats["misses"] += 1
+            if not self._loaded:
+                self._load_encoding()
+            encoding = self._encoding
+
+        tokens = len(encoding.encode(text, disallowed_special=())) if encoding is not None else estimate_tokens(text)
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "model": self.model,
+                "exact": self._encoding is not None if self._loaded else None,
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._cache)
+            }
+
+
+def overlap_length(left: str, right: str, min_overlap: int = 20, max_overlap: int = 400) -> int:
+    """Longueur du plus long suffixe de left qui est aussi un préfixe de right (0 si < min_overlap)"""
+    if len(right) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    tail = left[-max_overlap:]
+    position = tail.find(probe)
+    while position != -1:
+        # Première occurrence : plus long chevauchement possible
+        if right.startswith(tail[position:]):
+            return len(tail) - position
+        position = tail.find(probe, position + 1)
+    return 0
+
+
+class ContextPacker:
+    """
+    Construction du contexte du prompt sous un budget de tokens (contexte + historique de session) :
+
+    - l'historique garde ses messages les plus récents dans la limite de history_share du budget ;
+    - les chunks sont pris dans l'ordre de pertinence (ordre de la récupération) tant qu'ils tiennent
+      dans le reste du budget, un chunk trop long étant sauté au profit des suivants ;
+    - le texte déjà présent dans le contexte est retiré : chunks identiques ou inclus dans un autre,
+      et chevauchement du découpage (chunk_overlap) entre deux chunks voisins d'un même fichier.
+    """
+
+    def __init__(self, counter: TokenCounter, budget: int = 4000, history_share: float = 0.3,
+                 separator: str = "\n\n", min_overlap: int = 20, max_overlap: int = 400):
+        self.counter = counter
+        self.budget = budget
+        self.history_share = history_share
+        self.separator = separator
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "tokens_in": 0, "tokens_out": 0, "chunks_dropped": 0,
+                       "overlap_chars": 0, "history_trimmed": 0}
+
+    def fit_history(self, history: str, budget: int) -> str:
+        """Dernières lignes de l'historique qui tiennent dans le budget"""
+        if not history or self.counter.count(history) <= budget:
+            return history
+        kept, used = [], 0
+        for line in reversed(history.split("\n")):
+            tokens = self.counter.count(line) + 1
+            if used + tokens > budget:
+                break
+            kept.append(line)
+            used += tokens
+        return "\n".join(reversed(kept))
+
+    def _deduplicate(self, text: str, source: str, packed: List[Tuple[str, str]]) -> Optional[str]:
+        """Texte du chunk sans ce qui figure déjà dans le contexte (None si entièrement redondant)"""
+        for packed_source, packed_text in packed:
+            if text in packed_text:
+                return None
+            if packed_source != source:
+                continue
+            # Chunk suivant d'un chunk déjà pris : début commun retiré
+            head = overlap_length(packed_text, text, self.min_overlap, self.max_overlap)
+            if head:
+                text = text[head:].lstrip()
+            # Chunk précédent d'un chunk déjà pris : fin commune retirée
+            tail = overlap_length(text, packed_text, self.min_overlap, self.max_overlap)
+            if tail:
+                text = text[:-tail].rstrip()
+            if not text:
+                return None
+        return text
+
+    def pack(self, documents: Sequence[Document], history: str = "",
+             reserved: int = 0) -> Tuple[str, List[Document], str, Dict[str, Any]]:
+        """
+        Retourne (contexte, documents retenus, historique retenu, rapport). reserved : tokens déjà
+        pris sur le budget (historique inclus dans la question du prompt QA, par exemple)
+        """
+        fitted = self.fit_history(history, int(self.budget * self.history_share))
+        trimmed = fitted != history
+        history = fitted
+        history_tokens = self.counter.count(history)
+        available = self.budget - reserved - history_tokens
+
+        separator_tokens = self.counter.count(self.separator)
+        parts: List[str] = []
+        kept: List[Document] = []
+        packed: List[Tuple[str, str]] = []
+        tokens_in = tokens_out = overlap_chars = 0
+        for document in documents:
+            content = document.page_content
+            tokens_in += self.counter.count(content)
+            text = self._deduplicate(content, document.metadata.get("source", ""), packed)
+            if text is None:
+                overlap_chars += len(content)
+                continue
+            tokens = self.counter.count(text) + (separator_tokens if parts else 0)
+            if tokens_out + tokens > available:
+                continue
+            overlap_chars += len(content) - len(text)
+            parts.append(text)
+            kept.append(document)
+            packed.append((document.metadata.get("source", ""), content))
+            tokens_out += tokens
+
+        report = {
+            "budget": self.budget,
+            "history_tokens": history_tokens,
+            "context_tokens": tokens_out,
+            "tokens_saved": max(0, tokens_in - tokens_out),
+            "chunks": len(kept),
+            "dropped": len(documents) - len(kept),
+            "overlap_chars": overlap_chars
+        }
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["tokens_in"] += tokens_in
+            self._stats["tokens_out"] += tokens_out
+            self._stats["chunks_dropped"] += report["dropped"]
+            self._stats["overlap_chars"] += overlap_chars
+            self._stats["history_trimmed"] += trimmed
+        return self.separator.join(parts), kept, history, report
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "budget": self.budget,
+            "history_share": self.history_share,
+            **stats,
+            "tokens_saved": stats["tokens_in"] - stats["tokens_out"],
+            "token_counter": self.counter.get_stats()
+        }
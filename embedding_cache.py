@@ -0,0 +1,215 @@
+import os
+import sqlite3
+import hashlib
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """
+    Stockage persistant des vecteurs : une matrice float32 par dimension, ajoutée en fin de fichier
+    et lue par memory-mapping, plus un index SQLite clé -> (dimension, ligne).
+    """
+
+    def __init__(self, cache_dir: str = "./embedding_cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # dimension -> matrice mappée (rechargée quand le fichier grandit)
+        self._matrices: Dict[int, np.memmap] = {}
+
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.db"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    dim INTEGER NOT NULL,
+                    row INTEGER NOT NULL
+                )
+            """)
+
+    def _vectors_path(self, dim: int) -> str:
+        return os.path.join(self.cache_dir, f"vectors_{dim}.f32")
+
+    def _row(self, dim: int, row: int) -> np.ndarray:
+        """Lit une ligne de la matrice mappée (verrou déjà acquis)"""
+        matrix = self._matrices.get(dim)
+        if matrix is None or row >= matrix.shape[0]:
+            rows = os.path.getsize(self._vectors_path(dim)) // (dim * 4)
+            matrix = np.memmap(self._vectors_path(dim), dtype=np.float32, mode="r", shape=(rows, dim))
+            self._matrices[dim] = matrix
+        return matrix[row]
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Retourne les vecteurs connus parmi les clés demandées"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, dim, row FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, dim, row in rows:
+                    found[key] = self._row(dim, row).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Ajoute des vecteurs ; la transaction SQLite sert aussi de verrou entre processus"""
+        if not items:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                by_dim: Dict[int, list] = {}
+                for key, vector in items.items():
+                    by_dim.setdefault(len(vector), []).append((key, vector))
+
+                for dim, entries in by_dim.items():
+                    path = self._vectors_path(dim)
+                    first_row = os.path.getsize(path) // (dim * 4) if os.path.exists(path) else 0
+                    matrix = np.asarray([vector for _, vector in entries], dtype=np.float32)
+                    with open(path, "ab") as f:
+                        # Écarte une éventuelle ligne partielle laissée par une écriture interrompue
+                        f.truncate(first_row * dim * 4)
+                        f.write(matrix.tobytes())
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, dim, row) VALUES (?, ?, ?)",
+                        [(key, dim, first_row + i) for i, (key, _) in enumerate(entries)]
+                    )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._matrices.clear()
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe un objet d'embeddings LangChain : chaque texte est adressé par (modèle, sha256(texte)),
+    seuls les textes jamais vus sont envoyés au modèle sous-jacent.
+
+    Seuls les embeddings des documents sont persistés (leur nombre suit la base de connaissances) ;
+    ceux des requêtes, qui suivent le trafic, sont gardés dans un LRU en mémoire de query_cache_size
+    entrées (une requête identique à un document réutilise le vecteur persisté).
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_dir: str = "./embedding_cache", model: Optional[str] = None,
+                 query_cache_size: int = 1024):
+        self.embeddings = embeddings
+        self.model = model or f"{type(embeddings).__name__}:{getattr(embeddings, 'model', '')}"
+        self.store = EmbeddingStore(cache_dir)
+        self.query_cache_size = query_cache_size
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._queries_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "query_evictions": 0}
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{digest}"
+
+    def _lookup(self, texts: List[str]):
+        """Retourne (clés, vecteurs trouvés, textes manquants dédoublonnés)"""
+        keys = [self._key(text) for text in texts]
+        try:
+            found = self.store.get_many(keys)
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture du cache d'embeddings impossible: {e}")
+            found = {}
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        self.stats["hits"] += len(texts) - sum(1 for key in keys if key in missing)
+        self.stats["misses"] += len(missing)
+        return keys, found, missing
+
+    def _save(self, found: Dict[str, List[float]], missing: Dict[str, str], vectors: List[List[float]]):
+        computed = dict(zip(missing.keys(), [list(vector) for vector in vectors]))
+        try:
+            self.store.put_many(computed)
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture dans le cache d'embeddings impossible: {e}")
+        found.update(computed)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            logger.info(f"🔢 Embeddings: {len(missing)} à calculer, {len(texts) - len(missing)} en cache")
+            self._save(found, missing, self.embeddings.embed_documents(list(missing.values())))
+        return [found[key] for key in keys]
+
+    def _query_lookup(self, text: str):
+        """Retourne (clé, vecteur) : LRU des requêtes puis stockage persistant (None si absent des deux)"""
+        key = self._key(text)
+        with self._queries_lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+                self.stats["hits"] += 1
+                return key, vector
+        _, found, _ = self._lookup([text])
+        return key, found.get(key)
+
+    def _query_save(self, key: str, vector: List[float]) -> List[float]:
+        vector = list(vector)
+        if self.query_cache_size <= 0:
+            return vector
+        with self._queries_lock:
+            self._queries[key] = vector
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+                self.stats["query_evictions"] += 1
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        key, vector = self._query_lookup(text)
+        if vector is None:
+            vector = self._query_save(key, self.embeddings.embed_query(text))
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            await asyncio.to_thread(self._save, found, missing, vectors)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key, vector = await asyncio.to_thread(self._query_lookup, text)
+        if vector is None:
+            vector = self._query_save(key, await self.embeddings.aembed_query(text))
+        return vector
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "model": self.model,
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": self.store.count(),
+            "query_entries": len(self._queries),
+            "query_cache_size": self.query_cache_size,
+            "path": self.store.cache_dir
+        }
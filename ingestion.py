@@ -0,0 +1,200 @@
+import os
+import time
+import hashlib
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from tagger import get_default_tagger
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def build_text_splitter(chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> RecursiveCharacterTextSplitter:
+    """Découpeur de texte commun à l'API et au script d'initialisation"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def enrich_metadata(texts: List[Document]) -> List[Document]:
+    """Ajoute les tags et le type de contenu aux métadonnées des chunks (règles de tagging_rules.json)"""
+    return get_default_tagger().tag_documents(texts)
+
+
+class FileTask(NamedTuple):
+    """Fichier à préparer (transmis aux processus de travail)"""
+    path: str
+    relpath: str
+    mtime: float
+    size: int
+    # Hash connu du contenu : si inchangé, le fichier n'est pas redécoupé
+    known_hash: Optional[str] = None
+    chunk_size: int = CHUNK_SIZE
+    chunk_overlap: int = CHUNK_OVERLAP
+
+
+class PreparedFile(NamedTuple):
+    """Résultat de la préparation d'un fichier : chunks (contenu, métadonnées) ou None si inchangé"""
+    task: FileTask
+    sha256: str
+    chunks: Optional[List[Tuple[str, Dict[str, Any]]]]
+
+
+# Découpeurs réutilisés dans chaque processus de travail
+_splitters: Dict[Tuple[int, int], RecursiveCharacterTextSplitter] = {}
+
+
+def prepare_file(task: FileTask) -> PreparedFile:
+    """Lit, découpe et étiquette un fichier (exécuté dans le pool de processus ou de threads)"""
+    with open(task.path, "rb") as f:
+        raw = f.read()
+    file_hash = hashlib.sha256(raw).hexdigest()
+    if task.known_hash == file_hash:
+        return PreparedFile(task, file_hash, None)
+
+    splitter = _splitters.get((task.chunk_size, task.chunk_overlap))
+    if splitter is None:
+        splitter = build_text_splitter(task.chunk_size, task.chunk_overlap)
+        _splitters[(task.chunk_size, task.chunk_overlap)] = splitter
+
+    document = Document(page_content=raw.decode("utf-8"), metadata={"source": task.path})
+    chunks = enrich_metadata(splitter.split_documents([document]))
+    return PreparedFile(task, file_hash, [(chunk.page_content, chunk.metadata) for chunk in chunks])
+
+
+class IngestionPipeline:
+    """
+    Ingestion en flux : préparation des fichiers dans un pool de processus, embeddings par lots
+    envoyés en parallèle (nombre de requêtes en vol borné) et écritures ChromaDB groupées.
+    La mémoire utilisée est bornée par les fenêtres de chaque étape, pas par la taille du corpus.
+
+    processes=False prépare les fichiers dans des threads : à utiliser dans l'API, où les processus
+    spawn réimporteraient le module __main__ (main.py et son RAGSystem) dans chaque processus.
+    """
+
+    def __init__(self, vectorstore, workers: Optional[int] = None, embed_batch_size: int = 256,
+                 max_in_flight: int = 4, write_batch_size: int = 1000, parallel_threshold: int = 32,
+                 log_interval: float = 5.0, processes: bool = True):
+        self.vectorstore = vectorstore
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.processes = processes
+        self.embed_batch_size = embed_batch_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.write_batch_size = write_batch_size
+        # En dessous de ce nombre de fichiers, le coût de démarrage du pool n'est pas rentable
+        self.parallel_threshold = parallel_threshold
+        self.log_interval = log_interval
+
+    def _prepared(self, tasks: List[FileTask]) -> Iterator[PreparedFile]:
+        """Prépare les fichiers dans l'ordre, avec au plus workers * 4 fichiers en cours"""
+        if self.workers <= 1 or len(tasks) < self.parallel_threshold:
+            for task in tasks:
+                yield prepare_file(task)
+            return
+
+        if self.processes:
+            # spawn : un fork d'un processus multi-thread pourrait hériter de verrous tenus
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+        with pool:
+            window = deque()
+            task_iter = iter(tasks)
+            for task in task_iter:
+                window.append(pool.submit(prepare_file, task))
+                if len(window) >= self.workers * 4:
+                    break
+            while window:
+                result = window.popleft().result()
+                next_task = next(task_iter, None)
+                if next_task is not None:
+                    window.append(pool.submit(prepare_file, next_task))
+                yield result
+
+    def run(self, tasks: List[FileTask],
+            on_file: Callable[[PreparedFile], Iterable[Tuple[str, Document]]],
+            on_write: Optional[Callable[[List[str], List[Document]], None]] = None) -> Dict[str, Any]:
+        """
+        Traite les fichiers ; on_file transforme chaque fichier préparé en chunks (id, document)
+        à écrire, on_write est appelé après chaque écriture groupée.
+        """
+        embeddings = self.vectorstore.embeddings
+        collection = self.vectorstore._collection
+        stats = {"files": 0, "chunks_embedded": 0, "chunks_written": 0, "write_batches": 0}
+        start = last_log = time.perf_counter()
+
+        batch: List[Tuple[str, Document]] = []
+        in_flight = deque()
+        write_buffer: List[Tuple[str, Document, List[float]]] = []
+
+        def write():
+            ids = [item[0] for item in write_buffer]
+            docs = [item[1] for item in write_buffer]
+            collection.upsert(
+                ids=ids,
+                embeddings=[item[2] for item in write_buffer],
+                documents=[doc.page_content for doc in docs],
+                metadatas=[doc.metadata for doc in docs]
+            )
+            if on_write is not None:
+                on_write(ids, docs)
+            stats["chunks_written"] += len(ids)
+            stats["write_batches"] += 1
+            write_buffer.clear()
+
+        def drain_one():
+            future, items = in_flight.popleft()
+            vectors = future.result()
+            stats["chunks_embedded"] += len(items)
+            write_buffer.extend((cid, doc, vector) for (cid, doc), vector in zip(items, vectors))
+            if len(write_buffer) >= self.write_batch_size:
+                write()
+
+        def submit(executor):
+            # Place libérée avant l'envoi : max_in_flight lots restent en vol pendant la préparation
+            while len(in_flight) >= self.max_in_flight:
+                drain_one()
+            items = list(batch)
+            batch.clear()
+            in_flight.append((executor.submit(embeddings.embed_documents, [doc.page_content for _, doc in items]), items))
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            for prepared in self._prepared(tasks):
+                stats["files"] += 1
+                batch.extend(on_file(prepared))
+                if len(batch) >= self.embed_batch_size:
+                    submit(executor)
+
+                now = time.perf_counter()
+                if now - last_log >= self.log_interval:
+                    last_log = now
+                    elapsed = now - start
+                    logger.info(
+                        f"⏱️ Ingestion: {stats['files']}/{len(tasks)} fichiers ({stats['files'] / elapsed:.0f}/s), "
+                        f"{stats['chunks_embedded']} chunks embeddés, {stats['chunks_written']} écrits "
+                        f"({stats['chunks_written'] / elapsed:.0f}/s)"
+                    )
+
+            if batch:
+                submit(executor)
+            while in_flight:
+                drain_one()
+            if write_buffer:
+                write()
+
+        elapsed = time.perf_counter() - start
+        stats["duration_ms"] = round(elapsed * 1000, 1)
+        stats["chunks_per_second"] = round(stats["chunks_written"] / elapsed, 1) if elapsed else 0.0
+        return stats
@@ -9,11 +9,14 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 # LangChain imports
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader, DirectoryLoader
-from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 
+from embedding_cache import CachedEmbeddings
+from ingestion import IngestionPipeline
+from knowledge_sync import KnowledgeSync
+from numpy_vectorstore import create_vectorstore, VECTORSTORE_BACKENDS
+from ann_index import create_ann_index
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -33,7 +36,9 @@ def main():
         
         # Configuration des chemins
         knowledge_path = Path("knowledges")
-        chroma_db_path = "./chroma_langchain_db"
+        backend = os.getenv("VECTORSTORE_BACKEND", "chroma")
+        db_path = VECTORSTORE_BACKENDS["chroma"] if backend == "chroma" else \
+            os.getenv("NUMPY_VECTORSTORE_PATH", VECTORSTORE_BACKENDS.get(backend, ""))
         
         # Vérifier que le dossier knowledges existe
         if not knowledge_path.exists():
@@ -41,10 +46,10 @@ def main():
             return
         
         # Supprimer l'ancienne base si elle existe
-        if os.path.exists(chroma_db_path):
+        if os.path.exists(db_path):
             import shutil
-            shutil.rmtree(chroma_db_path)
-            logger.info(f"🗑️ Ancienne base supprimée: {chroma_db_path}")
+            shutil.rmtree(db_path)
+            logger.info(f"🗑️ Ancienne base supprimée: {db_path}")
         
         # Initialiser les embeddings
         logger.info("🔧 Initialisation des embeddings OpenAI...")
@@ -53,108 +58,57 @@ def main():
             model="text-embedding-3-small"
         )
         
-        # Initialiser le text splitter
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        
-        # Charger tous les documents
-        logger.info(f"📁 Chargement des documents depuis {knowledge_path}...")
+        # Les chunks inchangés depuis la dernière indexation ne sont pas ré-embeddés
+        embedding_cache_dir = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+        if embedding_cache_dir != "none":
+            embeddings = CachedEmbeddings(embeddings, cache_dir=embedding_cache_dir)
         
-        # Charger les fichiers markdown et texte
-        loader = DirectoryLoader(
-            str(knowledge_path),
-            glob="*.md",
-            loader_cls=TextLoader,
-            loader_kwargs={"encoding": "utf-8"},
-            show_progress=True
+        # Créer la base vectorielle
+        logger.info(f"🔍 Création de la base vectorielle ({backend})...")
+        ann_index = create_ann_index(
+            os.getenv("VECTOR_INDEX", "exact"),
+            nlist=int(os.getenv("IVF_NLIST", "0")),
+            nprobe=int(os.getenv("IVF_NPROBE", "32")),
+            ef=int(os.getenv("HNSW_EF", "128")),
+            m=int(os.getenv("HNSW_M", "16")),
+            min_chunks=int(os.getenv("ANN_MIN_CHUNKS", "10000"))
         )
+        vectorstore = create_vectorstore(backend, db_path, embeddings, ann_index=ann_index)
+        
+        # Ingestion en flux : lecture/découpe/tags en parallèle, embeddings par lots, écritures groupées
+        logger.info(f"📁 Ingestion des documents depuis {knowledge_path}...")
+        sync = KnowledgeSync(
+            vectorstore,
+            knowledge_path,
+            os.path.join(db_path, "kb_manifest.json"),
+            pipeline=IngestionPipeline(
+                vectorstore,
+                workers=int(os.getenv("INGESTION_WORKERS", str(os.cpu_count() or 1))),
+                max_in_flight=int(os.getenv("INGESTION_MAX_IN_FLIGHT", "4"))
+            )
+        )
+        stats = sync.sync()
         
-        documents = loader.load()
-        logger.info(f"📄 {len(documents)} documents chargés")
-        
-        if not documents:
+        if not stats["files_scanned"]:
             logger.warning("⚠️ Aucun document trouvé")
             return
         
-        # Afficher les fichiers chargés
-        for doc in documents:
-            filename = os.path.basename(doc.metadata.get('source', 'Unknown'))
-            content_length = len(doc.page_content)
-            logger.info(f"  📝 {filename}: {content_length} caractères")
-        
-        # Diviser les documents en chunks avec métadonnées enrichies
-        logger.info("✂️ Division des documents en chunks...")
-        texts = text_splitter.split_documents(documents)
-        
-        # Enrichir les métadonnées avec des tags
-        for text in texts:
-            source_file = os.path.basename(text.metadata.get('source', ''))
-            content = text.page_content.lower()
-            
-            # Ajouter des tags basés sur le contenu et le fichier source
-            tags = []
-            
-            # Tags basés sur le nom du fichier
-            if 'product' in source_file or 'catalog' in source_file:
-                tags.extend(['product', 'catalog'])
-            if 'ecommerce' in source_file:
-                tags.extend(['ecommerce', 'general'])
-            if 'faq' in source_file:
-                tags.extend(['faq', 'support'])
-            if 'customer' in source_file:
-                tags.extend(['customer_service', 'support'])
-            
-            # Tags basés sur le contenu
-            if any(word in content for word in ['prix', 'price', '€', 'euro']):
-                tags.append('pricing')
-            if any(word in content for word in ['iphone', 'samsung', 'macbook', 'dell', 'airpods']):
-                tags.extend(['product', 'electronics'])
-            if any(word in content for word in ['livraison', 'delivery', 'shipping']):
-                tags.append('shipping')
-            if any(word in content for word in ['garantie', 'warranty', 'sav']):
-                tags.append('warranty')
-            if any(word in content for word in ['paiement', 'payment', 'carte']):
-                tags.append('payment')
-            
-            # Ajouter les tags aux métadonnées (convertir en string pour ChromaDB)
-            unique_tags = list(set(tags))  # Supprimer les doublons
-            text.metadata['tags'] = ','.join(unique_tags) if unique_tags else 'general'
-            text.metadata['content_type'] = 'product' if 'product' in tags else 'general'
-        
-        logger.info(f"📦 {len(texts)} chunks créés avec métadonnées enrichies")
-        
-        # Créer la base vectorielle
-        logger.info("🔍 Création de la base vectorielle ChromaDB...")
-        vectorstore = Chroma.from_documents(
-            documents=texts,
-            embedding=embeddings,
-            persist_directory=chroma_db_path
-        )
-        
-        # Persister la base
-        vectorstore.persist()
-        logger.info(f"💾 Base vectorielle sauvegardée dans {chroma_db_path}")
+        ingestion = stats["ingestion"]
+        logger.info(f"📦 {ingestion['chunks_written']} chunks créés avec métadonnées enrichies "
+                    f"({ingestion['chunks_per_second']} chunks/s)")
+        logger.info(f"💾 Base vectorielle sauvegardée dans {db_path}")
         
         # Vérification
         collection = vectorstore._collection
         total_docs = collection.count()
         logger.info(f"✅ Vérification: {total_docs} documents dans la base")
+        if isinstance(embeddings, CachedEmbeddings):
+            cache_stats = embeddings.get_stats()
+            logger.info(f"🔢 Cache d'embeddings: {cache_stats['hits']} hits, {cache_stats['misses']} calculés")
         
         # Statistiques par fichier
         logger.info("\n📊 Statistiques par fichier:")
-        file_stats = {}
-        for text in texts:
-            source = text.metadata.get('source', 'Unknown')
-            filename = os.path.basename(source)
-            if filename not in file_stats:
-                file_stats[filename] = 0
-            file_stats[filename] += 1
-        
-        for filename, count in file_stats.items():
+        for filename, count in sync.file_chunk_counts().items():
             logger.info(f"  📄 {filename}: {count} chunks")
         
         # Test de recherche
@@ -0,0 +1,466 @@
+import re
+import json
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Sequence, Tuple, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+# Templates disponibles (knowledges/JSON_STRUCTURE_GUIDE.md)
+TEMPLATES = ("base", "centered", "grid", "dashboard", "landing")
+
+# Bloc de code markdown toléré autour du JSON (```json ... ```), comme le font les clients
+_FENCE_OPEN = "```json"
+_FENCE_CLOSE = "```"
+
+# Rôle attendu pour chaque valeur du document
+(_ANY, _ROOT, _TEMPLATE, _COMPONENTS, _COMPONENT, _TYPE, _PROPS, _CHILDREN, _CHILD_ITEM, _OBJECT) = range(10)
+
+# Types de valeur autorisés par rôle
+_ALLOWED = {
+    _ANY: {"object", "array", "string", "number", "literal"},
+    _ROOT: {"object"},
+    _TEMPLATE: {"string"},
+    _COMPONENTS: {"array"},
+    _COMPONENT: {"object"},
+    _TYPE: {"string"},
+    _PROPS: {"object"},
+    _CHILDREN: {"string", "number", "object", "array"},
+    _CHILD_ITEM: {"string", "number", "object"},
+    _OBJECT: {"object"},
+}
+
+_EXPECTED = {
+    _ROOT: "la réponse doit être un objet JSON",
+    _TEMPLATE: "« template » doit être une chaîne",
+    _COMPONENTS: "« components » doit être un tableau",
+    _COMPONENT: "chaque composant doit être un objet",
+    _TYPE: "« type » doit être une chaîne",
+    _PROPS: "« props » doit être un objet",
+    _CHILDREN: "« children » doit être un texte, un composant ou un tableau",
+    _CHILD_ITEM: "les éléments de « children » doivent être des textes ou des composants",
+    _OBJECT: "« templateProps » doit être un objet",
+}
+
+# Rôle des valeurs selon la clé, pour chaque rôle d'objet
+_KEY_ROLES = {
+    _ROOT: {"template": _TEMPLATE, "components": _COMPONENTS, "templateProps": _OBJECT},
+    _COMPONENT: {"type": _TYPE, "props": _PROPS},
+    _PROPS: {"children": _CHILDREN},
+}
+
+# Clés obligatoires, vérifiées à la fermeture de l'objet
+_REQUIRED_KEYS = {
+    _ROOT: ("template", "components"),
+    _COMPONENT: ("type",),
+}
+
+# Rôle d'un objet / des éléments d'un tableau selon le rôle de la valeur
+_OBJECT_ROLES = {_ROOT: _ROOT, _COMPONENT: _COMPONENT, _PROPS: _PROPS, _CHILDREN: _COMPONENT, _CHILD_ITEM: _COMPONENT}
+_ITEM_ROLES = {_COMPONENTS: _COMPONENT, _CHILDREN: _CHILD_ITEM}
+
+_VALUE_KINDS = {"{": "object", "[": "array", '"': "string", "t": "literal", "f": "literal", "n": "literal"}
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_LITERAL_CHARS = re.compile(r"[0-9a-zA-Z+\-.]*")
+_STRING_CHARS = re.compile(r'[^"\\\x00-\x1f]*')
+_WHITESPACE = " \t\n\r"
+
+# États de l'analyseur
+(_PREFIX, _VALUE, _ARRAY_START, _OBJECT_START, _KEY, _COLON, _AFTER_VALUE,
+ _STRING, _ESCAPE, _UNICODE, _LITERAL, _SUFFIX) = range(12)
+
+
+class JSONValidationError(ValueError):
+    """Sortie du LLM invalide (syntaxe JSON ou structure des composants)"""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(f"{message} (caractère {position})")
+        self.position = position
+
+
+class StreamingJSONValidator:
+    """
+    Validation incrémentale d'une réponse JSON de composants : les fragments sont analysés au fil
+    de leur arrivée (syntaxe JSON stricte et structure du guide : template, components, type,
+    props, children) et feed() lève JSONValidationError dès le premier caractère invalide.
+    close() vérifie que le document est complet.
+    """
+
+    def __init__(self, templates: Optional[Sequence[str]] = TEMPLATES):
+        self.templates = frozenset(templates) if templates else None
+        self._state = _PREFIX
+        self._role = _ROOT
+        # Pile des conteneurs ouverts : [genre, rôle, clés vues]
+        self._stack: List[list] = []
+        self._key: Optional[str] = None
+        self._buffer: List[str] = []
+        self._string_role: Optional[int] = None
+        self._unicode_left = 0
+        self._affix = ""
+        self._offset = 0
+        self._error: Optional[JSONValidationError] = None
+
+    @property
+    def complete(self) -> bool:
+        return self._state == _SUFFIX
+
+    def feed(self, text: str):
+        if self._error is not None:
+            raise self._error
+        try:
+            self._feed(text)
+        except JSONValidationError as e:
+            self._error = e
+            raise
+        self._offset += len(text)
+
+    def close(self):
+        if self._error is not None:
+            raise self._error
+        if self._state != _SUFFIX:
+            self._error = JSONValidationError("JSON incomplet", self._offset)
+            raise self._error
+
+    def _fail(self, message: str, index: int):
+        raise JSONValidationError(message, self._offset + index)
+
+    def _feed(self, text: str):
+        i, n = 0, len(text)
+        while i < n:
+            state = self._state
+            ch = text[i]
+
+            if state == _STRING:
+                end = _STRING_CHARS.match(text, i).end()
+                if end > i:
+                    if self._string_role is not None:
+                        self._buffer.append(text[i:end])
+                    i = end
+                    continue
+                if ch == '"':
+                    self._end_string(i)
+                elif ch == "\\":
+                    self._state = _ESCAPE
+                else:
+                    self._fail("caractère de contrôle dans une chaîne", i)
+                i += 1
+                continue
+
+            if state == _ESCAPE:
+                if ch == "u":
+                    self._state, self._unicode_left = _UNICODE, 4
+                elif ch in '"\\/bfnrt':
+                    self._state = _STRING
+                else:
+                    self._fail(f"échappement invalide '\\{ch}'", i)
+                if self._string_role is not None:
+                    self._buffer.append("\\" + ch)
+                i += 1
+                continue
+
+            if state == _UNICODE:
+                if ch not in "0123456789abcdefABCDEF":
+                    self._fail("échappement unicode invalide", i)
+                if self._string_role is not None:
+                    self._buffer.append(ch)
+                self._unicode_left -= 1
+                if not self._unicode_left:
+                    self._state = _STRING
+                i += 1
+                continue
+
+            if state == _LITERAL:
+                end = _LITERAL_CHARS.match(text, i).end()
+                self._buffer.append(text[i:end])
+                literal = "".join(self._buffer)
+                if literal[0] in "tfn" and not any(word.startswith(literal) for word in ("true", "false", "null")):
+                    self._fail(f"valeur invalide '{literal}'", i)
+                if end == n:
+                    return
+                # Le caractère suivant termine la valeur : il est traité dans l'état suivant
+                if literal not in ("true", "false", "null") and not _NUMBER.fullmatch(literal):
+                    self._fail(f"valeur invalide '{literal}'", end)
+                self._buffer = []
+                self._end_value()
+                i = end
+                continue
+
+            if ch in _WHITESPACE:
+                if state in (_PREFIX, _SUFFIX) and self._affix and self._affix.lower() not in (_FENCE_OPEN, _FENCE_CLOSE):
+                    self._fail("texte autour du JSON", i)
+                i += 1
+                continue
+
+            if state == _PREFIX:
+                if ch == "{" and self._affix.lower() in ("", _FENCE_CLOSE, _FENCE_OPEN):
+                    self._affix = ""
+                    self._start_value(ch, i)
+                else:
+                    self._affix += ch
+                    if not _FENCE_OPEN.startswith(self._affix.lower()):
+                        self._fail("texte avant le JSON", i)
+            elif state == _SUFFIX:
+                self._affix += ch
+                if not _FENCE_CLOSE.startswith(self._affix):
+                    self._fail("texte après le JSON", i)
+            elif state == _VALUE:
+                self._start_value(ch, i)
+            elif state == _ARRAY_START:
+                if ch == "]":
+                    self._close(i)
+                else:
+                    self._role = _ITEM_ROLES.get(self._stack[-1][1], _ANY)
+                    self._start_value(ch, i)
+            elif state in (_OBJECT_START, _KEY):
+                if ch == '"':
+                    self._state, self._string_role, self._buffer = _STRING, -1, []
+                elif ch == "}" and state == _OBJECT_START:
+                    self._close(i)
+                else:
+                    self._fail("clé attendue", i)
+            elif state == _COLON:
+                if ch != ":":
+                    self._fail("':' attendu", i)
+                self._state = _VALUE
+                self._role = _KEY_ROLES.get(self._stack[-1][1], {}).get(self._key, _ANY)
+            elif state == _AFTER_VALUE:
+                kind, role, _ = self._stack[-1]
+                if ch == ",":
+                    if kind == "object":
+                        self._state = _KEY
+                    else:
+                        self._state, self._role = _VALUE, _ITEM_ROLES.get(role, _ANY)
+                elif ch == ("}" if kind == "object" else "]"):
+                    self._close(i)
+                else:
+                    self._fail("',' ou fin de conteneur attendue", i)
+            i += 1
+
+    def _start_value(self, ch: str, index: int):
+        kind = _VALUE_KINDS.get(ch) or ("number" if ch == "-" or ch.isdigit() else None)
+        if kind is None:
+            self._fail(f"valeur JSON invalide '{ch}'", index)
+        role = self._role
+        if kind not in _ALLOWED[role]:
+            self._fail(_EXPECTED[role], index)
+
+        if kind == "object":
+            self._stack.append(["object", _OBJECT_ROLES.get(role, _ANY), set()])
+            self._state = _OBJECT_START
+        elif kind == "array":
+            self._stack.append(["array", role if role in _ITEM_ROLES else _ANY, None])
+            self._state = _ARRAY_START
+        elif kind == "string":
+            # Contenu conservé seulement pour les valeurs vérifiées
+            self._string_role = role if role in (_TEMPLATE, _TYPE) else None
+            self._buffer = []
+            self._state = _STRING
+        else:
+            self._buffer = [ch]
+            self._state = _LITERAL
+
+    def _end_string(self, index: int):
+        role = self._string_role
+        if role is None:
+            self._end_value()
+            return
+        value = json.loads('"' + "".join(self._buffer) + '"')
+        self._buffer = []
+        if role == -1:
+            # Clé d'objet
+            self._key = value
+            self._stack[-1][2].add(value)
+            self._state = _COLON
+            return
+        if role == _TEMPLATE and self.templates is not None and value not in self.templates:
+            self._fail(f"template inconnu '{value}'", index)
+        if role == _TYPE and not value.strip():
+            self._fail("type de composant vide", index)
+        self._end_value()
+
+    def _close(self, index: int):
+        kind, role, keys = self._stack.pop()
+        for key in _REQUIRED_KEYS.get(role, ()):
+            if key not in keys:
+                self._fail(f"clé obligatoire manquante « {key} »", index)
+        self._end_value()
+
+    def _end_value(self):
+        self._state = _AFTER_VALUE if self._stack else _SUFFIX
+
+
+def validate_ui_json(text: str, templates: Optional[Sequence[str]] = TEMPLATES) -> Optional[str]:
+    """Valide une réponse complète ; retourne le message d'erreur ou None si elle est valide"""
+    validator = StreamingJSONValidator(templates)
+    try:
+        validator.feed(text)
+        validator.close()
+    except JSONValidationError as e:
+        return str(e)
+    return None
+
+
+def _chunk_text(chunk) -> str:
+    content = chunk.content if hasattr(chunk, "content") else chunk
+    return content if isinstance(content, str) else str(content)
+
+
+class _Attempt:
+    """Une tentative de génération : fragments reçus et état de la validation"""
+
+    def __init__(self, templates, last: bool):
+        self.validator = StreamingJSONValidator(templates)
+        self.last = last
+        self.parts: List[str] = []
+        self.error: Optional[JSONValidationError] = None
+        self.aborted = False
+
+    def add(self, text: str) -> bool:
+        """Ajoute un fragment ; retourne False si le flux doit être interrompu"""
+        self.parts.append(text)
+        if self.error is None:
+            try:
+                self.validator.feed(text)
+            except JSONValidationError as e:
+                self.error = e
+                # La dernière tentative va jusqu'au bout : la réponse est renvoyée telle quelle
+                self.aborted = not self.last
+        return not self.aborted
+
+    def finish(self) -> bool:
+        if self.error is None:
+            try:
+                self.validator.close()
+            except JSONValidationError as e:
+                self.error = e
+        return self.error is None
+
+    @property
+    def answer(self) -> str:
+        return "".join(self.parts)
+
+
+class JSONGenerationGuard:
+    """
+    Génération validée en flux : chaque fragment renvoyé par le LLM passe par un
+    StreamingJSONValidator. Dès que la sortie devient invalide, le flux est interrompu (la fin de
+    la génération n'est ni attendue ni facturée) et le prompt est relancé avec un rappel du format,
+    au plus max_retries fois ; la dernière tentative est renvoyée même si elle est invalide.
+
+    Les tokens économisés sont estimés par la longueur moyenne (en fragments de flux, soit environ
+    un token chacun) des générations menées à terme, moins les fragments reçus avant l'interruption.
+    """
+
+    RETRY_INSTRUCTIONS = (
+        "\n\nATTENTION : ta réponse précédente a été rejetée ({error}). "
+        "Réponds UNIQUEMENT avec le JSON demandé, sans texte avant ni après."
+    )
+
+    def __init__(self, max_retries: int = 1, templates: Optional[Sequence[str]] = TEMPLATES):
+        self.max_retries = max(0, max_retries)
+        self.templates = templates
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def _prompt(self, prompt: str, error: Optional[JSONValidationError]) -> str:
+        return prompt if error is None else prompt + self.RETRY_INSTRUCTIONS.format(error=error)
+
+    def _record(self, attempt: _Attempt):
+        fragments = len(attempt.parts)
+        with self._lock:
+            self._stats["attempts"] += 1
+            self._stats["fragments"] += fragments
+            if attempt.aborted:
+                self._stats["aborted"] += 1
+                if self._completed_attempts:
+                    average = self._completed_fragments / self._completed_attempts
+                    self._stats["tokens_saved"] += max(0, round(average) - fragments)
+            else:
+                self._completed_attempts += 1
+                self._completed_fragments += fragments
+
+    def _record_result(self, attempts: int, valid: bool):
+        with self._lock:
+            self._stats["generations"] += 1
+            self._stats["retries"] += attempts - 1
+            if not valid:
+                self._stats["invalid"] += 1
+
+    def _log_rejection(self, attempt: _Attempt, number: int):
+        action = "interrompue" if attempt.aborted else "terminée"
+        logger.warning(f"⚠️ Réponse JSON invalide (tentative {number}/{self.max_retries + 1}, {action} "
+                       f"après {len(attempt.parts)} fragments): {attempt.error}")
+
+    def invoke(self, llm, prompt: str) -> Tuple[str, bool, int]:
+        """Génère une réponse validée ; retourne (réponse, valide, nombre de tentatives)"""
+        error = None
+        for number in range(1, self.max_retries + 2):
+            attempt = _Attempt(self.templates, last=number > self.max_retries)
+            stream = llm.stream(self._prompt(prompt, error))
+            try:
+                for chunk in stream:
+                    if not attempt.add(_chunk_text(chunk)):
+                        break
+            finally:
+                stream.close()
+            valid = attempt.finish()
+            self._record(attempt)
+            if valid or attempt.last:
+                if not valid:
+                    self._log_rejection(attempt, number)
+                self._record_result(number, valid)
+                return attempt.answer, valid, number
+            self._log_rejection(attempt, number)
+            error = attempt.error
+
+    async def astream(self, llm, prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Version en flux : produit des événements "token" ({"text"}), "retry" ({"attempt", "error"} :
+        les fragments déjà reçus sont à ignorer) puis "result" ({"answer", "valid", "attempts"})
+        """
+        error = None
+        for number in range(1, self.max_retries + 2):
+            attempt = _Attempt(self.templates, last=number > self.max_retries)
+            stream = llm.astream(self._prompt(prompt, error))
+            try:
+                async for chunk in stream:
+                    text = _chunk_text(chunk)
+                    if not attempt.add(text):
+                        break
+                    if text:
+                        yield {"event": "token", "data": {"text": text}}
+            finally:
+                await stream.aclose()
+            valid = attempt.finish()
+            self._record(attempt)
+            if valid or attempt.last:
+                if not valid:
+                    self._log_rejection(attempt, number)
+                self._record_result(number, valid)
+                yield {"event": "result", "data": {"answer": attempt.answer, "valid": valid, "attempts": number}}
+                return
+            self._log_rejection(attempt, number)
+            error = attempt.error
+            yield {"event": "retry", "data": {"attempt": number + 1, "error": str(error)}}
+
+    async def ainvoke(self, llm, prompt: str) -> Tuple[str, bool, int]:
+        """Version asynchrone de invoke"""
+        async for event in self.astream(llm, prompt):
+            if event["event"] == "result":
+                return event["data"]["answer"], event["data"]["valid"], event["data"]["attempts"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        generations = stats["generations"]
+        stats["max_retries"] = self.max_retries
+        stats["retry_rate"] = round(stats["retries"] / generations, 4) if generations else 0.0
+        stats["valid_rate"] = round((generations - stats["invalid"]) / generations, 4) if generations else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"generations": 0, "attempts": 0, "retries": 0, "aborted": 0,
+                           "invalid": 0, "fragments": 0, "tokens_saved": 0}
+            self._completed_attempts = 0
+            self._completed_fragments = 0
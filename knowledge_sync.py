@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Sequence
+
+from langchain.schema import Document
+
+from ingestion import IngestionPipeline, FileTask, PreparedFile, CHUNK_SIZE, CHUNK_OVERLAP
+from tagger import get_default_tagger
+
+logger = logging.getLogger(__name__)
+
+# Extensions indexées dans le dossier knowledges
+KNOWLEDGE_EXTENSIONS = (".md", ".txt", ".json")
+
+
+def iter_knowledge_files(knowledge_path: Path) -> List[Path]:
+    """Liste triée des fichiers indexables (récursif)"""
+    return sorted(
+        path for path in knowledge_path.rglob("*")
+        if path.is_file() and path.suffix.lower() in KNOWLEDGE_EXTENSIONS
+    )
+
+
+def chunk_id(relpath: str, index: int) -> str:
+    """Id déterministe d'un chunk : chemin relatif du fichier + position"""
+    return f"{relpath}::{index}"
+
+
+def chunk_hash(document: Document) -> str:
+    """Empreinte du contenu et des métadonnées d'un chunk"""
+    digest = hashlib.sha256()
+    digest.update(document.page_content.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(document.metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_indexes(collection, indexes: Sequence, batch_size: int = 5000) -> int:
+    """
+    Reconstruit des index en mémoire (tags, BM25...) en une seule lecture paginée de la collection.
+    Les mêmes documents sont passés à chaque index : le contenu n'est pas dupliqué en mémoire
+    """
+    try:
+        total = collection.count()
+        for index in indexes:
+            index.clear()
+        for offset in range(0, total, batch_size):
+            results = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            ids = results.get("ids", [])
+            documents = [
+                Document(page_content=content or "", metadata=metadata or {})
+                for content, metadata in zip(results.get("documents", []), results.get("metadatas", []))
+            ]
+            for index in indexes:
+                index.add_documents(ids, documents)
+        logger.info(f"🗂️ Index en mémoire construits: {total} chunks ({', '.join(type(index).__name__ for index in indexes)})")
+        return total
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la construction des index en mémoire: {e}")
+        raise
+
+
+class KnowledgeSync:
+    """
+    Synchronisation incrémentale du dossier knowledges avec la base vectorielle.
+
+    Un manifeste (hash et mtime par fichier, empreinte par chunk) permet de n'ajouter que les
+    nouveaux chunks, de mettre à jour ceux qui ont changé et de supprimer ceux qui ont disparu.
+    Les ids de chunks étant déterministes, deux synchronisations successives sont idempotentes.
+    Les index en mémoire (tag_index, indexes : add_documents / remove) suivent les mêmes écritures.
+    """
+
+    def __init__(self, vectorstore, knowledge_path: Path, manifest_path: str, tag_index=None,
+                 pipeline: Optional[IngestionPipeline] = None,
+                 chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                 indexes: Sequence = ()):
+        self.vectorstore = vectorstore
+        self.knowledge_path = Path(knowledge_path)
+        self.manifest_path = manifest_path
+        self.tag_index = tag_index
+        self.indexes = [index for index in (tag_index, *indexes) if index is not None]
+        self.pipeline = pipeline or IngestionPipeline(vectorstore)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._lock = threading.Lock()
+
+    def _load_manifest(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Manifeste illisible, resynchronisation complète: {e}")
+            return None
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        """Écriture atomique du manifeste"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _collection_ids(self, batch_size: int = 5000) -> List[str]:
+        collection = self.vectorstore._collection
+        ids = []
+        for offset in range(0, collection.count(), batch_size):
+            ids.extend(collection.get(include=[], limit=batch_size, offset=offset)["ids"])
+        return ids
+
+    def file_chunk_counts(self) -> Dict[str, int]:
+        """Nombre de chunks par fichier d'après le manifeste"""
+        manifest = self._load_manifest() or {"files": {}}
+        return {relpath: len(entry["chunks"]) for relpath, entry in manifest["files"].items()}
+
+    def tagging_current(self) -> bool:
+        """La base a été étiquetée avec le tagger courant (mêmes règles, même format de métadonnées)"""
+        manifest = self._load_manifest()
+        return manifest is not None and manifest.get("tagging") == get_default_tagger().fingerprint
+
+    def sync(self) -> Dict[str, Any]:
+        """Synchronise la base avec le dossier ; retourne les compteurs de la synchronisation"""
+        with self._lock:
+            start = time.perf_counter()
+            previous = self._load_manifest()
+            files = dict(previous["files"]) if previous else {}
+            previous_total = sum(len(entry["chunks"]) for entry in files.values())
+            # Règles de tags modifiées : tous les fichiers sont ré-étiquetés (seuls les chunks dont
+            # les métadonnées changent sont réécrits)
+            tagging = get_default_tagger().fingerprint
+            retag = previous is not None and previous.get("tagging") != tagging
+            stats = {"files_scanned": 0, "files_changed": 0, "files_removed": 0,
+                     "added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+            delete_ids: List[str] = []
+            seen = set()
+
+            # Manifeste absent ou désynchronisé de la collection : les fichiers dont des chunks
+            # manquent sont ré-indexés, les chunks inconnus du manifeste seront supprimés
+            collection_ids = None
+            if previous is None or self.vectorstore._collection.count() != previous_total:
+                collection_ids = set(self._collection_ids())
+                for relpath, entry in list(files.items()):
+                    if any(cid not in collection_ids for cid in entry["chunks"]):
+                        del files[relpath]
+
+            tasks = []
+            for path in iter_knowledge_files(self.knowledge_path):
+                relpath = path.relative_to(self.knowledge_path).as_posix()
+                seen.add(relpath)
+                stats["files_scanned"] += 1
+
+                stat = path.stat()
+                entry = files.get(relpath)
+                if not retag and entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                    stats["unchanged"] += len(entry["chunks"])
+                    continue
+
+                tasks.append(FileTask(str(path), relpath, stat.st_mtime, stat.st_size,
+                                      entry["sha256"] if entry and not retag else None,
+                                      self.chunk_size, self.chunk_overlap))
+
+            def on_file(prepared: PreparedFile):
+                task = prepared.task
+                entry = files.get(task.relpath)
+                if prepared.chunks is None:
+                    # Fichier touché mais contenu identique
+                    entry.update(mtime=task.mtime, size=task.size)
+                    stats["unchanged"] += len(entry["chunks"])
+                    return []
+
+                stats["files_changed"] += 1
+                old_chunks = entry["chunks"] if entry else {}
+                new_chunks = {}
+                upserts = []
+                for index, (content, metadata) in enumerate(prepared.chunks):
+                    chunk = Document(page_content=content, metadata=metadata)
+                    cid = chunk_id(task.relpath, index)
+                    new_chunks[cid] = chunk_hash(chunk)
+                    if cid not in old_chunks:
+                        stats["added"] += 1
+                    elif old_chunks[cid] != new_chunks[cid]:
+                        stats["updated"] += 1
+                    else:
+                        stats["unchanged"] += 1
+                        continue
+                    upserts.append((cid, chunk))
+
+                stale = [cid for cid in old_chunks if cid not in new_chunks]
+                delete_ids.extend(stale)
+                stats["removed"] += len(stale)
+                files[task.relpath] = {"sha256": prepared.sha256, "mtime": task.mtime,
+                                       "size": task.size, "chunks": new_chunks}
+                return upserts
+
+            def on_write(ids: List[str], docs: List[Document]):
+                for index in self.indexes:
+                    index.add_documents(ids, docs)
+
+            stats["ingestion"] = self.pipeline.run(tasks, on_file, on_write if self.indexes else None)
+
+            for relpath in [relpath for relpath in files if relpath not in seen]:
+                stale = list(files.pop(relpath)["chunks"])
+                delete_ids.extend(stale)
+                stats["removed"] += len(stale)
+                stats["files_removed"] += 1
+
+            # Réconciliation : anciens ids aléatoires, écritures interrompues
+            if collection_ids is not None:
+                expected = {cid for entry in files.values() for cid in entry["chunks"]}
+                orphans = collection_ids - expected - set(delete_ids)
+                if orphans:
+                    logger.info(f"🧹 {len(orphans)} chunks absents du manifeste supprimés")
+                    delete_ids.extend(sorted(orphans))
+                    stats["removed"] += len(orphans)
+
+            batch_size = self.pipeline.write_batch_size
+            collection = self.vectorstore._collection
+            for offset in range(0, len(delete_ids), batch_size):
+                collection.delete(ids=delete_ids[offset:offset + batch_size])
+            if delete_ids:
+                for index in self.indexes:
+                    index.remove(delete_ids)
+
+            # Collections à écriture différée (NumpyCollection) : persistées avant le manifeste
+            persist = getattr(collection, "persist", None)
+            if persist is not None:
+                persist()
+
+            self._save_manifest({"version": 1, "tagging": tagging, "files": files})
+
+            stats["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            logger.info(
+                f"🔄 Synchronisation: +{stats['added']} ~{stats['updated']} -{stats['removed']} chunks "
+                f"({stats['files_changed']} fichiers modifiés) en {stats['duration_ms']} ms"
+            )
+            return stats
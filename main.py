@@ -1,20 +1,34 @@
 import os
+import json
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, FrozenSet, AsyncIterator
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 # Import du gestionnaire de sessions
-from session_manager import SessionManager
+from session_store import create_session_store, encode_session_cursor
+from session_summary import SessionSummarizer
+from tag_index import TagIndex, parse_tags, tag_filter
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from reranker import create_reranker
+from context_packer import TokenCounter, ContextPacker
+from semantic_cache import SemanticCache
+from prompt_cache import PromptCache
+from embedding_cache import CachedEmbeddings
+from knowledge_sync import KnowledgeSync, load_indexes
+from query_router import QueryRouter, PRODUCT_KEYWORDS, FALLBACK_KEYWORDS
+from ingestion import IngestionPipeline, build_text_splitter
+from json_validator import JSONGenerationGuard
+from numpy_vectorstore import create_vectorstore, VECTORSTORE_BACKENDS
+from ann_index import create_ann_index
 
 # LangChain imports
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader, DirectoryLoader
-from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.chains import RetrievalQA
 from langchain.schema import Document
@@ -55,6 +69,11 @@ class QueryResponse(BaseModel):
     metadata: Dict[str, Any]
     session_id: Optional[str] = None
 
+class SearchRequest(BaseModel):
+    query: str
+    tags: List[str] = []
+    k: int = 10
+
 class DocumentInfo(BaseModel):
     filename: str
     content_preview: str
@@ -67,12 +86,10 @@ class SessionCreate(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 class SessionResponse(BaseModel):
-    id: str
+    session_id: str
     title: str
     created_at: str
-    updated_at: str
     message_count: int
-    metadata: Dict[str, Any]
 
 class SessionUpdate(BaseModel):
     title: str
@@ -86,17 +103,99 @@ class MessageResponse(BaseModel):
 
 # Configuration globale
 class RAGSystem:
-    def __init__(self):
-        self.embeddings = None
+    def __init__(self, llm=None, embeddings=None,
+                 chroma_db_path: str = "./chroma_langchain_db",
+                 session_db_path: str = "sessions.db"):
+        # llm / embeddings peuvent être injectés (tests, benchmarks), sinon OpenAI est utilisé
+        self.embeddings = embeddings
         self.vectorstore = None
-        self.llm = None
+        self.llm = llm
         self.qa_chain = None
         self.text_splitter = None
         self.knowledge_base_path = Path("knowledges")
-        self.chroma_db_path = "./chroma_langchain_db"
+        self.chroma_db_path = chroma_db_path
+        
+        # Backend de la base vectorielle : chroma (par défaut) ou numpy (vecteurs en mmap, sans SQLite)
+        self.vectorstore_backend = os.getenv("VECTORSTORE_BACKEND", "chroma")
+        self.vectorstore_path = chroma_db_path if self.vectorstore_backend == "chroma" else \
+            os.getenv("NUMPY_VECTORSTORE_PATH", VECTORSTORE_BACKENDS.get(self.vectorstore_backend, ""))
+        
+        # Index approximatif du backend numpy (VECTOR_INDEX=ivf ou hnsw ; exact par défaut)
+        self.ann_index = create_ann_index(
+            os.getenv("VECTOR_INDEX", "exact"),
+            nlist=int(os.getenv("IVF_NLIST", "0")),
+            nprobe=int(os.getenv("IVF_NPROBE", "32")),
+            ef=int(os.getenv("HNSW_EF", "128")),
+            m=int(os.getenv("HNSW_M", "16")),
+            min_chunks=int(os.getenv("ANN_MIN_CHUNKS", "10000"))
+        )
+        
+        # Routeur de requêtes (mots-clés produit, fallback et scénarios compilés ensemble)
+        self.query_router = QueryRouter()
+        
+        # Index inversé des tags (évite les scans complets de la collection)
+        self.tag_index = TagIndex()
+        
+        # Index lexical BM25 fusionné avec la recherche vectorielle (RETRIEVAL_MODE=vector pour le désactiver)
+        self.bm25_index = BM25Index() if os.getenv("RETRIEVAL_MODE", "hybrid") == "hybrid" else None
+        
+        # Nombre de tokens (tiktoken, mis en cache par chunk) et contexte du prompt sous budget de tokens
+        # (CONTEXT_TOKEN_BUDGET=0 pour le désactiver)
+        self.token_counter = TokenCounter(model="gpt-4o-mini")
+        context_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+        self.context_packer = None
+        if context_budget > 0:
+            self.context_packer = ContextPacker(self.token_counter, budget=context_budget,
+                                                history_share=float(os.getenv("CONTEXT_HISTORY_SHARE", "0.3")))
+        
+        # Reranking des chunks récupérés avant le prompt (RERANKER=lexical ou cross-encoder ; désactivé par défaut)
+        self.reranker = create_reranker(
+            os.getenv("RERANKER", "none"),
+            bm25_index=self.bm25_index,
+            model_path=os.getenv("RERANKER_MODEL_PATH", ""),
+            top_n=int(os.getenv("RERANK_TOP_N", "6")),
+            threshold=float(os.getenv("RERANK_THRESHOLD", "0.3")),
+            min_keep=int(os.getenv("RERANK_MIN_KEEP", "3")),
+            count_tokens=self.token_counter.count
+        )
+        
+        # Cache sémantique des réponses (clé : embedding de la requête, scénario, version de la base)
+        self.semantic_cache = SemanticCache(
+            similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+        )
+        
+        # Cache exact des sorties du LLM (clé : hash du prompt final + paramètres du modèle)
+        self.prompt_cache = PromptCache.from_config(
+            backend=os.getenv("PROMPT_CACHE_BACKEND", "memory"),
+            path=os.getenv("PROMPT_CACHE_PATH", "prompt_cache.db"),
+            max_mb=float(os.getenv("PROMPT_CACHE_MAX_MB", "64"))
+        )
+        
+        # Validation en flux des réponses JSON (JSON_VALIDATION=off pour la désactiver)
+        self.json_guard = None
+        if os.getenv("JSON_VALIDATION", "on") != "off":
+            self.json_guard = JSONGenerationGuard(max_retries=int(os.getenv("JSON_VALIDATION_RETRIES", "1")))
         
         # Initialiser le gestionnaire de sessions
-        self.session_manager = SessionManager("sessions.db")
+        # SESSION_DURABILITY=async : écriture différée des messages, vidée à l'arrêt
+        # Contexte des sessions : résumé glissant + SESSION_RECENT_MESSAGES derniers messages
+        # SESSION_STORE=redis : sessions partagées entre réplicas, expirées après SESSION_TTL secondes
+        self.session_manager = create_session_store(
+            os.getenv("SESSION_STORE", "sqlite"),
+            db_path=session_db_path,
+            redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            ttl_seconds=int(os.getenv("SESSION_TTL", str(30 * 86400))),
+            max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "500")),
+            durability=os.getenv("SESSION_DURABILITY", "sync"),
+            summarizer=SessionSummarizer(
+                recent_messages=int(os.getenv("SESSION_RECENT_MESSAGES", "6")),
+                summary_chars=int(os.getenv("SESSION_SUMMARY_CHARS", "1500"))
+            ),
+            cache_sessions=int(os.getenv("SESSION_CACHE_SIZE", "1000")),
+            cache_tail=int(os.getenv("SESSION_CACHE_TAIL", "64"))
+        )
         
         # Initialiser les composants
         self._initialize_components()
@@ -104,31 +203,37 @@ class RAGSystem:
     def _initialize_components(self):
         """Initialise les composants LangChain"""
         try:
-            # Vérifier la clé API OpenAI
+            # Vérifier la clé API OpenAI (inutile si les modèles sont injectés)
             api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
+            if not api_key and (self.embeddings is None or self.llm is None):
                 raise ValueError("OPENAI_API_KEY non trouvée dans les variables d'environnement")
             
             # Initialiser les embeddings
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=api_key,
-                model="text-embedding-3-small"
-            )
+            if self.embeddings is None:
+                self.embeddings = OpenAIEmbeddings(
+                    openai_api_key=api_key,
+                    model="text-embedding-3-small"
+                )
+            
+            # Cache persistant des embeddings de documents (EMBEDDING_CACHE_DIR=none pour le désactiver),
+            # requêtes gardées en mémoire (EMBEDDING_QUERY_CACHE_SIZE dernières)
+            embedding_cache_dir = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+            if embedding_cache_dir != "none" and not isinstance(self.embeddings, CachedEmbeddings):
+                self.embeddings = CachedEmbeddings(
+                    self.embeddings, cache_dir=embedding_cache_dir,
+                    query_cache_size=int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "1024"))
+                )
             
             # Initialiser le LLM
-            self.llm = ChatOpenAI(
-                openai_api_key=api_key,
-                model="gpt-4o-mini",
-                temperature=0.7
-            )
+            if self.llm is None:
+                self.llm = ChatOpenAI(
+                    openai_api_key=api_key,
+                    model="gpt-4o-mini",
+                    temperature=0.7
+                )
             
             # Initialiser le text splitter
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-                separators=["\n\n", "\n", " ", ""]
-            )
+            self.text_splitter = build_text_splitter()
             
             # Charger ou créer la base vectorielle
             self._load_or_create_vectorstore()
@@ -142,24 +247,49 @@ class RAGSystem:
             logger.error(f"❌ Erreur lors de l'initialisation: {e}")
             raise
     
+    def _memory_indexes(self) -> List[Any]:
+        """Index en mémoire synchronisés avec la collection"""
+        return [index for index in (self.tag_index, self.bm25_index) if index is not None]
+    
     def _load_or_create_vectorstore(self):
-        """Charge ou crée la base vectorielle ChromaDB"""
+        """Charge ou crée la base vectorielle (ChromaDB ou numpy selon VECTORSTORE_BACKEND)"""
         try:
             # Essayer de charger une base existante
-            if os.path.exists(self.chroma_db_path):
-                self.vectorstore = Chroma(
-                    persist_directory=self.chroma_db_path,
-                    embedding_function=self.embeddings
-                )
-                logger.info(f"📚 Base vectorielle chargée depuis {self.chroma_db_path}")
+            is_new_db = not os.path.exists(self.vectorstore_path)
+            self.vectorstore = create_vectorstore(self.vectorstore_backend, self.vectorstore_path, self.embeddings,
+                                                  ann_index=self.ann_index)
+            if not is_new_db:
+                logger.info(f"📚 Base vectorielle {self.vectorstore_backend} chargée depuis {self.vectorstore_path}")
+                
+                # Construire les index en mémoire (tags, BM25) en une lecture de la collection existante
+                load_indexes(self.vectorstore._collection, self._memory_indexes())
             else:
-                # Créer une nouvelle base
-                self.vectorstore = Chroma(
-                    persist_directory=self.chroma_db_path,
-                    embedding_function=self.embeddings
+                logger.info(f"🆕 Nouvelle base vectorielle {self.vectorstore_backend} créée dans {self.vectorstore_path}")
+            
+            # Synchronisation incrémentale avec le dossier knowledges (manifeste stocké avec la base)
+            self.knowledge_sync = KnowledgeSync(
+                self.vectorstore,
+                self.knowledge_base_path,
+                os.path.join(self.vectorstore_path, "kb_manifest.json"),
+                tag_index=self.tag_index,
+                indexes=[self.bm25_index] if self.bm25_index is not None else [],
+                # Threads : des processus spawn réimporteraient main.py (et un RAGSystem) chacun
+                pipeline=IngestionPipeline(
+                    self.vectorstore,
+                    workers=int(os.getenv("INGESTION_WORKERS", str(os.cpu_count() or 1))),
+                    max_in_flight=int(os.getenv("INGESTION_MAX_IN_FLIGHT", "4")),
+                    processes=False
                 )
-                logger.info(f"🆕 Nouvelle base vectorielle créée dans {self.chroma_db_path}")
-                
+            )
+            
+            # Filtre vectoriel par tag (champs tag_<nom>) : seulement si la base a été étiquetée dans
+            # ce format, sinon récupération par l'index de tags jusqu'au prochain /reload
+            self.tag_filtering = self.knowledge_sync.tagging_current()
+            if not is_new_db and not self.tag_filtering:
+                logger.warning("⚠️ Tags de la base dans un ancien format : filtre vectoriel par tag désactivé "
+                               "jusqu'à la prochaine synchronisation (POST /reload)")
+            
+            if is_new_db:
                 # Charger les documents si le dossier knowledges existe
                 if self.knowledge_base_path.exists():
                     self.load_knowledge_base()
@@ -211,6 +341,7 @@ Réponds UNIQUEMENT avec un JSON valide selon le guide de structure, en utilisan
             template=prompt_template,
             input_variables=["context", "question"]
         )
+        self.qa_prompt = PROMPT
         
         # Créer la chaîne QA avec retriever amélioré
         self.qa_chain = RetrievalQA.from_chain_type(
@@ -219,136 +350,75 @@ Réponds UNIQUEMENT avec un JSON valide selon le guide de structure, en utilisan
             retriever=self.vectorstore.as_retriever(
                 search_type="similarity",
                 search_kwargs={
-                    "k": 10  # Récupérer plus de documents pour avoir plus d'informations
+                    "k": self.RETRIEVAL_K  # Récupérer plus de documents pour avoir plus d'informations
                 }
             ),
             chain_type_kwargs={"prompt": PROMPT},
             return_source_documents=True
         )
     
-    def load_knowledge_base(self):
-        """Charge tous les documents du dossier knowledges"""
+    def load_knowledge_base(self) -> Dict[str, Any]:
+        """Synchronise la base vectorielle avec le dossier knowledges (incrémental et idempotent)"""
         try:
             if not self.knowledge_base_path.exists():
                 logger.warning(f"📁 Dossier {self.knowledge_base_path} non trouvé")
-                return
-            
-            # Charger tous les fichiers markdown, texte et JSON
-            loader = DirectoryLoader(
-                str(self.knowledge_base_path),
-                glob="**/*.{md,txt,json}",
-                loader_cls=TextLoader,
-                loader_kwargs={"encoding": "utf-8"}
-            )
+                return {}
             
-            documents = loader.load()
-            logger.info(f"📄 {len(documents)} documents chargés")
+            kb_version = self.tag_index.version
             
-            if documents:
-                # Diviser les documents en chunks
-                texts = self.text_splitter.split_documents(documents)
-                
-                # Enrichir les métadonnées avec des tags
-                for text in texts:
-                    source_file = os.path.basename(text.metadata.get('source', ''))
-                    content = text.page_content.lower()
-                    
-                    # Ajouter des tags basés sur le contenu et le fichier source
-                    tags = []
-                    
-                    # Tags basés sur le nom du fichier
-                    if 'product' in source_file or 'catalog' in source_file:
-                        tags.extend(['product', 'catalog'])
-                    if 'ecommerce' in source_file:
-                        tags.extend(['ecommerce', 'general'])
-                    if 'faq' in source_file:
-                        tags.extend(['faq', 'support'])
-                    if 'customer' in source_file:
-                        tags.extend(['customer_service', 'support'])
-                    
-                    # Tags basés sur le contenu
-                    if any(word in content for word in ['prix', 'price', '€', 'euro']):
-                        tags.append('pricing')
-                    if any(word in content for word in ['iphone', 'samsung', 'macbook', 'dell', 'airpods']):
-                        tags.extend(['product', 'electronics'])
-                    if any(word in content for word in ['livraison', 'delivery', 'shipping']):
-                        tags.append('shipping')
-                    if any(word in content for word in ['garantie', 'warranty', 'sav']):
-                        tags.append('warranty')
-                    if any(word in content for word in ['paiement', 'payment', 'carte']):
-                        tags.append('payment')
-                    
-                    # Ajouter les tags aux métadonnées (convertir en string pour ChromaDB)
-                    unique_tags = list(set(tags))  # Supprimer les doublons
-                    text.metadata['tags'] = ','.join(unique_tags) if unique_tags else 'general'
-                    text.metadata['content_type'] = 'product' if 'product' in tags else 'general'
-                
-                logger.info(f"✂️ {len(texts)} chunks créés avec métadonnées enrichies")
-                
-                # Ajouter à la base vectorielle
-                self.vectorstore.add_documents(texts)
-                self.vectorstore.persist()
-                
-                logger.info(f"✅ Base de connaissances chargée: {len(texts)} chunks indexés")
+            # Seuls les chunks nouveaux, modifiés ou supprimés touchent la base vectorielle
+            stats = self.knowledge_sync.sync()
+            self.tag_filtering = True
+            logger.info(f"✅ Base de connaissances synchronisée: {len(self.tag_index)} chunks indexés")
+            
+            # Les réponses en cache ne correspondent plus au corpus
+            if self.tag_index.version != kb_version:
+                self.semantic_cache.invalidate()
+            
+            return stats
             
         except Exception as e:
             logger.error(f"❌ Erreur lors du chargement de la base de connaissances: {e}")
             raise
     
-    def detect_scenario(self, query: str, found_docs: List[Document]) -> str:
+    def detect_scenario(self, query: str, found_docs: List[Document], intents: Optional[FrozenSet[str]] = None) -> str:
         """
         Détecte le scénario approprié basé sur la requête et les documents trouvés
         """
-        query_lower = query.lower()
-        
-        # Mots-clés par scénario
-        ecommerce_keywords = ['produit', 'acheter', 'prix', 'catalogue', 'recommandation', 'commander', 'panier']
-        single_product_keywords = ['détails', 'spécifications', 'caractéristiques', 'fiche produit', 'plus d\'infos', 'description complète']
-        restaurant_keywords = ['menu', 'plat', 'restaurant', 'réserver', 'carte', 'table', 'cuisine']
-        support_keywords = ['aide', 'problème', 'retour', 'livraison', 'garantie', 'support', 'contact']
-        comparison_keywords = ['comparer', 'différence', 'vs', 'versus', 'mieux', 'choisir']
-        landing_keywords = ['bonjour', 'salut', 'hello', 'bienvenue', 'aide-moi', 'que faire']
+        # Mots-clés par scénario : reconnus en une passe par le routeur (sauf si déjà routée)
+        if intents is None:
+            intents = self.query_router.route(query)
         
         # Vérifier les tags dans les documents
         doc_tags = set()
         for doc in found_docs:
-            if 'tags' in doc.metadata:
-                if isinstance(doc.metadata['tags'], list):
-                    doc_tags.update(doc.metadata['tags'])
-                else:
-                    doc_tags.add(doc.metadata['tags'])
+            doc_tags.update(parse_tags(doc.metadata))
         
         # Logique de détection par priorité
         
         # 1. Produit unique avec détails
         if ('product' in doc_tags or 'ecommerce' in doc_tags) and \
-           (any(keyword in query_lower for keyword in single_product_keywords) or \
-            len(found_docs) == 1):
+           ('single_product' in intents or len(found_docs) == 1):
             return 'single_product'
         
         # 2. Produits E-commerce (liste)
-        if ('product' in doc_tags or 'ecommerce' in doc_tags) and \
-           any(keyword in query_lower for keyword in ecommerce_keywords):
+        if ('product' in doc_tags or 'ecommerce' in doc_tags) and 'ecommerce' in intents:
             return 'ecommerce_products'
         
         # 3. Restaurant
-        if ('restaurant' in doc_tags or 'menu' in doc_tags) or \
-           any(keyword in query_lower for keyword in restaurant_keywords):
+        if ('restaurant' in doc_tags or 'menu' in doc_tags) or 'restaurant' in intents:
             return 'restaurant_menu'
         
         # 4. Support/FAQ
-        if ('support' in doc_tags or 'faq' in doc_tags) or \
-           any(keyword in query_lower for keyword in support_keywords):
+        if ('support' in doc_tags or 'faq' in doc_tags) or 'support' in intents:
             return 'customer_support'
         
         # 5. Comparaison (si plusieurs produits et mots-clés de comparaison)
-        if any(keyword in query_lower for keyword in comparison_keywords) and \
-           len(found_docs) > 1 and 'product' in doc_tags:
+        if 'comparison' in intents and len(found_docs) > 1 and 'product' in doc_tags:
             return 'product_comparison'
         
         # 6. Landing/Accueil
-        if any(keyword in query_lower for keyword in landing_keywords) or \
-           len(query.strip()) < 20:  # Requêtes courtes = orientation
+        if 'landing' in intents or len(query.strip()) < 20:  # Requêtes courtes = orientation
             return 'landing_page'
         
         # 7. Par défaut : informatif
@@ -518,32 +588,302 @@ Réponds UNIQUEMENT avec un JSON valide selon le guide de structure :"""
         return scenario_prompts.get(scenario, scenario_prompts['informative'])
     
     def get_chunks_by_tag(self, tag: str, limit: int = 10) -> List[Document]:
-        """Récupère les chunks ayant un tag spécifique"""
+        """Récupère les chunks ayant un tag spécifique (via l'index inversé)"""
         try:
-            collection = self.vectorstore._collection
-            # Récupérer tous les documents et filtrer manuellement
-            results = collection.get(
-                include=["documents", "metadatas"]
-            )
-            
-            filtered_docs = []
-            for i, metadata in enumerate(results.get('metadatas', [])):
-                if metadata and 'tags' in metadata:
-                    tags_str = metadata['tags']
-                    if tag in tags_str.split(','):
-                        doc = Document(
-                            page_content=results['documents'][i],
-                            metadata=metadata
-                        )
-                        filtered_docs.append(doc)
-                        if len(filtered_docs) >= limit:
-                            break
-            
-            return filtered_docs
+            return self.tag_index.get(tag, limit=limit)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération par tag: {e}")
             return []
     
+    def similarity_search_by_tags(self, query: str, tags: List[str], k: int = 10) -> List[Document]:
+        """
+        Top-k par similarité parmi les chunks portant tous les tags (filtre sur les champs tag_<nom>,
+        appliqué par la base vectorielle). Base dans un ancien format de tags : premiers chunks
+        portant les tags, dans l'ordre de l'index de tags
+        """
+        if not self.tag_filtering:
+            required = set(tags)
+            return [doc for doc in self.get_chunks_by_tag(tags[0], limit=None)
+                    if required <= set(parse_tags(doc.metadata))][:k]
+        try:
+            return self.vectorstore.similarity_search(query, k=k, filter=tag_filter(tags))
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la recherche filtrée par tags {tags}: {e}")
+            raise
+    
+    # Listes de mots-clés du routeur (voir query_router.py)
+    PRODUCT_KEYWORDS = PRODUCT_KEYWORDS
+    FALLBACK_KEYWORDS = FALLBACK_KEYWORDS
+    
+    # Documents retenus par la recherche par similarité (et par la fusion hybride)
+    RETRIEVAL_K = 10
+    # Constante de la Reciprocal Rank Fusion (valeur usuelle : atténue l'écart entre les premiers rangs)
+    RRF_K = 60
+    
+    # Scénarios générés avec leur prompt dédié plutôt qu'avec le prompt de la chaîne QA
+    REGENERATED_SCENARIOS = ['restaurant_menu', 'customer_support', 'landing_page', 'product_comparison']
+    
+    @staticmethod
+    def _should_try_products(intents: FrozenSet[str], sources_found: List[Document]) -> bool:
+        """Fallback : peu de sources trouvées et question pouvant concerner des recommandations"""
+        return len(sources_found) < 3 and 'fallback' in intents
+    
+    def _format_sources(self, docs: List[Document]) -> List[Dict[str, Any]]:
+        """Formate les documents sources pour la réponse API"""
+        sources = []
+        for doc in docs:
+            sources.append({
+                "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+                "metadata": doc.metadata,
+                "source": doc.metadata.get("source", "Unknown")
+            })
+        return sources
+    
+    @staticmethod
+    def _join_context(docs: List[Document]) -> str:
+        """Concatène le contenu des documents pour le prompt"""
+        return "\n\n".join([doc.page_content for doc in docs]) if docs else "Aucun contexte spécifique trouvé."
+    
+    @staticmethod
+    def _answer_text(response) -> str:
+        """Extrait le texte d'une réponse du LLM"""
+        return response.content if hasattr(response, 'content') else str(response)
+    
+    def _tag_based_plan(self, question: str, intents: FrozenSet[str]) -> Optional[Dict[str, Any]]:
+        """Plan de récupération pour les questions produit : similarité filtrée par tag, fusionnée avec BM25"""
+        if 'product' not in intents:
+            return None
+        
+        # Pour les questions sur les produits : chunks tag 'product' les plus proches de la question
+        logger.info("🏷️ Requête produit détectée - recherche par similarité filtrée par tag")
+        product_docs = self.similarity_search_by_tags(question, ['product'], k=15)
+        if not product_docs:
+            return None
+        
+        # Les chunks produit qui citent les termes de la question (nom exact, référence) passent devant
+        if self.bm25_index is not None:
+            lexical_docs = self.bm25_index.search_documents(
+                question, k=15, predicate=lambda metadata: 'product' in parse_tags(metadata)
+            )
+            if lexical_docs:
+                product_docs = reciprocal_rank_fusion([lexical_docs, product_docs], k=self.RRF_K, limit=15)
+        
+        scenario = self.detect_scenario(question, product_docs, intents)
+        logger.info(f"📋 Scénario détecté: {scenario}")
+        return {"search_method": "tag_based", "tag_used": "product", "docs": product_docs, "scenario": scenario,
+                "intents": intents}
+    
+    def _hybrid_results(self, question: str, vector_docs: List[Document]) -> List[Document]:
+        """Fusionne (RRF) les résultats vectoriels et BM25 de la question ; inchangés sans index BM25"""
+        if self.bm25_index is None:
+            return vector_docs
+        lexical_docs = self.bm25_index.search_documents(question, k=self.RETRIEVAL_K)
+        if not lexical_docs:
+            return vector_docs
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], k=self.RRF_K, limit=self.RETRIEVAL_K)
+    
+    @staticmethod
+    def _search_query(question: str, session_context: str) -> str:
+        """Requête envoyée à la recherche par similarité (enrichie avec l'historique de session)"""
+        if session_context:
+            return f"Historique de la conversation:\n{session_context}\n\nQuestion actuelle: {question}"
+        return question
+    
+    def _similarity_plan(self, question: str, search_query: str, sources_found: List[Document],
+                         intents: FrozenSet[str]) -> Dict[str, Any]:
+        """Plan de réponse à partir des documents trouvés par similarité"""
+        scenario = self.detect_scenario(question, sources_found, intents)
+        logger.info(f"📋 Scénario général détecté: {scenario}")
+        return {"search_method": "similarity", "docs": sources_found, "scenario": scenario, "search_query": search_query,
+                "intents": intents}
+    
+    def _fallback_plan(self, question: str, plan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fallback vers les produits si la recherche par similarité a trouvé peu de sources"""
+        if not self._should_try_products(plan["intents"], plan["docs"]):
+            return None
+        
+        logger.info("🔄 Fallback - tentative de recherche dans les produits")
+        product_docs = self.similarity_search_by_tags(question, ['product'], k=self.RETRIEVAL_K)
+        if not product_docs or len(product_docs) <= len(plan["docs"]):
+            return None
+        
+        scenario = self.detect_scenario(question, product_docs, plan["intents"])
+        logger.info(f"📋 Scénario fallback détecté: {scenario}")
+        return {"search_method": "fallback_products", "docs": product_docs, "scenario": scenario,
+                "intents": plan["intents"]}
+    
+    def _pack_context(self, plan: Dict[str, Any], history: str = "", reserved: int = 0):
+        """
+        Contexte du prompt sous le budget de tokens (chunks dédupliqués, par ordre de pertinence) ;
+        retourne (contexte, plan limité aux chunks retenus, historique retenu). Sans packer : concaténation
+        """
+        if self.context_packer is None:
+            return "\n\n".join([doc.page_content for doc in plan["docs"]]), plan, history
+        context, docs, history, report = self.context_packer.pack(plan["docs"], history, reserved)
+        if report["dropped"]:
+            logger.info(f"📦 Contexte: {report['chunks']} chunks ({report['context_tokens']} tokens), "
+                        f"{report['dropped']} écartés (redondants ou hors budget)")
+        return context, {**plan, "docs": docs, "context": report}, history
+    
+    def _llm_params(self) -> Dict[str, Any]:
+        """Paramètres du modèle inclus dans la clé du cache de prompts"""
+        return {"llm": type(self.llm).__name__, **getattr(self.llm, "_identifying_params", {})}
+    
+    def _invoke_llm(self, prompt: str):
+        """Appelle le LLM en passant par le cache exact ; retourne (réponse, appels au LLM, JSON valide)"""
+        if self.prompt_cache:
+            cached = self.prompt_cache.get(prompt, self._llm_params())
+            if cached is not None:
+                return cached, 0, True
+        
+        if self.json_guard:
+            answer, valid, calls = self.json_guard.invoke(self.llm, prompt)
+        else:
+            answer, valid, calls = self._answer_text(self.llm.invoke(prompt)), True, 1
+        # Une réponse invalide n'est pas mise en cache : la prochaine requête retentera sa chance
+        if self.prompt_cache and valid:
+            self.prompt_cache.put(prompt, self._llm_params(), answer)
+        return answer, calls, valid
+    
+    async def _ainvoke_llm(self, prompt: str):
+        """Version asynchrone de _invoke_llm"""
+        if self.prompt_cache:
+            cached = await asyncio.to_thread(self.prompt_cache.get, prompt, self._llm_params())
+            if cached is not None:
+                return cached, 0, True
+        
+        if self.json_guard:
+            answer, valid, calls = await self.json_guard.ainvoke(self.llm, prompt)
+        else:
+            answer, valid, calls = self._answer_text(await self.llm.ainvoke(prompt)), True, 1
+        if self.prompt_cache and valid:
+            await asyncio.to_thread(self.prompt_cache.put, prompt, self._llm_params(), answer)
+        return answer, calls, valid
+    
+    async def _astream_llm(self, prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """Fragments du LLM en événements "token" ("retry" si la validation relance), puis "result" (réponse complète)"""
+        if self.json_guard:
+            async for event in self.json_guard.astream(self.llm, prompt):
+                yield event
+            return
+        
+        parts = []
+        async for chunk in self.llm.astream(prompt):
+            text = self._answer_text(chunk)
+            if text:
+                parts.append(text)
+                yield {"event": "token", "data": {"text": text}}
+        yield {"event": "result", "data": {"answer": "".join(parts), "valid": True, "attempts": 1}}
+    
+    def _final_prompt(self, plan: Dict[str, Any], question: str, session_context: str):
+        """
+        Planification : choisit l'unique prompt de génération ; retourne (prompt, plan final).
+        Le fallback ne dépend que de la question et des documents récupérés, il est donc décidé
+        avant tout appel au LLM (fallback, sinon prompt du scénario, sinon prompt QA). Le reranking
+        éventuel ne garde ensuite que les chunks pertinents pour le prompt
+        """
+        if plan["search_method"] != "tag_based":
+            plan = self._fallback_plan(question, plan) or plan
+        plan = self._rerank_plan(question, plan)
+        
+        if plan["search_method"] != "similarity" or plan["scenario"] in self.REGENERATED_SCENARIOS:
+            context, plan, history = self._pack_context(plan, session_context)
+            return self.get_scenario_prompt(plan["scenario"], history, context or self._join_context([]), question), plan
+        
+        # Prompt QA, formaté comme le fait la chaîne 'stuff' : la question reprend l'historique retenu
+        context, plan, history = self._pack_context(plan, session_context, reserved=self.token_counter.count(question))
+        return self.qa_prompt.format(context=context, question=self._search_query(question, history)), plan
+    
+    def _rerank_plan(self, question: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Plan dont les documents sont reranqués et élagués (inchangé sans reranker)"""
+        if self.reranker is None or not plan["docs"]:
+            return plan
+        docs, report = self.reranker.rerank(question, plan["docs"])
+        logger.info(f"✂️ Reranking {report['scorer']}: {report['kept']}/{report['candidates']} chunks gardés, "
+                    f"~{report['tokens_saved']} tokens de contexte en moins")
+        return {**plan, "docs": docs, "rerank": report}
+    
+    def _generate(self, plan: Dict[str, Any], question: str, session_context: str):
+        """
+        Génère la réponse avec un seul prompt (un appel au LLM, plus les éventuelles relances de la
+        validation JSON) ; retourne (réponse, plan final, appels au LLM, JSON valide)
+        """
+        prompt, final_plan = self._final_prompt(plan, question, session_context)
+        answer, calls, valid = self._invoke_llm(prompt)
+        return answer, final_plan, calls, valid
+    
+    async def _agenerate(self, plan: Dict[str, Any], question: str, session_context: str):
+        """Version asynchrone de _generate"""
+        # Le fallback peut lancer une recherche vectorielle : dans un thread
+        prompt, final_plan = await asyncio.to_thread(self._final_prompt, plan, question, session_context)
+        answer, calls, valid = await self._ainvoke_llm(prompt)
+        return answer, final_plan, calls, valid
+    
+    def _embed_for_cache(self, question: str) -> Optional[List[float]]:
+        """Embedding de la question pour le cache sémantique (None en cas d'erreur)"""
+        try:
+            return self.embeddings.embed_query(question)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache sémantique ignoré (embedding impossible): {e}")
+            return None
+    
+    async def _aembed_for_cache(self, question: str) -> Optional[List[float]]:
+        """Version asynchrone de _embed_for_cache"""
+        try:
+            return await self.embeddings.aembed_query(question)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache sémantique ignoré (embedding impossible): {e}")
+            return None
+    
+    def _message_metadata(self, plan: Dict[str, Any], cache: Optional[str] = None) -> Dict[str, Any]:
+        """Métadonnées enregistrées avec la réponse de l'assistant"""
+        metadata = {"search_method": plan["search_method"]}
+        if plan.get("tag_used"):
+            metadata["tag_used"] = plan["tag_used"]
+        metadata["scenario"] = plan["scenario"]
+        metadata["sources_count"] = len(plan["docs"])
+        if cache:
+            metadata["cache"] = cache
+        return metadata
+    
+    def _build_response(self, question: str, session_id: str, plan: Dict[str, Any], answer: str,
+                        max_results: int, cache: Optional[str] = None, llm_calls: int = 0,
+                        valid: bool = True) -> Dict[str, Any]:
+        """Construit la réponse de l'API à partir du plan exécuté"""
+        sources = self._format_sources(plan["docs"])
+        if plan["search_method"] == "similarity":
+            sources = sources[:max_results]
+        
+        metadata = {
+            "total_sources": len(plan["docs"]),
+            "query": question,
+            "search_method": plan["search_method"],
+            "scenario": plan["scenario"]
+        }
+        if plan.get("tag_used"):
+            metadata["tag_used"] = plan["tag_used"]
+        if plan.get("rerank"):
+            # Chunks gardés par le reranking et tokens de contexte retirés du prompt
+            metadata["rerank"] = plan["rerank"]
+        if plan.get("context"):
+            # Tokens du contexte et de l'historique dans le prompt, chunks écartés par le budget
+            metadata["context"] = plan["context"]
+        if cache:
+            metadata["cache"] = cache
+        # Une seule génération par requête (plus les relances de la validation JSON), aucune si
+        # la réponse vient d'un cache
+        metadata["llm_calls"] = llm_calls
+        if not valid:
+            # JSON encore invalide après les relances de la validation en flux
+            metadata["json_valid"] = False
+        
+        return {
+            "answer": answer,
+            "sources": sources,
+            "session_id": session_id,
+            "metadata": metadata
+        }
+    
     def query(self, question: str, session_id: str = None, max_results: int = 5) -> Dict[str, Any]:
         """Effectue une requête sur la base de connaissances avec logique améliorée et gestion de session"""
         try:
@@ -551,9 +891,12 @@ Réponds UNIQUEMENT avec un JSON valide selon le guide de structure :"""
                 raise ValueError("Système QA non initialisé")
             
             # Créer une session si nécessaire
+            first_turn = not session_id
             if not session_id:
                 session_id = self.session_manager.create_session()
                 logger.info(f"🆕 Nouvelle session créée: {session_id}")
+            else:
+                first_turn = not self.session_manager.get_session_history(session_id, limit=1)
             
             # Enregistrer la question de l'utilisateur
             self.session_manager.add_message(session_id, "user", question)
@@ -561,189 +904,162 @@ Réponds UNIQUEMENT avec un JSON valide selon le guide de structure :"""
             # Récupérer le contexte de la session
             session_context = self.session_manager.get_session_context(session_id, max_messages=5)
             
-            question_lower = question.lower()
-            
-            # Détecter si la question concerne les produits (logique élargie)
-            product_keywords = [
-                # Mots directs
-                'produit', 'product', 'liste', 'catalog', 'catalogue', 'disponible', 'prix',
-                # Produits spécifiques
-                'smartphone', 'ordinateur', 'iphone', 'samsung', 'macbook', 'airpods', 'dell',
-                # Actions d'achat/recommandation
-                'acheter', 'achat', 'buy', 'purchase', 'commander', 'order',
-                'cadeau', 'cadeaux', 'gift', 'offrir', 'offer',
-                'proposer', 'propose', 'recommander', 'recommend', 'suggérer', 'suggest',
-                'cherche', 'search', 'trouve', 'find', 'besoin', 'need', 'veux', 'want',
-                # Contextes commerciaux
-                'boutique', 'magasin', 'shop', 'store', 'vendre', 'sell', 'vente', 'sale',
-                'choisir', 'choose', 'sélectionner', 'select', 'comparer', 'compare',
-                # Termes généraux qui impliquent souvent des produits
-                'que me', 'qu\'avez', 'avez-vous', 'do you have', 'what do you',
-                'me conseillez', 'me proposez', 'me recommandez'
-            ]
-            is_product_query = any(keyword in question_lower for keyword in product_keywords)
-            
-            if is_product_query:
-                # Pour les questions sur les produits, récupérer tous les chunks avec tag 'product'
-                logger.info("🏷️ Requête produit détectée - récupération par tag")
-                product_docs = self.get_chunks_by_tag('product', limit=15)
-                
-                if product_docs:
-                    # Détecter le scénario approprié
-                    scenario = self.detect_scenario(question, product_docs)
-                    logger.info(f"📋 Scénario détecté: {scenario}")
-                    
-                    # Créer un contexte spécialisé pour les produits
-                    context = "\n\n".join([doc.page_content for doc in product_docs])
-                    
-                    # Obtenir le prompt adapté au scénario
-                    formatted_prompt = self.get_scenario_prompt(scenario, session_context, context, question)
-                    
-                    # Générer la réponse
-                    response = self.llm.invoke(formatted_prompt)
-                    answer = response.content if hasattr(response, 'content') else str(response)
-                    
-                    # Enregistrer la réponse de l'assistant
-                    self.session_manager.add_message(session_id, "assistant", answer, {
-                        "search_method": "tag_based",
-                        "tag_used": "product",
-                        "scenario": scenario,
-                        "sources_count": len(product_docs)
-                    })
-                    
-                    # Formater les sources
-                    sources = []
-                    for doc in product_docs:
-                        sources.append({
-                            "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                            "metadata": doc.metadata,
-                            "source": doc.metadata.get("source", "Unknown")
-                        })
-                    
-                    return {
-                        "answer": answer,
-                        "sources": sources,
-                        "session_id": session_id,
-                        "metadata": {
-                            "total_sources": len(product_docs),
-                            "query": question,
-                            "search_method": "tag_based",
-                            "scenario": scenario,
-                            "tag_used": "product"
-                        }
-                    }
-            
-            # Pour les autres questions, utiliser la recherche par similarité normale
+            # Récupération : par tag pour les produits, sinon recherche par similarité normale
+            # Intentions de la requête (produit, fallback, scénarios) reconnues en une passe
+            intents = self.query_router.route(question)
+            plan = self._tag_based_plan(question, intents)
+            if plan is None:
+                logger.info("🔍 Requête générale - recherche par similarité")
+                search_query = self._search_query(question, session_context)
+                sources_found = self._hybrid_results(question, self.qa_chain.retriever.invoke(search_query))
+                plan = self._similarity_plan(question, search_query, sources_found, intents)
+            
+            # Cache sémantique : seulement pour un premier échange (la réponse ne dépend pas d'un historique)
+            query_embedding = self._embed_for_cache(question) if first_turn else None
+            cached = None
+            if query_embedding is not None:
+                cached = self.semantic_cache.lookup(query_embedding, plan["scenario"], self.tag_index.version)
+            
+            llm_calls, valid = 0, True
+            if cached:
+                answer, final_plan = cached["answer"], cached["plan"]
+                cache = "semantic"
+            else:
+                # Récupération et scénario d'abord, puis un seul appel au LLM
+                answer, final_plan, llm_calls, valid = self._generate(plan, question, session_context)
+                cache = "exact" if not llm_calls else None
+                # Une réponse restée invalide après les relances n'est pas mise en cache
+                if query_embedding is not None and valid:
+                    self.semantic_cache.store(query_embedding, plan["scenario"], self.tag_index.version,
+                                              {"answer": answer, "plan": final_plan})
+            
+            # Enregistrer la réponse de l'assistant
+            self.session_manager.add_message(session_id, "assistant", answer, self._message_metadata(final_plan, cache))
+            
+            return self._build_response(question, session_id, final_plan, answer, max_results, cache, llm_calls, valid)
+            
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la requête: {e}")
+            raise
+    
+    async def _aprepare_query(self, question: str, session_id: Optional[str]):
+        """
+        Étapes communes à aquery et astream_query : session, enregistrement de la question,
+        routage et récupération. Retourne (session_id, premier tour, contexte de session, plan)
+        """
+        if not self.qa_chain:
+            raise ValueError("Système QA non initialisé")
+        
+        first_turn = not session_id
+        if not session_id:
+            session_id = await self.session_manager.acreate_session()
+            logger.info(f"🆕 Nouvelle session créée: {session_id}")
+        else:
+            first_turn = not await self.session_manager.aget_session_history(session_id, limit=1)
+        
+        await self.session_manager.aadd_message(session_id, "user", question)
+        session_context = await self.session_manager.aget_session_context(session_id, max_messages=5)
+        
+        # Intentions de la requête (produit, fallback, scénarios) reconnues en une passe
+        intents = self.query_router.route(question)
+        # Recherche vectorielle filtrée par tag (embedding de la question) : dans un thread
+        plan = await asyncio.to_thread(self._tag_based_plan, question, intents)
+        if plan is None:
             logger.info("🔍 Requête générale - recherche par similarité")
+            search_query = self._search_query(question, session_context)
+            sources_found = self._hybrid_results(question, await self.qa_chain.retriever.ainvoke(search_query))
+            plan = self._similarity_plan(question, search_query, sources_found, intents)
+        
+        return session_id, first_turn, session_context, plan
+    
+    async def aquery(self, question: str, session_id: str = None, max_results: int = 5) -> Dict[str, Any]:
+        """
+        Version asynchrone de query : aucune étape ne bloque la boucle d'événements
+        (LLM via ainvoke, recherche vectorielle et sessions SQLite dans des threads)
+        """
+        try:
+            session_id, first_turn, session_context, plan = await self._aprepare_query(question, session_id)
+            
+            query_embedding = await self._aembed_for_cache(question) if first_turn else None
+            cached = None
+            if query_embedding is not None:
+                cached = self.semantic_cache.lookup(query_embedding, plan["scenario"], self.tag_index.version)
             
-            # Modifier le prompt pour inclure l'historique de session
-            if session_context:
-                # Créer un prompt enrichi avec l'historique
-                enriched_query = f"Historique de la conversation:\n{session_context}\n\nQuestion actuelle: {question}"
-                result = self.qa_chain({"query": enriched_query})
+            llm_calls, valid = 0, True
+            if cached:
+                answer, final_plan = cached["answer"], cached["plan"]
+                cache = "semantic"
             else:
-                result = self.qa_chain({"query": question})
+                answer, final_plan, llm_calls, valid = await self._agenerate(plan, question, session_context)
+                cache = "exact" if not llm_calls else None
+                # Une réponse restée invalide après les relances n'est pas mise en cache
+                if query_embedding is not None and valid:
+                    self.semantic_cache.store(query_embedding, plan["scenario"], self.tag_index.version,
+                                              {"answer": answer, "plan": final_plan})
             
-            answer = result["result"]
-            sources_found = result.get("source_documents", [])
+            await self.session_manager.aadd_message(session_id, "assistant", answer, self._message_metadata(final_plan, cache))
             
-            # Détecter le scénario pour les réponses générales
-            scenario = self.detect_scenario(question, sources_found)
-            logger.info(f"📋 Scénario général détecté: {scenario}")
+            return self._build_response(question, session_id, final_plan, answer, max_results, cache, llm_calls, valid)
             
-            # Si le scénario détecté nécessite un format JSON spécifique, régénérer la réponse
-            if scenario in ['restaurant_menu', 'customer_support', 'landing_page', 'product_comparison']:
-                context = "\n\n".join([doc.page_content for doc in sources_found]) if sources_found else "Aucun contexte spécifique trouvé."
-                formatted_prompt = self.get_scenario_prompt(scenario, session_context, context, question)
-                
-                # Régénérer avec le format adapté
-                response = self.llm.invoke(formatted_prompt)
-                answer = response.content if hasattr(response, 'content') else str(response)
-            
-            # Logique de fallback : si peu de sources trouvées et que la question pourrait concerner des recommandations
-            fallback_keywords = ['recommand', 'conseil', 'suggest', 'propose', 'que faire', 'quoi', 'help', 'aide']
-            should_try_products = (
-                len(sources_found) < 3 and 
-                any(keyword in question_lower for keyword in fallback_keywords)
-            )
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la requête: {e}")
+            raise
+    
+    async def astream_query(self, question: str, session_id: str = None,
+                            max_results: int = 5) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Version en flux de aquery : produit des événements {"event", "data"}.
+        - "session" dès que la session est connue
+        - "token" pour chaque fragment de réponse du LLM (réponse entière si servie par un cache)
+        - "done" avec les sources et les métadonnées, une fois la réponse enregistrée dans la session
+        """
+        try:
+            session_id, first_turn, session_context, plan = await self._aprepare_query(question, session_id)
+            yield {"event": "session", "data": {"session_id": session_id, "scenario": plan["scenario"]}}
+            
+            query_embedding = await self._aembed_for_cache(question) if first_turn else None
+            cached = None
+            if query_embedding is not None:
+                cached = self.semantic_cache.lookup(query_embedding, plan["scenario"], self.tag_index.version)
             
-            if should_try_products:
-                logger.info("🔄 Fallback - tentative de recherche dans les produits")
-                product_docs = self.get_chunks_by_tag('product', limit=10)
+            llm_calls, valid = 0, True
+            if cached:
+                answer, final_plan = cached["answer"], cached["plan"]
+                cache = "semantic"
+                yield {"event": "token", "data": {"text": answer}}
+            else:
+                prompt, final_plan = await asyncio.to_thread(self._final_prompt, plan, question, session_context)
+                answer = None
+                if self.prompt_cache:
+                    answer = await asyncio.to_thread(self.prompt_cache.get, prompt, self._llm_params())
                 
-                if product_docs and len(product_docs) > len(sources_found):
-                    # Détecter le scénario approprié pour le fallback
-                    scenario = self.detect_scenario(question, product_docs)
-                    logger.info(f"📋 Scénario fallback détecté: {scenario}")
-                    
-                    # Utiliser les produits comme sources supplémentaires
-                    context = "\n\n".join([doc.page_content for doc in product_docs])
-                    
-                    # Obtenir le prompt adapté au scénario
-                    formatted_prompt = self.get_scenario_prompt(scenario, session_context, context, question)
-                    
-                    # Générer la réponse avec les produits
-                    response = self.llm.invoke(formatted_prompt)
-                    answer = response.content if hasattr(response, 'content') else str(response)
-                    
-                    # Enregistrer la réponse de l'assistant
-                    self.session_manager.add_message(session_id, "assistant", answer, {
-                        "search_method": "fallback_products",
-                        "scenario": scenario,
-                        "sources_count": len(product_docs)
-                    })
-                    
-                    # Formater les sources avec les produits
-                    sources = []
-                    for doc in product_docs:
-                        sources.append({
-                            "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                            "metadata": doc.metadata,
-                            "source": doc.metadata.get("source", "Unknown")
-                        })
-                    
-                    return {
-                        "answer": answer,
-                        "sources": sources,
-                        "session_id": session_id,
-                        "metadata": {
-                            "total_sources": len(product_docs),
-                            "query": question,
-                            "search_method": "fallback_products",
-                            "scenario": scenario
-                        }
-                    }
-            
-            # Enregistrer la réponse de l'assistant (recherche normale)
-            self.session_manager.add_message(session_id, "assistant", answer, {
-                "search_method": "similarity",
-                "scenario": scenario,
-                "sources_count": len(sources_found)
-            })
+                if answer is not None:
+                    cache = "exact"
+                    yield {"event": "token", "data": {"text": answer}}
+                else:
+                    cache = None
+                    # "retry" : la sortie est devenue invalide, le client ignore les fragments déjà reçus
+                    async for event in self._astream_llm(prompt):
+                        if event["event"] == "result":
+                            answer, valid = event["data"]["answer"], event["data"]["valid"]
+                            llm_calls = event["data"]["attempts"]
+                        else:
+                            yield event
+                    if self.prompt_cache and valid:
+                        await asyncio.to_thread(self.prompt_cache.put, prompt, self._llm_params(), answer)
+                
+                if query_embedding is not None and valid:
+                    self.semantic_cache.store(query_embedding, plan["scenario"], self.tag_index.version,
+                                              {"answer": answer, "plan": final_plan})
             
-            # Formater les sources
-            sources = []
-            for doc in sources_found:
-                sources.append({
-                    "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                    "metadata": doc.metadata,
-                    "source": doc.metadata.get("source", "Unknown")
-                })
-            
-            return {
-                "answer": answer,
-                "sources": sources[:max_results],
-                "session_id": session_id,
-                "metadata": {
-                    "total_sources": len(sources_found),
-                    "query": question,
-                    "search_method": "similarity",
-                    "scenario": scenario
-                }
-            }
+            # Enregistrée seulement si le flux est allé jusqu'au bout
+            await self.session_manager.aadd_message(session_id, "assistant", answer, self._message_metadata(final_plan, cache))
+            
+            response = self._build_response(question, session_id, final_plan, answer, max_results, cache, llm_calls, valid)
+            yield {"event": "done", "data": response}
             
         except Exception as e:
-            logger.error(f"❌ Erreur lors de la requête: {e}")
+            logger.error(f"❌ Erreur lors de la requête en flux: {e}")
             raise
     
     def get_collection_info(self) -> Dict[str, Any]:
@@ -756,12 +1072,18 @@ Réponds UNIQUEMENT avec un JSON valide selon le guide de structure :"""
             collection = self.vectorstore._collection
             count = collection.count()
             
-            return {
+            info = {
                 "status": "ready",
                 "count": count,
+                "backend": self.vectorstore_backend,
+                "tag_filtering": self.tag_filtering,
                 "embedding_model": "text-embedding-3-small",
                 "llm_model": "gpt-4o-mini"
             }
+            # Backend numpy : index de recherche (exact, ivf ou hnsw) et ses paramètres
+            if hasattr(collection, "get_stats"):
+                info["index"] = collection.get_stats()["index"]
+            return info
             
         except Exception as e:
             logger.error(f"❌ Erreur lors de la récupération des infos: {e}")
@@ -770,6 +1092,11 @@ Réponds UNIQUEMENT avec un JSON valide selon le guide de structure :"""
 # Instance globale du système RAG
 rag_system = RAGSystem()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Vide la file d'écriture des messages et ferme les connexions SQLite"""
+    rag_system.session_manager.close()
+
 # Routes API
 @app.get("/")
 async def root():
@@ -791,7 +1118,7 @@ async def health_check():
 async def query_knowledge_base(request: QueryRequest):
     """Effectue une requête sur la base de connaissances avec gestion de session"""
     try:
-        result = rag_system.query(
+        result = await rag_system.aquery(
             question=request.query,
             session_id=request.session_id,
             max_results=request.max_results
@@ -808,16 +1135,56 @@ async def query_knowledge_base(request: QueryRequest):
         logger.error(f"❌ Erreur lors de la requête: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def stream_query_knowledge_base(request: QueryRequest):
+    """
+    Variante en flux de /query (Server-Sent Events) : les tokens du LLM sont envoyés au fil de la
+    génération (événements "token"), l'événement "done" porte la réponse complète, les sources et
+    les métadonnées. En cas d'erreur, un événement "error" termine le flux.
+    """
+    async def events():
+        try:
+            async for event in rag_system.astream_query(
+                question=request.query,
+                session_id=request.session_id,
+                max_results=request.max_results
+            ):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Pas de mise en tampon par les proxys (nginx) ni de cache
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/search")
+async def search_knowledge_base(request: SearchRequest):
+    """Recherche par similarité, restreinte aux chunks portant tous les tags demandés (sans LLM)"""
+    try:
+        if request.tags:
+            docs = await asyncio.to_thread(rag_system.similarity_search_by_tags, request.query, request.tags, request.k)
+        else:
+            docs = await asyncio.to_thread(rag_system.vectorstore.similarity_search, request.query, k=request.k)
+        return {"query": request.query, "tags": request.tags, "results": rag_system._format_sources(docs)}
+        
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la recherche: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/reload")
 async def reload_knowledge_base():
     """Recharge la base de connaissances"""
     try:
-        rag_system.load_knowledge_base()
+        sync = await asyncio.to_thread(rag_system.load_knowledge_base)
         info = rag_system.get_collection_info()
         
         return {
             "status": "success",
-            "message": "Base de connaissances rechargée",
+            "message": "Base de connaissances synchronisée",
+            "sync": sync,
             "info": info
         }
         
@@ -833,6 +1200,16 @@ async def get_system_info():
     return {
         "system": "Fraym RAG avec LangChain",
         "vectorstore": info,
+        "kb_version": rag_system.tag_index.version,
+        "semantic_cache": rag_system.semantic_cache.get_stats(),
+        "prompt_cache": rag_system.prompt_cache.get_stats() if rag_system.prompt_cache else None,
+        "query_router": rag_system.query_router.get_stats(),
+        "bm25_index": rag_system.bm25_index.get_stats() if rag_system.bm25_index else None,
+        "reranker": rag_system.reranker.get_stats() if rag_system.reranker else None,
+        "context_packer": rag_system.context_packer.get_stats() if rag_system.context_packer else None,
+        "session_store": rag_system.session_manager.get_stats(),
+        "embedding_cache": rag_system.embeddings.get_stats() if isinstance(rag_system.embeddings, CachedEmbeddings) else None,
+        "json_validation": rag_system.json_guard.get_stats() if rag_system.json_guard else None,
         "knowledge_path": str(rag_system.knowledge_base_path),
         "chroma_path": rag_system.chroma_db_path
     }
@@ -842,11 +1219,13 @@ async def get_system_info():
 async def create_session(request: SessionCreate):
     """Crée une nouvelle session de conversation"""
     try:
-        session_id = rag_system.session_manager.create_session(request.title)
+        session_id = await rag_system.session_manager.acreate_session(request.title, request.metadata)
+        # Titre par défaut du stockage si aucun n'est fourni
+        info = await rag_system.session_manager.aget_session_info(session_id)
         return SessionResponse(
             session_id=session_id,
-            title=request.title,
-            created_at=rag_system.session_manager.get_session_info(session_id)["created_at"],
+            title=info["title"],
+            created_at=info["created_at"],
             message_count=0
         )
     except Exception as e:
@@ -854,33 +1233,60 @@ async def create_session(request: SessionCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/sessions")
-async def list_sessions():
-    """Liste toutes les sessions"""
+async def list_sessions(limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                        title: Optional[str] = None, updated_after: Optional[str] = None,
+                        min_messages: int = Query(0, ge=0)):
+    """
+    Liste les sessions par pages, des plus récemment mises à jour aux plus anciennes : la page suivante
+    s'obtient avec cursor=next_cursor (null à la dernière page). Filtres : title (contenu dans le titre),
+    updated_after ('YYYY-MM-DD HH:MM:SS', UTC), min_messages
+    """
     try:
-        sessions = rag_system.session_manager.get_sessions()
-        return {"sessions": sessions}
+        # Une session de plus que la page : indique s'il reste des sessions
+        sessions = await rag_system.session_manager.aget_sessions(limit + 1, cursor, title, updated_after,
+                                                                  min_messages)
+        has_more = len(sessions) > limit
+        sessions = sessions[:limit]
+        return {
+            "sessions": sessions,
+            "next_cursor": encode_session_cursor(sessions[-1]) if has_more else None
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Erreur lors de la récupération des sessions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/sessions/{session_id}/history")
-async def get_session_history(session_id: str):
-    """Récupère l'historique d'une session"""
+async def get_session_history(session_id: str, limit: int = Query(50, ge=1, le=500),
+                              before: Optional[int] = None):
+    """
+    Récupère l'historique d'une session par pages, des messages les plus récents aux plus anciens :
+    la page suivante s'obtient avec before=next_cursor (null quand le début de la session est atteint)
+    """
     try:
-        if not rag_system.session_manager.session_exists(session_id):
+        if not await rag_system.session_manager.asession_exists(session_id):
             raise HTTPException(status_code=404, detail="Session non trouvée")
         
-        history = rag_system.session_manager.get_session_history(session_id)
+        # Un message de plus que la page : indique s'il reste des messages plus anciens
+        history = await rag_system.session_manager.aget_session_history(session_id, limit + 1, before)
+        has_more = len(history) > limit
+        history = history[-limit:]
         messages = []
         for msg in history:
             messages.append(MessageResponse(
+                id=msg["id"],
                 role=msg["role"],
                 content=msg["content"],
                 timestamp=msg["timestamp"],
                 metadata=msg["metadata"]
             ))
         
-        return {"session_id": session_id, "messages": messages}
+        return {
+            "session_id": session_id,
+            "messages": messages,
+            "next_cursor": history[0]["id"] if has_more else None
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -891,10 +1297,10 @@ async def get_session_history(session_id: str):
 async def update_session(session_id: str, request: SessionUpdate):
     """Met à jour le titre d'une session"""
     try:
-        if not rag_system.session_manager.session_exists(session_id):
+        if not await rag_system.session_manager.asession_exists(session_id):
             raise HTTPException(status_code=404, detail="Session non trouvée")
         
-        rag_system.session_manager.update_session_title(session_id, request.title)
+        await rag_system.session_manager.aupdate_session_title(session_id, request.title)
         return {"message": "Session mise à jour avec succès"}
     except HTTPException:
         raise
@@ -906,10 +1312,10 @@ async def update_session(session_id: str, request: SessionUpdate):
 async def delete_session(session_id: str):
     """Supprime une session"""
     try:
-        if not rag_system.session_manager.session_exists(session_id):
+        if not await rag_system.session_manager.asession_exists(session_id):
             raise HTTPException(status_code=404, detail="Session non trouvée")
         
-        rag_system.session_manager.delete_session(session_id)
+        await rag_system.session_manager.adelete_session(session_id)
         return {"message": "Session supprimée avec succès"}
     except HTTPException:
         raise
@@ -0,0 +1,485 @@
+import os
+import json
+import uuid
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Iterable, Sequence, Tuple, Callable
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from tag_index import parse_tags, filter_tags
+
+logger = logging.getLogger(__name__)
+
+# Backends de base vectorielle (VECTORSTORE_BACKEND) et dossier par défaut de chacun
+VECTORSTORE_BACKENDS = {"chroma": "./chroma_langchain_db", "numpy": "./numpy_vectorstore"}
+
+# Fichier de référence du stockage : écrit en dernier, il désigne le fichier de vecteurs courant
+STORE_FILE = "store.json"
+
+
+def create_vectorstore(backend: str, persist_directory: str, embeddings: Embeddings,
+                       ann_index=None) -> VectorStore:
+    """Ouvre (ou crée) la base vectorielle du backend demandé"""
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        if ann_index is not None:
+            logger.warning(f"⚠️ Chroma utilise son propre index HNSW : index {ann_index.kind} ignoré")
+        return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    if backend == "numpy":
+        return NumpyVectorStore(persist_directory=persist_directory, embedding_function=embeddings,
+                                ann_index=ann_index)
+    raise ValueError(f"Backend de base vectorielle inconnu: {backend} (attendu: {', '.join(VECTORSTORE_BACKENDS)})")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Normalise les lignes (la similarité cosinus devient un produit scalaire)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyCollection:
+    """
+    Collection de vecteurs en mémoire, avec le sous-ensemble de l'API de collection ChromaDB utilisé
+    par l'ingestion et la synchronisation (count, get, upsert, delete).
+
+    Les embeddings sont normalisés et stockés en float32 dans un fichier .npy ouvert en mmap :
+    l'ouverture ne lit pas les vecteurs, et plusieurs workers partagent les mêmes pages du cache
+    système. Les écritures se font sur une copie en mémoire (capacité doublée au besoin, suppression
+    par échange avec la dernière ligne) et sont persistées par persist() : nouveau fichier de vecteurs
+    puis remplacement atomique de store.json. Un masque booléen par tag permet de restreindre la
+    recherche aux chunks portant des tags avant le calcul des scores.
+
+    Chaque lecture ou écriture compare store.json (inode, date, taille) à celui qui a été chargé : la
+    collection persistée par un autre worker (synchronisation de la base) est rouverte, sauf si des
+    écritures locales ne sont pas encore persistées.
+
+    ann_index (ann_index.py, optionnel) remplace la recherche exhaustive par une recherche approximative
+    au-delà de ann_index.min_chunks : il est tenu à jour à chaque écriture, (ré)entraîné par persist()
+    quand nécessaire et persisté à côté du fichier de vecteurs.
+    """
+
+    def __init__(self, persist_directory: str, ann_index=None):
+        self.persist_directory = persist_directory
+        self._ann = ann_index
+        os.makedirs(persist_directory, exist_ok=True)
+
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        # Lignes [0, _size) valides ; memmap en lecture seule tant qu'aucune écriture n'a eu lieu
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        self._tag_masks: Dict[str, np.ndarray] = {}
+        self._vectors_file: Optional[str] = None
+        self._ann_file: Optional[str] = None
+        self._generation = 0
+        self._dirty = False
+        # Signature de store.json au chargement ou à la dernière persistance
+        self._store_stat: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.RLock()
+        try:
+            self._load()
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du chargement des vecteurs numpy: {e}")
+            raise
+
+    def _stat_store(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.persist_directory, STORE_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """Ouvre la collection persistée ; l'état courant n'est remplacé qu'une fois les vecteurs ouverts"""
+        store_stat = self._stat_store()
+        if store_stat is None:
+            return
+        with open(os.path.join(self.persist_directory, STORE_FILE), "r", encoding="utf-8") as f:
+            store = json.load(f)
+        size = len(store["ids"])
+        vectors = np.load(os.path.join(self.persist_directory, store["vectors"]), mmap_mode="r") if size else None
+        positions: Dict[str, List[int]] = {}
+        for position, metadata in enumerate(store["metadatas"]):
+            for tag in parse_tags(metadata):
+                positions.setdefault(tag, []).append(position)
+        tag_masks = {}
+        for tag, tag_positions in positions.items():
+            mask = tag_masks[tag] = np.zeros(size, dtype=bool)
+            mask[tag_positions] = True
+
+        self._ids = store["ids"]
+        self._documents = store["documents"]
+        self._metadatas = store["metadatas"]
+        self._positions = {chunk_id: position for position, chunk_id in enumerate(self._ids)}
+        self._size = size
+        self._vectors = vectors
+        self._tag_masks = tag_masks
+        self._generation = store["generation"]
+        self._vectors_file = store["vectors"]
+        self._ann_file = None
+        self._store_stat = store_stat
+        if self._ann is not None:
+            self._ann.reset()
+        self._load_ann(store.get("ann"))
+        logger.info(f"📂 Vecteurs ouverts en mmap: {self._size} chunks depuis {self.persist_directory}")
+
+    def _refresh(self):
+        """Rouvre la collection si un autre worker l'a persistée depuis son chargement"""
+        with self._lock:
+            if self._dirty:
+                return
+            store_stat = self._stat_store()
+            if store_stat is None or store_stat == self._store_stat:
+                return
+            try:
+                self._load()
+            except Exception as e:
+                # Fichiers remplacés pendant la lecture : nouvel essai à la prochaine lecture
+                logger.warning(f"⚠️ Rechargement des vecteurs numpy reporté: {e}")
+
+    def _load_ann(self, saved: Optional[Dict[str, str]]):
+        """Index approximatif persisté avec les vecteurs, reconstruit en mémoire s'il manque"""
+        if self._ann is None or not self._size:
+            return
+        if saved and saved["kind"] == self._ann.kind:
+            path = os.path.join(self.persist_directory, saved["file"])
+            if os.path.exists(path):
+                try:
+                    self._ann.load(path, self._size, self._vectors.shape[1])
+                    self._ann_file = saved["file"]
+                    return
+                except Exception as e:
+                    logger.warning(f"⚠️ Index {self._ann.kind} de {self.persist_directory} inutilisable: {e}")
+        if self._ann.needs_fit(self._size):
+            logger.warning(f"⚠️ Index {self._ann.kind} absent ou inutilisable dans {self.persist_directory}, "
+                           f"construit en mémoire (persisté à la prochaine synchronisation)")
+            self._ann.fit(self._vectors[:self._size])
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return None if self._vectors is None else self._vectors.shape[1]
+
+    def count(self) -> int:
+        self._refresh()
+        return self._size
+
+    def get(self, ids: Optional[List[str]] = None, include: Sequence[str] = ("documents", "metadatas"),
+            limit: Optional[int] = None, offset: Optional[int] = None) -> Dict[str, Any]:
+        """Lecture par ids ou paginée (même format de résultat que ChromaDB)"""
+        self._refresh()
+        with self._lock:
+            if ids is not None:
+                positions = [self._positions[chunk_id] for chunk_id in ids if chunk_id in self._positions]
+            else:
+                start = offset or 0
+                end = self._size if limit is None else min(self._size, start + limit)
+                positions = range(start, end)
+            results: Dict[str, Any] = {"ids": [self._ids[position] for position in positions]}
+            if "documents" in include:
+                results["documents"] = [self._documents[position] for position in positions]
+            if "metadatas" in include:
+                results["metadatas"] = [self._metadatas[position] for position in positions]
+            if "embeddings" in include:
+                results["embeddings"] = [np.array(self._vectors[position]) for position in positions]
+            return results
+
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]],
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Ajoute ou remplace des chunks (en mémoire jusqu'à persist())"""
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        self._refresh()
+        with self._lock:
+            if self._vectors is not None and vectors.shape[1] != self._vectors.shape[1]:
+                raise ValueError(f"Dimension {vectors.shape[1]} incompatible avec la collection ({self._vectors.shape[1]})")
+            new_ids = [chunk_id for chunk_id in dict.fromkeys(ids) if chunk_id not in self._positions]
+            self._reserve(self._size + len(new_ids), vectors.shape[1])
+            written = []
+            for chunk_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                metadata = metadata or {}
+                position = self._positions.get(chunk_id)
+                if position is None:
+                    position = self._size
+                    self._size += 1
+                    self._positions[chunk_id] = position
+                    self._ids.append(chunk_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                else:
+                    self._clear_tags(position)
+                    self._documents[position] = document
+                    self._metadatas[position] = metadata
+                self._vectors[position] = vector
+                self._set_tags(position, metadata)
+                written.append(position)
+            if self._ann is not None:
+                self._ann.update(np.array(written), vectors)
+            self._dirty = True
+
+    def delete(self, ids: Iterable[str]):
+        """Retire des chunks : la dernière ligne prend la place de chaque ligne supprimée"""
+        self._refresh()
+        with self._lock:
+            for chunk_id in ids:
+                position = self._positions.pop(chunk_id, None)
+                if position is None:
+                    continue
+                self._reserve(self._size, self._vectors.shape[1])
+                last = self._size - 1
+                self._clear_tags(position)
+                if self._ann is not None:
+                    self._ann.remove([last])
+                if position != last:
+                    moved = self._ids[last]
+                    self._positions[moved] = position
+                    self._ids[position] = moved
+                    self._documents[position] = self._documents[last]
+                    self._metadatas[position] = self._metadatas[last]
+                    self._vectors[position] = self._vectors[last]
+                    for mask in self._tag_masks.values():
+                        mask[position] = mask[last]
+                        mask[last] = False
+                    if self._ann is not None:
+                        self._ann.update(np.array([position]), self._vectors[position:position + 1])
+                self._ids.pop()
+                self._documents.pop()
+                self._metadatas.pop()
+                self._size -= 1
+                self._dirty = True
+
+    def _reserve(self, size: int, dimension: int):
+        """Copie modifiable des vecteurs (et masques) d'au moins size lignes"""
+        writable = isinstance(self._vectors, np.ndarray) and not isinstance(self._vectors, np.memmap)
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        if writable and size <= capacity:
+            return
+        capacity = max(size, capacity * 2 if writable else capacity, 1024)
+        vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        if self._size:
+            vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        for tag, mask in self._tag_masks.items():
+            grown = np.zeros(capacity, dtype=bool)
+            grown[:len(mask)] = mask
+            self._tag_masks[tag] = grown
+
+    def _set_tags(self, position: int, metadata: Dict[str, Any]):
+        for tag in parse_tags(metadata):
+            mask = self._tag_masks.get(tag)
+            if mask is None:
+                mask = self._tag_masks[tag] = np.zeros(len(self._vectors), dtype=bool)
+            mask[position] = True
+
+    def _clear_tags(self, position: int):
+        for tag in parse_tags(self._metadatas[position]):
+            mask = self._tag_masks.get(tag)
+            if mask is not None:
+                mask[position] = False
+
+    def persist(self):
+        """Écrit les vecteurs dans un nouveau fichier .npy puis remplace store.json (atomique)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                generation = self._generation + 1
+                vectors_file = f"vectors-{generation}.npy"
+                vectors_path = os.path.join(self.persist_directory, vectors_file)
+                with open(f"{vectors_path}.tmp", "wb") as f:
+                    np.save(f, self._vectors[:self._size])
+                os.replace(f"{vectors_path}.tmp", vectors_path)
+
+                # Index approximatif : entraîné au premier passage de min_chunks (ou à revoir), puis persisté
+                ann_file = None
+                if self._ann is not None:
+                    if self._ann.needs_fit(self._size):
+                        self._ann.fit(self._vectors[:self._size])
+                    if self._ann.ready:
+                        ann_file = f"ann-{generation}.{self._ann.kind}"
+                        self._ann.save(os.path.join(self.persist_directory, ann_file), self._size)
+
+                store_path = os.path.join(self.persist_directory, STORE_FILE)
+                with open(f"{store_path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump({"version": 1, "generation": generation, "vectors": vectors_file,
+                               "ann": {"kind": self._ann.kind, "file": ann_file} if ann_file else None,
+                               "ids": self._ids, "documents": self._documents, "metadatas": self._metadatas},
+                              f, ensure_ascii=False)
+                os.replace(f"{store_path}.tmp", store_path)
+                self._store_stat = self._stat_store()
+
+                # Les workers qui ont encore l'ancien fichier en mmap gardent leurs pages après la suppression
+                for old_file, new_file in ((self._vectors_file, vectors_file), (self._ann_file, ann_file)):
+                    if old_file and old_file != new_file:
+                        old_path = os.path.join(self.persist_directory, old_file)
+                        if os.path.exists(old_path):
+                            os.remove(old_path)
+                self._vectors_file, self._ann_file, self._generation = vectors_file, ann_file, generation
+
+                # Retour au mmap : la copie en mémoire est libérée au profit du cache système
+                self._vectors = np.load(vectors_path, mmap_mode="r") if self._size else None
+                for tag, mask in self._tag_masks.items():
+                    self._tag_masks[tag] = mask[:self._size].copy()
+                self._dirty = False
+                logger.info(f"💾 Vecteurs numpy persistés: {self._size} chunks ({vectors_file})")
+            except Exception as e:
+                logger.error(f"❌ Erreur lors de la persistance des vecteurs numpy: {e}")
+                raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._refresh()
+        with self._lock:
+            return {
+                "chunks": self._size,
+                "dimension": self.dimension,
+                "generation": self._generation,
+                "tags": len(self._tag_masks),
+                "index": self._ann.get_stats() if self._ann is not None else {"kind": "exact"}
+            }
+
+    def tag_mask(self, tags: Sequence[str]) -> Optional[np.ndarray]:
+        """Masque des chunks portant tous les tags (None si aucun tag demandé)"""
+        if not tags:
+            return None
+        with self._lock:
+            mask = np.ones(self._size, dtype=bool)
+            for tag in tags:
+                tag_mask = self._tag_masks.get(tag)
+                if tag_mask is None:
+                    return np.zeros(self._size, dtype=bool)
+                mask &= tag_mask[:self._size]
+            return mask
+
+    def search(self, queries: Sequence[Sequence[float]], k: int = 4,
+               tags: Sequence[str] = ()) -> List[List[Tuple[Document, float]]]:
+        """
+        Top-k par similarité cosinus pour un lot de requêtes (une multiplication matrice-vecteurs, ou
+        l'index approximatif s'il est actif), restreint aux chunks portant tous les tags demandés
+        """
+        queries = _normalize(np.asarray(queries, dtype=np.float32).reshape(len(queries), -1))
+        self._refresh()
+        with self._lock:
+            if not self._size or k <= 0:
+                return [[] for _ in queries]
+            vectors = self._vectors[:self._size]
+            mask = self.tag_mask(tags)
+            if mask is not None and not mask.any():
+                return [[] for _ in queries]
+
+            use_ann = self._ann is not None and self._ann.ready and self._size >= self._ann.min_chunks
+            rankings = [self._ann.search(vectors, query, k, mask) for query in queries] if use_ann \
+                else [None] * len(queries)
+            # Recherche exacte (pas d'index ou index incapable de fournir k résultats)
+            exact = [row for row, ranking in enumerate(rankings) if ranking is None]
+            if exact:
+                for row, ranking in zip(exact, self._exact_search(vectors, queries[exact], k, mask)):
+                    rankings[row] = ranking
+
+            return [[(Document(page_content=self._documents[position], metadata=dict(self._metadatas[position]),
+                               id=self._ids[position]), float(score))
+                     for position, score in zip(positions.tolist(), scores.tolist())]
+                    for positions, scores in rankings]
+
+    def _exact_search(self, vectors: np.ndarray, queries: np.ndarray, k: int,
+                      mask: Optional[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k exact (positions, scores) de chaque requête"""
+        candidates = None
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+            # Peu de candidats : seules leurs lignes sont copiées puis scorées (la copie coûte
+            # environ deux fois la lecture, au-delà d'un quart des chunks un masque est plus rapide)
+            if len(candidates) * 4 <= self._size:
+                vectors = vectors[candidates]
+            else:
+                candidates = None
+        scores = queries @ vectors.T
+        if mask is not None and candidates is None:
+            scores[:, ~mask] = -np.inf
+
+        k = min(k, scores.shape[1] if mask is None else int(mask.sum()))
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (len(queries), 1))
+        rankings = []
+        for row, row_top in enumerate(top):
+            row_scores = scores[row, row_top]
+            order = np.argsort(-row_scores, kind="stable")
+            positions = row_top[order]
+            rankings.append((candidates[positions] if candidates is not None else positions, row_scores[order]))
+        return rankings
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Base vectorielle LangChain sur NumpyCollection : alternative à Chroma sans client ni SQLite
+    (VECTORSTORE_BACKEND=numpy). Les recherches acceptent tags=[...] pour filtrer par tag, ou le même
+    filtre que Chroma (filter=tag_filter([...]), champs tag_<nom>) : search_kwargs est commun aux deux backends.
+    """
+
+    def __init__(self, persist_directory: str, embedding_function: Embeddings, ann_index=None):
+        self._embedding_function = embedding_function
+        self._collection = NumpyCollection(persist_directory, ann_index=ann_index)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding_function.embed_documents(texts)
+        self._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        self._collection.persist()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids:
+            self._collection.delete(ids)
+            self._collection.persist()
+        return True
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        results = self._collection.get(ids=list(ids))
+        return [Document(page_content=content, metadata=metadata, id=chunk_id)
+                for chunk_id, content, metadata in zip(results["ids"], results["documents"], results["metadatas"])]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, tags: Sequence[str] = (),
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self._collection.search([embedding], k, [*tags, *filter_tags(filter)])[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, tags: Sequence[str] = (),
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k, tags, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, tags: Sequence[str] = (),
+                                     filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k, tags, filter)
+
+    def similarity_search(self, query: str, k: int = 4, tags: Sequence[str] = (),
+                          filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, tags, filter)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores déjà en similarité cosinus
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, persist_directory: str = VECTORSTORE_BACKENDS["numpy"],
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(persist_directory=persist_directory, embedding_function=embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
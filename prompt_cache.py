@@ -0,0 +1,203 @@
+import sqlite3
+import hashlib
+import json
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryPromptCacheBackend:
+    """Stockage en mémoire, borné en octets (éviction LRU)"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.encode("utf-8"))
+            self._entries[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.encode("utf-8"))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes,
+                    "evictions": self.evictions}
+
+
+class SQLitePromptCacheBackend:
+    """Stockage persistant dans SQLite, borné en octets (éviction du moins récemment utilisé)"""
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str = "prompt_cache.db", max_bytes: int = 256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS prompt_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_prompt_cache_last_access
+                ON prompt_cache (last_access)
+            """)
+        self._size = self._total_size()
+
+    def _total_size(self) -> int:
+        """Taille totale des entrées, relue dans la base (partagée par les workers)"""
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM prompt_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM prompt_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE prompt_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def set(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            with self._conn:
+                # Verrou d'écriture dès le début : la taille relue inclut les écritures des autres workers
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute("""
+                    INSERT OR REPLACE INTO prompt_cache (key, value, size, last_access)
+                    VALUES (?, ?, ?, ?)
+                """, (key, value, size, time.time()))
+                self._size = self._total_size()
+                if self._size > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        """Supprime les entrées les plus anciennes jusqu'à repasser sous la limite (transaction en cours)"""
+        rows = self._conn.execute("SELECT key, size FROM prompt_cache ORDER BY last_access ASC").fetchall()
+        removed = []
+        for key, size in rows:
+            if self._size <= self.max_bytes:
+                break
+            removed.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM prompt_cache WHERE key = ?", removed)
+        self.evictions += len(removed)
+
+    def clear(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM prompt_cache")
+            self._size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, self._size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM prompt_cache"
+            ).fetchone()
+            return {"entries": entries, "bytes": self._size, "max_bytes": self.max_bytes,
+                    "evictions": self.evictions, "path": self.db_path}
+
+
+class PromptCache:
+    """
+    Cache exact des sorties du LLM, adressé par le contenu : la clé est le hash du prompt final
+    et des paramètres du modèle. Un prompt identique n'atteint jamais le modèle deux fois.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = {"hits": 0, "misses": 0}
+        # Lectures exécutées dans des threads (asyncio.to_thread)
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, backend: str = "memory", path: str = "prompt_cache.db", max_mb: float = 64) -> Optional["PromptCache"]:
+        """Crée le cache selon la configuration (None si désactivé)"""
+        max_bytes = int(max_mb * 1024 * 1024)
+        if backend == "none":
+            return None
+        if backend == "memory":
+            return cls(MemoryPromptCacheBackend(max_bytes=max_bytes))
+        if backend == "sqlite":
+            return cls(SQLitePromptCacheBackend(db_path=path, max_bytes=max_bytes))
+        raise ValueError(f"Backend de cache de prompts inconnu: {backend}")
+
+    @staticmethod
+    def make_key(prompt: str, model_params: Dict[str, Any]) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps(model_params, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, prompt: str, model_params: Dict[str, Any]) -> Optional[str]:
+        try:
+            value = self.backend.get(self.make_key(prompt, model_params))
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture du cache de prompts impossible: {e}")
+            value = None
+        with self._stats_lock:
+            self.stats["misses" if value is None else "hits"] += 1
+        return value
+
+    def put(self, prompt: str, model_params: Dict[str, Any], output: str):
+        try:
+            self.backend.set(self.make_key(prompt, model_params), output)
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture dans le cache de prompts impossible: {e}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "backend": self.backend.name,
+            **stats,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            **self.backend.get_stats()
+        }
@@ -0,0 +1,93 @@
+import threading
+import logging
+from typing import List, Dict, Any, FrozenSet, Optional
+
+from tagger import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+# Mots-clés indiquant une question sur les produits (logique élargie)
+PRODUCT_KEYWORDS = [
+    # Mots directs
+    'produit', 'product', 'liste', 'catalog', 'catalogue', 'disponible', 'prix',
+    # Produits spécifiques
+    'smartphone', 'ordinateur', 'iphone', 'samsung', 'macbook', 'airpods', 'dell',
+    # Actions d'achat/recommandation
+    'acheter', 'achat', 'buy', 'purchase', 'commander', 'order',
+    'cadeau', 'cadeaux', 'gift', 'offrir', 'offer',
+    'proposer', 'propose', 'recommander', 'recommend', 'suggérer', 'suggest',
+    'cherche', 'search', 'trouve', 'find', 'besoin', 'need', 'veux', 'want',
+    # Contextes commerciaux
+    'boutique', 'magasin', 'shop', 'store', 'vendre', 'sell', 'vente', 'sale',
+    'choisir', 'choose', 'sélectionner', 'select', 'comparer', 'compare',
+    # Termes généraux qui impliquent souvent des produits
+    'que me', 'qu\'avez', 'avez-vous', 'do you have', 'what do you',
+    'me conseillez', 'me proposez', 'me recommandez'
+]
+
+# Mots-clés déclenchant le fallback vers les produits
+FALLBACK_KEYWORDS = ['recommand', 'conseil', 'suggest', 'propose', 'que faire', 'quoi', 'help', 'aide']
+
+# Mots-clés par scénario (utilisés par detect_scenario)
+SCENARIO_KEYWORDS = {
+    'ecommerce': ['produit', 'acheter', 'prix', 'catalogue', 'recommandation', 'commander', 'panier'],
+    'single_product': ['détails', 'spécifications', 'caractéristiques', 'fiche produit', 'plus d\'infos', 'description complète'],
+    'restaurant': ['menu', 'plat', 'restaurant', 'réserver', 'carte', 'table', 'cuisine'],
+    'support': ['aide', 'problème', 'retour', 'livraison', 'garantie', 'support', 'contact'],
+    'comparison': ['comparer', 'différence', 'vs', 'versus', 'mieux', 'choisir'],
+    'landing': ['bonjour', 'salut', 'hello', 'bienvenue', 'aide-moi', 'que faire']
+}
+
+DEFAULT_INTENTS = {'product': PRODUCT_KEYWORDS, 'fallback': FALLBACK_KEYWORDS, **SCENARIO_KEYWORDS}
+
+
+class QueryRouter:
+    """
+    Routeur de requêtes : toutes les listes de mots-clés (produit, fallback, scénarios) sont compilées
+    en un seul KeywordMatcher ; route() retourne l'ensemble des intentions reconnues en une passe.
+    Les requêtes étant courtes, l'expression combinée est plus rapide quel que soit le nombre de
+    mots-clés (bench_query_router.py) : c'est la stratégie par défaut.
+    """
+
+    def __init__(self, intents: Optional[Dict[str, List[str]]] = None, strategy: str = "regex"):
+        intents = intents if intents is not None else DEFAULT_INTENTS
+        self.names = list(intents)
+        self.matcher = KeywordMatcher([intents[name] for name in self.names], strategy)
+
+        # masque -> ensemble d'intentions (construit à la demande) et compteur de requêtes par masque
+        self._intents: Dict[int, FrozenSet[str]] = {}
+        self._mask_counts: Dict[int, int] = {}
+        self._queries = 0
+        self._lock = threading.Lock()
+
+    def route(self, query: str) -> FrozenSet[str]:
+        """Intentions reconnues dans la requête (comparaison en minuscules)"""
+        mask = self.matcher.match(query.lower())
+        with self._lock:
+            self._queries += 1
+            self._mask_counts[mask] = self._mask_counts.get(mask, 0) + 1
+            intents = self._intents.get(mask)
+            if intents is None:
+                intents = frozenset(name for index, name in enumerate(self.names) if mask >> index & 1)
+                self._intents[mask] = intents
+        return intents
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Nombre de requêtes routées et de correspondances par intention"""
+        with self._lock:
+            counters = {name: 0 for name in self.names}
+            for mask, count in self._mask_counts.items():
+                for index, name in enumerate(self.names):
+                    if mask >> index & 1:
+                        counters[name] += count
+            return {
+                "queries": self._queries,
+                "strategy": self.matcher.strategy,
+                "keywords": len(self.matcher),
+                "matches": counters
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._mask_counts.clear()
+            self._queries = 0
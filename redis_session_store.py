@@ -0,0 +1,456 @@
+import calendar
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+import logging
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from urllib.parse import urlparse, unquote
+
+from session_store import SessionStore, SESSION_TIMESTAMP_FORMAT, check_session_timestamp, decode_session_cursor
+from session_summary import SessionSummarizer
+
+logger = logging.getLogger(__name__)
+
+
+class RedisError(Exception):
+    """Réponse d'erreur du serveur (-ERR ...)"""
+
+
+class RedisClient:
+    """
+    Client minimal du protocole Redis (RESP2), compatible Redis, Valkey, KeyDB ou Dragonfly, sans
+    dépendance : une connexion par thread (WATCH est lié à la connexion), commandes envoyées seules ou
+    en pipeline (une transaction MULTI/EXEC en un aller-retour). Une connexion en erreur est fermée et
+    rouverte à l'appel suivant.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", timeout: float = 5.0):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"URL Redis non supportée: {url} (attendu: redis://[:mot_de_passe@]hôte:port/base)")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[socket.socket] = []
+        self._connections_lock = threading.Lock()
+
+    @staticmethod
+    def _encode(command: Sequence[Any]) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for argument in command:
+            data = argument if isinstance(argument, bytes) else str(argument).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read(self, reader) -> Any:
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connexion Redis fermée")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            return RedisError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connexion Redis fermée")
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            return None if length == -1 else [self._read(reader) for _ in range(length)]
+        raise ConnectionError(f"Réponse Redis invalide: {line[:50]!r}")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = (sock, sock.makefile("rb"))
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(sock)
+
+            setup = []
+            if self.password:
+                setup.append(["AUTH", self.username, self.password] if self.username else ["AUTH", self.password])
+            if self.db:
+                setup.append(["SELECT", self.db])
+            if setup:
+                self._exchange(connection, setup)
+        return connection
+
+    def _exchange(self, connection, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        sock, reader = connection
+        try:
+            sock.sendall(b"".join(self._encode(command) for command in commands))
+            replies = [self._read(reader) for _ in commands]
+        except OSError:
+            self.reset()
+            raise
+        # Erreurs levées après lecture de toutes les réponses : la connexion reste synchronisée
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """Envoie les commandes en un seul écrit et retourne leurs réponses, dans l'ordre"""
+        return self._exchange(self._connection(), commands)
+
+    def execute(self, *command) -> Any:
+        return self.pipeline([command])[0]
+
+    def reset(self):
+        """Ferme la connexion du thread courant (le serveur oublie ses WATCH en cours)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            return
+        self._local.connection = None
+        with self._connections_lock:
+            if connection[0] in self._connections:
+                self._connections.remove(connection[0])
+        try:
+            connection[0].close()
+        except OSError:
+            pass
+
+    def close(self):
+        with self._connections_lock:
+            for sock in self._connections:
+                try:
+                    sock.close()
+                except OSError as e:
+                    logger.warning(f"⚠️ Erreur lors de la fermeture d'une connexion Redis: {e}")
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions dans un serveur Redis partagé par les réplicas de l'API :
+
+    - {prefix}session:<id> : hash (titre, dates, métadonnées, contexte précalculé, compteurs) ;
+    - {prefix}messages:<id> : liste plafonnée à max_messages (les plus anciens sont retirés, leur
+      contenu reste dans le résumé du contexte) ;
+    - {prefix}sessions : ensemble trié des sessions par date de mise à jour (liste des sessions).
+
+    Les deux clés d'une session expirent ttl_seconds après sa dernière écriture. Les écritures sont des
+    transactions WATCH/MULTI/EXEC rejouées en cas d'écriture concurrente sur la même session : les ids
+    des messages se suivent et aucune mise à jour du contexte n'est perdue.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", ttl_seconds: int = 30 * 86400,
+                 max_messages: int = 500, prefix: str = "fraym:", summarizer: Optional[SessionSummarizer] = None,
+                 max_retries: int = 50, timeout: float = 5.0):
+        self.client = RedisClient(url, timeout=timeout)
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.prefix = prefix
+        self.max_retries = max_retries
+        self.summarizer = summarizer or SessionSummarizer()
+        self.index_key = f"{prefix}sessions"
+        self._stats_lock = threading.Lock()
+        self.stats = {"messages": 0, "conflicts": 0}
+
+        try:
+            self.client.execute("PING")
+            logger.info(f"✅ Stockage des sessions Redis: {self.client.host}:{self.client.port}/{self.client.db}")
+        except Exception as e:
+            logger.error(f"❌ Erreur de connexion au serveur Redis des sessions: {e}")
+            raise
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.prefix}session:{session_id}"
+
+    def _messages_key(self, session_id: str) -> str:
+        return f"{self.prefix}messages:{session_id}"
+
+    @staticmethod
+    def _now() -> Tuple[str, float]:
+        """Horodatage au format de SQLite (CURRENT_TIMESTAMP, UTC) et sa valeur en secondes"""
+        now = time.time()
+        return time.strftime(SESSION_TIMESTAMP_FORMAT, time.gmtime(now)), now
+
+    @staticmethod
+    def _score(timestamp: str) -> int:
+        """Score dans la liste des sessions d'un horodatage 'YYYY-MM-DD HH:MM:SS' (UTC)"""
+        return calendar.timegm(time.strptime(check_session_timestamp(timestamp), SESSION_TIMESTAMP_FORMAT))
+
+    def _touch(self, session_id: str, now: float) -> List[List[Any]]:
+        """Commandes de fin d'écriture : TTL des deux clés repoussé, position dans la liste des sessions"""
+        # Score à la seconde, comme updated_at : à score égal Redis trie par id, d'où l'ordre
+        # (updated_at, id) du curseur de get_sessions
+        return [
+            ["EXPIRE", self._session_key(session_id), self.ttl_seconds],
+            ["EXPIRE", self._messages_key(session_id), self.ttl_seconds],
+            ["ZADD", self.index_key, int(now), session_id],
+            ["ZREMRANGEBYSCORE", self.index_key, "-inf", now - self.ttl_seconds]
+        ]
+
+    def _transaction(self, session_id: str, fields: Sequence[str], build) -> Optional[List[Any]]:
+        """
+        Lecture de champs de la session puis écriture atomique : build(valeurs) retourne les commandes
+        de la transaction. Rejouée si la session a changé entre les deux ; None si elle n'existe pas.
+        """
+        key = self._session_key(session_id)
+        for attempt in range(self.max_retries):
+            try:
+                _, values = self.client.pipeline([["WATCH", key], ["HMGET", key, "created_at", *fields]])
+                if values[0] is None:
+                    self.client.execute("UNWATCH")
+                    return None
+                replies = self.client.pipeline([["MULTI"], *build(values[1:]), ["EXEC"]])
+            except Exception:
+                self.client.reset()
+                raise
+            if replies[-1] is not None:
+                return replies[-1]
+            with self._stats_lock:
+                self.stats["conflicts"] += 1
+            # Attente aléatoire croissante : les écrivains concurrents ne se rejouent pas en même temps
+            time.sleep(random.uniform(0, 0.005 * min(attempt + 1, 10)))
+        raise RuntimeError(f"Session {session_id} modifiée en continu : écriture abandonnée après {self.max_retries} essais")
+
+    def create_session(self, title: str = None, metadata: Dict[str, Any] = None) -> str:
+        """Crée une nouvelle session et retourne son ID"""
+        try:
+            session_id = str(uuid.uuid4())
+            title = title or self.default_title()
+            timestamp, now = self._now()
+            self.client.pipeline([
+                ["MULTI"],
+                ["HSET", self._session_key(session_id), "title", title, "created_at", timestamp,
+                 "updated_at", timestamp, "metadata", json.dumps(metadata or {}),
+                 "context", json.dumps(self.summarizer.empty()), "last_message_id", 0, "message_count", 0],
+                *self._touch(session_id, now),
+                ["EXEC"]
+            ])
+            logger.info(f"📝 Nouvelle session créée: {session_id} - {title}")
+            return session_id
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la création de session: {e}")
+            raise
+
+    def add_message(self, session_id: str, role: str, content: str, metadata: Dict[str, Any] = None) -> Optional[int]:
+        """Ajoute un message (liste plafonnée) et met à jour le contexte de la session en une transaction"""
+        try:
+            written = {}
+
+            def build(values):
+                context_json, last_id = values
+                state = json.loads(context_json) if context_json else self.summarizer.empty()
+                self.summarizer.add(state, role, content)
+                timestamp, now = self._now()
+                written["id"] = int(last_id or 0) + 1
+                message = {"id": written["id"], "timestamp": timestamp, "role": role, "content": content,
+                           "metadata": metadata or {}}
+                return [
+                    ["HSET", self._session_key(session_id), "context", json.dumps(state, ensure_ascii=False),
+                     "last_message_id", written["id"], "updated_at", timestamp, "last_message_at", timestamp],
+                    ["HINCRBY", self._session_key(session_id), "message_count", 1],
+                    ["RPUSH", self._messages_key(session_id), json.dumps(message, ensure_ascii=False)],
+                    ["LTRIM", self._messages_key(session_id), -self.max_messages, -1],
+                    *self._touch(session_id, now)
+                ]
+
+            if self._transaction(session_id, ("context", "last_message_id"), build) is None:
+                raise ValueError(f"Session {session_id} n'existe pas")
+            with self._stats_lock:
+                self.stats["messages"] += 1
+            logger.debug(f"💬 Message ajouté à la session {session_id}: {role}")
+            return written["id"]
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'ajout du message: {e}")
+            raise
+
+    def get_session_history(self, session_id: str, limit: int = 50,
+                            before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Derniers messages de la liste plafonnée (antérieurs à before_id s'il est donné)"""
+        try:
+            if limit <= 0:
+                return []
+            if before_id is None:
+                raw = self.client.execute("LRANGE", self._messages_key(session_id), -limit, -1)
+                return [json.loads(message) for message in raw]
+            # Liste plafonnée à max_messages : lue en entier, ids croissants
+            raw = self.client.execute("LRANGE", self._messages_key(session_id), 0, -1)
+            messages = [json.loads(message) for message in raw]
+            return [message for message in messages if message["id"] < before_id][-limit:]
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la récupération de l'historique: {e}")
+            raise
+
+    def get_sessions(self, limit: int = 20, cursor: Optional[str] = None, title: Optional[str] = None,
+                     updated_after: Optional[str] = None, min_messages: int = 0) -> List[Dict[str, Any]]:
+        """
+        Sessions les plus récemment mises à jour, lues par tranches dans l'ensemble trié à partir du
+        curseur (les sessions expirées sont retirées de l'index, les filtres appliqués aux hashes lus)
+        """
+        try:
+            high, after_id = "+inf", None
+            if cursor:
+                updated_at, after_id = decode_session_cursor(cursor)
+                high = self._score(updated_at)
+            low = self._score(updated_after) if updated_after else "-inf"
+            batch = max(limit, 50)
+            sessions, offset = [], 0
+            while len(sessions) < limit:
+                reply = self.client.execute("ZREVRANGEBYSCORE", self.index_key, high, low, "WITHSCORES",
+                                            "LIMIT", offset, batch)
+                if not reply:
+                    break
+                offset += len(reply) // 2
+                # Même seconde que le curseur : seules les sessions d'id inférieur suivent
+                ids = [session_id for session_id, score in zip(reply[::2], reply[1::2])
+                       if after_id is None or float(score) != high or session_id < after_id]
+                rows = self.client.pipeline([
+                    ["HMGET", self._session_key(session_id), "created_at", "updated_at", "title", "metadata",
+                     "message_count", "last_message_at"] for session_id in ids
+                ]) if ids else []
+                expired = []
+                for session_id, row in zip(ids, rows):
+                    created_at, updated_at, session_title, metadata_json, message_count, last_message_at = row
+                    if created_at is None:
+                        expired.append(session_id)
+                        continue
+                    if title and title.lower() not in (session_title or "").lower():
+                        continue
+                    if int(message_count or 0) < min_messages:
+                        continue
+                    sessions.append({
+                        "id": session_id,
+                        "created_at": created_at,
+                        "updated_at": updated_at,
+                        "title": session_title,
+                        "metadata": json.loads(metadata_json) if metadata_json else {},
+                        "message_count": int(message_count or 0),
+                        "last_message_at": last_message_at
+                    })
+                if expired:
+                    self.client.execute("ZREM", self.index_key, *expired)
+                    offset -= len(expired)
+            return sessions[:limit]
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la récupération des sessions: {e}")
+            raise
+
+    def session_exists(self, session_id: str) -> bool:
+        """Vérifie si une session existe"""
+        try:
+            return self.client.execute("EXISTS", self._session_key(session_id)) == 1
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la vérification de session: {e}")
+            return False
+
+    def get_session_info(self, session_id: str) -> Optional[dict]:
+        """Récupère les informations d'une session"""
+        try:
+            title, created_at = self.client.execute("HMGET", self._session_key(session_id), "title", "created_at")
+            if created_at is None:
+                return None
+            return {"session_id": session_id, "title": title, "created_at": created_at}
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la récupération des informations de session: {e}")
+            return None
+
+    def delete_session(self, session_id: str) -> bool:
+        """Supprime une session et tous ses messages"""
+        try:
+            deleted, _ = self.client.pipeline([
+                ["MULTI"],
+                ["DEL", self._session_key(session_id), self._messages_key(session_id)],
+                ["ZREM", self.index_key, session_id],
+                ["EXEC"]
+            ])[-1]
+            if deleted > 0:
+                logger.info(f"🗑️ Session supprimée: {session_id}")
+                return True
+            logger.warning(f"⚠️ Session non trouvée: {session_id}")
+            return False
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la suppression de session: {e}")
+            raise
+
+    def update_session_title(self, session_id: str, title: str) -> bool:
+        """Met à jour le titre d'une session"""
+        try:
+            def build(_):
+                timestamp, now = self._now()
+                return [["HSET", self._session_key(session_id), "title", title, "updated_at", timestamp],
+                        *self._touch(session_id, now)]
+
+            if self._transaction(session_id, (), build) is None:
+                logger.warning(f"⚠️ Session non trouvée pour mise à jour: {session_id}")
+                return False
+            logger.info(f"✏️ Titre de session mis à jour: {session_id} -> {title}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la mise à jour du titre: {e}")
+            raise
+
+    def get_session_context(self, session_id: str, max_messages: int = 10) -> str:
+        """Récupère le contexte précalculé d'une session pour l'IA (une lecture)"""
+        try:
+            context_json = self.client.execute("HGET", self._session_key(session_id), "context")
+            if context_json is None:
+                return ""
+            return self.summarizer.render(json.loads(context_json), max_messages)
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la récupération du contexte: {e}")
+            return ""
+
+    def cleanup_old_sessions(self, days_old: int = 30) -> int:
+        """Supprime les sessions anciennes (en plus de l'expiration par TTL)"""
+        try:
+            cutoff = time.time() - days_old * 86400
+            ids = self.client.execute("ZRANGEBYSCORE", self.index_key, "-inf", cutoff)
+            if not ids:
+                return 0
+            replies = self.client.pipeline(
+                [["DEL", self._session_key(session_id), self._messages_key(session_id)] for session_id in ids]
+                + [["ZREM", self.index_key, *ids]]
+            )
+            deleted_count = sum(1 for deleted in replies[:-1] if deleted > 0)
+            if deleted_count > 0:
+                logger.info(f"🧹 {deleted_count} sessions anciennes supprimées")
+            return deleted_count
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du nettoyage: {e}")
+            raise
+
+    def close(self):
+        self.client.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            "backend": self.backend,
+            "server": f"{self.client.host}:{self.client.port}/{self.client.db}",
+            "ttl_seconds": self.ttl_seconds,
+            "max_messages": self.max_messages,
+            **stats
+        }
@@ -0,0 +1,183 @@
+import os
+import time
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Callable, Sequence, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from bm25_index import tokenize
+from context_packer import estimate_tokens
+
+try:
+    import onnxruntime  # fourni par chromadb (fonction d'embedding par défaut)
+    from tokenizers import Tokenizer
+except ImportError:
+    onnxruntime = None
+    Tokenizer = None
+
+logger = logging.getLogger(__name__)
+
+# Scoreurs disponibles (RERANKER) ; "none" : pas de reranking
+RERANKERS = ("none", "lexical", "cross-encoder")
+
+
+def _stem(token: str) -> str:
+    """Marque du pluriel retirée (ordinateurs -> ordinateur), des deux côtés : question et chunk"""
+    return token[:-1] if len(token) > 3 and token[-1] in "sx" else token
+
+
+class LexicalScorer:
+    """
+    Score lexical d'un chunk : part de l'information de la question présente dans le chunk,
+    soit la somme des idf des termes trouvés divisée par celle de tous les termes (entre 0 et 1).
+    Les idf viennent de l'index BM25 s'il est fourni (termes rares de la base plus importants),
+    sinon tous les termes pèsent autant.
+    """
+
+    name = "lexical"
+
+    def __init__(self, bm25_index=None):
+        self.bm25_index = bm25_index
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [0.0] * len(documents)
+        idf = self.bm25_index.idf(terms) if self.bm25_index is not None else {}
+        weights: Dict[str, float] = {}
+        for term in terms:
+            stem = _stem(term)
+            weights[stem] = max(weights.get(stem, 0.0), idf.get(term, 1.0))
+        total = sum(weights.values())
+
+        scores = []
+        for document in documents:
+            found = {_stem(token) for token in tokenize(document.page_content)}
+            scores.append(sum(weight for stem, weight in weights.items() if stem in found) / total)
+        return scores
+
+
+class CrossEncoderScorer:
+    """
+    Cross-encoder ONNX exécuté sur CPU (par exemple ms-marco-MiniLM-L-6-v2 exporté en ONNX) : chaque
+    paire (question, chunk) est scorée par le modèle, toutes les paires en un seul appel. Le dossier
+    du modèle contient model.onnx et tokenizer.json ; le score est la probabilité de pertinence
+    (sigmoïde du logit), entre 0 et 1.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_path: str, max_length: int = 512):
+        if onnxruntime is None:
+            raise ImportError("onnxruntime et tokenizers sont requis pour RERANKER=cross-encoder (pip install onnxruntime tokenizers)")
+        self.model_path = model_path
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = onnxruntime.InferenceSession(os.path.join(model_path, "model.onnx"), options,
+                                                    providers=["CPUExecutionProvider"])
+        self._inputs = {model_input.name for model_input in self.session.get_inputs()}
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        if not documents:
+            return []
+        encodings = self.tokenizer.encode_batch([(query, document.page_content) for document in documents])
+        feed = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        logits = self.session.run(None, {name: value for name, value in feed.items() if name in self._inputs})[0]
+        logits = np.asarray(logits, dtype=np.float64).reshape(len(documents), -1)[:, -1]
+        return (1.0 / (1.0 + np.exp(-logits))).tolist()
+
+
+def create_reranker(kind: str, bm25_index=None, model_path: str = "", top_n: int = 6,
+                    threshold: float = 0.3, min_keep: int = 3,
+                    count_tokens: Callable[[str], int] = estimate_tokens) -> Optional["Reranker"]:
+    """Reranker demandé, ou None si le reranking est désactivé"""
+    if kind == "none":
+        return None
+    if kind == "lexical":
+        scorer = LexicalScorer(bm25_index)
+    elif kind == "cross-encoder":
+        if not model_path:
+            raise ValueError("RERANKER_MODEL_PATH est requis pour RERANKER=cross-encoder")
+        scorer = CrossEncoderScorer(model_path)
+    else:
+        raise ValueError(f"Reranker inconnu: {kind} (attendu: {', '.join(RERANKERS)})")
+    return Reranker(scorer, top_n=top_n, threshold=threshold, min_keep=min_keep, count_tokens=count_tokens)
+
+
+class Reranker:
+    """
+    Étape de reranking entre la récupération et le prompt : les chunks candidats sont scorés contre
+    la question en un appel groupé, puis seuls les top_n dont le score atteint le seuil sont gardés
+    (au moins min_keep, pour ne jamais vider le contexte). Les tokens de contexte retirés du prompt
+    sont comptés (count_tokens, estimation par défaut).
+    """
+
+    def __init__(self, scorer, top_n: int = 6, threshold: float = 0.3, min_keep: int = 3,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.scorer = scorer
+        self.top_n = top_n
+        self.threshold = threshold
+        self.min_keep = min_keep
+        self.count_tokens = count_tokens
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def rerank(self, query: str, documents: Sequence[Document]) -> Tuple[List[Document], Dict[str, Any]]:
+        """Retourne (chunks gardés, du plus pertinent au moins pertinent ; rapport du reranking)"""
+        documents = list(documents)
+        start = time.perf_counter()
+        scores = self.scorer.score(query, documents) if documents else []
+        elapsed = time.perf_counter() - start
+
+        # Tri stable : à score égal, l'ordre de la récupération est conservé
+        ranked = sorted(range(len(documents)), key=lambda index: -scores[index])
+        above = sum(1 for index in ranked[:self.top_n] if scores[index] >= self.threshold)
+        kept = ranked[:max(above, min(self.min_keep, self.top_n))]
+        kept_set = set(kept)
+        tokens_saved = sum(self.count_tokens(documents[index].page_content)
+                           for index in range(len(documents)) if index not in kept_set)
+
+        report = {
+            "scorer": self.scorer.name,
+            "candidates": len(documents),
+            "kept": len(kept),
+            "top_score": round(scores[ranked[0]], 4) if documents else None,
+            "tokens_saved": tokens_saved,
+            "duration_ms": round(elapsed * 1000, 2)
+        }
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["candidates"] += len(documents)
+            self._stats["kept"] += len(kept)
+            self._stats["tokens_saved"] += tokens_saved
+            self._stats["scoring_ms"] += elapsed * 1000
+        return [documents[index] for index in kept], report
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats["calls"]
+        return {
+            "scorer": self.scorer.name,
+            "top_n": self.top_n,
+            "threshold": self.threshold,
+            "calls": calls,
+            "candidates": stats["candidates"],
+            "kept": stats["kept"],
+            "kept_ratio": round(stats["kept"] / stats["candidates"], 4) if stats["candidates"] else 0.0,
+            "tokens_saved": stats["tokens_saved"],
+            "average_scoring_ms": round(stats["scoring_ms"] / calls, 3) if calls else 0.0
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"calls": 0, "candidates": 0, "kept": 0, "tokens_saved": 0, "scoring_ms": 0.0}
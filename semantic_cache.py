@@ -0,0 +1,126 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Cache sémantique des réponses : une entrée est réutilisée si la requête est proche
+    (similarité cosinus des embeddings) et que le scénario et la version de la base coïncident.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, max_entries: int = 1000, ttl_seconds: float = 3600):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        # id -> (clé, vecteur normalisé, valeur, date de création), ordre LRU
+        self._entries: "OrderedDict[int, Tuple[Tuple[str, str], np.ndarray, Any, float]]" = OrderedDict()
+        # clé (scénario, version) -> ids des entrées, et matrice des vecteurs reconstruite à la demande
+        self._buckets: Dict[Tuple[str, str], List[int]] = {}
+        self._matrices: Dict[Tuple[str, str], np.ndarray] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, embedding: List[float], scenario: str, kb_version: str) -> Optional[Any]:
+        """Retourne la valeur de l'entrée la plus proche au-dessus du seuil, sinon None"""
+        key = (scenario, kb_version)
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            self._expire()
+
+            ids = self._buckets.get(key)
+            if not ids:
+                self.stats["misses"] += 1
+                return None
+
+            matrix = self._matrices.get(key)
+            if matrix is None:
+                matrix = np.stack([self._entries[entry_id][1] for entry_id in ids])
+                self._matrices[key] = matrix
+
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.stats["misses"] += 1
+                return None
+
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            self.stats["hits"] += 1
+            logger.debug(f"🎯 Cache sémantique: hit (similarité {similarities[best]:.3f}, scénario {scenario})")
+            return self._entries[entry_id][2]
+
+    def store(self, embedding: List[float], scenario: str, kb_version: str, value: Any):
+        """Ajoute une entrée (éviction LRU au-delà de max_entries)"""
+        key = (scenario, kb_version)
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, vector, value, time.monotonic())
+            self._buckets.setdefault(key, []).append(entry_id)
+            self._matrices.pop(key, None)
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.stats["evictions"] += 1
+
+    def invalidate(self):
+        """Vide le cache (par exemple après un changement de la base de connaissances)"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._matrices.clear()
+            self.stats["invalidations"] += 1
+        logger.info("🧹 Cache sémantique invalidé")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métriques du cache (exposées sur /info)"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "similarity_threshold": self.similarity_threshold,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+    def _expire(self):
+        """Supprime les entrées plus anciennes que le TTL (verrou déjà acquis)"""
+        if not self.ttl_seconds:
+            return
+        deadline = time.monotonic() - self.ttl_seconds
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry[3] < deadline]
+        for entry_id in expired:
+            self._remove(entry_id)
+            self.stats["expirations"] += 1
+
+    def _remove(self, entry_id: int):
+        """Retire une entrée et invalide la matrice de son groupe (verrou déjà acquis)"""
+        key = self._entries.pop(entry_id)[0]
+        ids = self._buckets.get(key)
+        if ids is not None:
+            ids.remove(entry_id)
+            if not ids:
+                del self._buckets[key]
+        self._matrices.pop(key, None)
@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+
+class CachedSession:
+    """État d'une session en cache, valide tant que sa version est celle de la ligne SQLite"""
+
+    __slots__ = ("version", "title", "created_at", "metadata", "context", "tail", "complete")
+
+    def __init__(self, version: int, title: str, created_at: str, metadata: Dict[str, Any],
+                 context: Dict[str, Any], tail: List[Dict[str, Any]], complete: bool):
+        self.version = version
+        self.title = title
+        self.created_at = created_at
+        self.metadata = metadata
+        self.context = context
+        # Derniers messages (ordre chronologique) ; complete : la session n'en a pas d'autres
+        self.tail = tail
+        self.complete = complete
+
+
+class SessionCache:
+    """
+    Cache LRU des sessions actives devant SQLite (existence, titre et métadonnées, contexte précalculé,
+    derniers messages). Il est tenu à jour par les écritures du processus (write-through) ; une entrée
+    n'est servie que si sa version est encore celle de la base, ce qui couvre les écritures faites par
+    les autres workers : celles-ci incrémentent la version et l'entrée est rechargée.
+    """
+
+    def __init__(self, max_sessions: int = 1000, tail_size: int = 64):
+        self.max_sessions = max_sessions
+        self.tail_size = tail_size
+        self._entries: "OrderedDict[str, CachedSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, session_id: str, version: int) -> Optional[CachedSession]:
+        """Entrée de la session si elle est à jour (version lue dans SQLite), sinon None"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(session_id)
+                self.stats["hits"] += 1
+                return entry
+            if entry is not None:
+                # Session modifiée par un autre worker depuis la mise en cache
+                del self._entries[session_id]
+                self.stats["stale"] += 1
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, session_id: str, entry: CachedSession):
+        """Ajoute une entrée lue dans SQLite (sans remplacer une version plus récente)"""
+        if self.max_sessions <= 0:
+            return
+        entry.tail = entry.tail[-self.tail_size:]
+        with self._lock:
+            current = self._entries.get(session_id)
+            if current is not None and current.version > entry.version:
+                return
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def advance(self, session_id: str, version: int, new_version: int, context: Dict[str, Any],
+                messages: List[Dict[str, Any]]):
+        """Write-through : messages committés par ce processus, la session passant de version à new_version"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry.version == new_version:
+                return
+            if entry.version != version:
+                # L'entrée ne correspond pas à l'état sur lequel le lot a été écrit
+                del self._entries[session_id]
+                return
+            entry.version = new_version
+            entry.context = context
+            entry.tail = (entry.tail + messages)[-self.tail_size:]
+            entry.complete = entry.complete and len(entry.tail) < self.tail_size
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            if self._entries.pop(session_id, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "max_sessions": self.max_sessions,
+                "tail_size": self.tail_size,
+                "entries": len(self._entries),
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0
+            }
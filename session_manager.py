@@ -1,24 +1,378 @@
+import copy
+import re
 import sqlite3
 import uuid
-from datetime import datetime
+import atexit
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from typing import List, Dict, Any, Optional
 import json
 import logging
 from pathlib import Path
 
+from session_cache import SessionCache, CachedSession
+from session_store import SessionStore, check_session_timestamp, decode_session_cursor
+from session_summary import SessionSummarizer
+
 logger = logging.getLogger(__name__)
 
-class SessionManager:
-    """Gestionnaire de sessions et d'historique des conversations"""
+# Modes de durabilité de l'écriture des messages
+DURABILITY_SYNC = "sync"    # add_message attend le commit de son lot
+DURABILITY_ASYNC = "async"  # add_message rend la main immédiatement, vidage à l'arrêt
+
+class _PendingMessage:
+    """Message en attente d'écriture par le thread de group commit"""
+    
+    __slots__ = ("session_id", "role", "content", "metadata_json", "done", "message_id", "error")
+    
+    def __init__(self, session_id: str, role: str, content: str, metadata_json: str):
+        self.session_id = session_id
+        self.role = role
+        self.content = content
+        self.metadata_json = metadata_json
+        self.done = threading.Event()
+        self.message_id = None
+        self.error = None
+
+class _FlushRequest:
+    """Marqueur signalé une fois que tous les messages le précédant sont écrits"""
+    
+    __slots__ = ("done",)
     
-    def __init__(self, db_path: str = "sessions.db"):
+    def __init__(self):
+        self.done = threading.Event()
+
+_STOP = object()
+
+class SessionManager(SessionStore):
+    """Gestionnaire de sessions et d'historique des conversations (stockage SQLite local)"""
+    
+    backend = "sqlite"
+    
+    def __init__(self, db_path: str = "sessions.db", cache_size_kb: int = 8192,
+                 busy_timeout: float = 30.0, cached_statements: int = 128,
+                 durability: str = DURABILITY_SYNC, batch_size: int = 64,
+                 flush_interval: float = 0.05, summarizer: Optional[SessionSummarizer] = None,
+                 cache_sessions: int = 1000, cache_tail: int = 64):
+        if durability not in (DURABILITY_SYNC, DURABILITY_ASYNC):
+            raise ValueError(f"Mode de durabilité inconnu: {durability}")
+        
         self.db_path = db_path
+        self.cache_size_kb = cache_size_kb
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        
+        # Contexte de session (résumé + derniers messages) maintenu à chaque écriture
+        self.summarizer = summarizer or SessionSummarizer()
+        
+        # Cache LRU des sessions actives, validé par la version de la ligne SQLite (0 : désactivé)
+        self.cache = SessionCache(max_sessions=cache_sessions, tail_size=cache_tail)
+        
+        # Group commit : les messages sont écrits par lots par un thread dédié
+        self.durability = durability
+        self.batch_size = max(1, min(batch_size, 500))
+        self.flush_interval = flush_interval
+        self._write_queue: "queue.Queue" = queue.Queue()
+        self._pending_count = 0
+        self._pending_lock = threading.Lock()
+        self._writer_thread = None
+        self._writer_lock = threading.Lock()
+        self.write_stats = {"batches": 0, "messages": 0, "max_batch": 0}
+        
+        # Une connexion persistante par thread (les requêtes compilées restent en cache)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        
         self._init_database()
+        
+        if self.durability == DURABILITY_ASYNC:
+            # Ne pas perdre les messages en attente si le processus s'arrête sans close()
+            atexit.register(self.close)
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Retourne la connexion du thread courant, créée et configurée à la première utilisation"""
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            # WAL : les lecteurs ne bloquent plus l'écrivain. En mode sync, un message acquitté doit survivre
+            # à une coupure de courant (FULL : fsync du WAL à chaque commit) ; en mode async, NORMAL suffit
+            # (pas de corruption possible, seuls les derniers commits peuvent être perdus)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={'FULL' if self.durability == DURABILITY_SYNC else 'NORMAL'}")
+            conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            
+            self._local.connection = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        """Transaction sur la connexion du thread courant (commit ou rollback automatique)"""
+        conn = self._get_connection()
+        with conn:
+            yield conn
+    
+    def _ensure_writer(self):
+        """Démarre le thread d'écriture à la première utilisation"""
+        if self._writer_thread is not None:
+            return
+        with self._writer_lock:
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(
+                    target=self._writer_loop, name="session-writer", daemon=True
+                )
+                self._writer_thread.start()
+    
+    def _writer_loop(self):
+        """Regroupe les messages en attente et les écrit en une seule transaction par lot"""
+        stopping = False
+        while not stopping:
+            item = self._write_queue.get()
+            if item is _STOP:
+                break
+            
+            batch = []
+            flushes = []
+            if isinstance(item, _FlushRequest):
+                flushes.append(item)
+            else:
+                batch.append(item)
+            
+            # En mode sync on prend ce qui est déjà en file (les arrivées pendant le commit
+            # forment le lot suivant) ; en mode async on attend jusqu'à flush_interval
+            wait = self.flush_interval if self.durability == DURABILITY_ASYNC else 0
+            deadline = time.monotonic() + wait
+            while len(batch) < self.batch_size and not flushes:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._write_queue.get(timeout=remaining) if remaining > 0 else self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, _FlushRequest):
+                    flushes.append(item)
+                else:
+                    batch.append(item)
+            
+            if batch:
+                self._write_batch(batch)
+            for flush in flushes:
+                flush.done.set()
+    
+    @staticmethod
+    def _message_row(row) -> Dict[str, Any]:
+        message_id, timestamp, role, content, metadata_json = row
+        return {
+            "id": message_id,
+            "timestamp": timestamp,
+            "role": role,
+            "content": content,
+            "metadata": json.loads(metadata_json) if metadata_json else {}
+        }
+    
+    def _load_context(self, cursor: sqlite3.Cursor, session_id: str, context_json: Optional[str]) -> Dict[str, Any]:
+        """État du contexte d'une session, reconstruit depuis ses messages s'il n'a jamais été calculé"""
+        if context_json:
+            return json.loads(context_json)
+        cursor.execute("""
+            SELECT role, content FROM messages WHERE session_id = ? ORDER BY id
+        """, (session_id,))
+        return self.summarizer.build([{"role": role, "content": content} for role, content in cursor.fetchall()])
+    
+    def _cached_session(self, session_id: str) -> Optional[CachedSession]:
+        """
+        Entrée en cache de la session, validée par sa version dans SQLite (une lecture par clé primaire)
+        et rechargée si un autre worker l'a modifiée. None si la session n'existe pas.
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # Lecture dans un même instantané : version, ligne de la session et derniers messages
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT version FROM sessions WHERE id = ?", (session_id,))
+            row = cursor.fetchone()
+            if row is None:
+                self.cache.invalidate(session_id)
+                return None
+            version = row[0]
+            entry = self.cache.get(session_id, version)
+            if entry is not None:
+                return entry
+            
+            cursor.execute("SELECT title, created_at, metadata, context FROM sessions WHERE id = ?", (session_id,))
+            title, created_at, metadata_json, context_json = cursor.fetchone()
+            cursor.execute("""
+                SELECT id, timestamp, role, content, metadata
+                FROM messages
+                WHERE session_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+            """, (session_id, self.cache.tail_size + 1))
+            rows = cursor.fetchall()
+            tail = [self._message_row(row) for row in reversed(rows)]
+            complete = len(rows) <= self.cache.tail_size
+            if context_json is None and complete:
+                context = self.summarizer.build(tail)
+            else:
+                context = self._load_context(cursor, session_id, context_json)
+        
+        if context_json is None:
+            # Session antérieure aux résumés : contexte enregistré, sauf si un lot l'a fait entre-temps
+            with self._connection() as conn:
+                conn.execute("UPDATE sessions SET context = ? WHERE id = ? AND context IS NULL",
+                             (json.dumps(context, ensure_ascii=False), session_id))
+        
+        entry = CachedSession(version, title, created_at, json.loads(metadata_json) if metadata_json else {},
+                              context, tail, complete)
+        self.cache.put(session_id, entry)
+        return entry
+    
+    def _write_batch(self, batch: List[_PendingMessage]):
+        """Écrit un lot de messages : inserts + une seule mise à jour par session (updated_at, contexte)"""
+        try:
+            session_ids = list(dict.fromkeys(message.session_id for message in batch))
+            placeholders = ",".join("?" * len(session_ids))
+            
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                # Verrou d'écriture dès le début : versions et contextes lus ne peuvent pas être
+                # modifiés par un autre worker avant le commit du lot
+                cursor.execute("BEGIN IMMEDIATE")
+                
+                cursor.execute(f"SELECT id, version FROM sessions WHERE id IN ({placeholders})", session_ids)
+                versions = dict(cursor.fetchall())
+                contexts = {}
+                for session_id, version in versions.items():
+                    entry = self.cache.get(session_id, version)
+                    if entry is not None:
+                        contexts[session_id] = copy.deepcopy(entry.context)
+                    else:
+                        cursor.execute("SELECT context FROM sessions WHERE id = ?", (session_id,))
+                        contexts[session_id] = self._load_context(cursor, session_id, cursor.fetchone()[0])
+                
+                cursor.execute("SELECT CURRENT_TIMESTAMP")
+                timestamp = cursor.fetchone()[0]
+                written: Dict[str, List[Dict[str, Any]]] = {session_id: [] for session_id in versions}
+                for message in batch:
+                    if message.session_id not in versions:
+                        message.error = ValueError(f"Session {message.session_id} n'existe pas")
+                        continue
+                    cursor.execute("""
+                        INSERT INTO messages (session_id, timestamp, role, content, metadata)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (message.session_id, timestamp, message.role, message.content, message.metadata_json))
+                    message.message_id = cursor.lastrowid
+                    self.summarizer.add(contexts[message.session_id], message.role, message.content)
+                    written[message.session_id].append(self._message_row(
+                        (message.message_id, timestamp, message.role, message.content, message.metadata_json)
+                    ))
+                
+                # Timestamp, compteurs, contexte et version de chaque session du lot, dans la même
+                # transaction que les messages
+                updated_ids = [session_id for session_id in session_ids if session_id in versions]
+                if updated_ids:
+                    cursor.executemany("""
+                        UPDATE sessions 
+                        SET updated_at = ?, last_message_at = ?, message_count = message_count + ?,
+                            context = ?, version = version + 1 
+                        WHERE id = ?
+                    """, [(timestamp, timestamp, len(written[session_id]),
+                           json.dumps(contexts[session_id], ensure_ascii=False), session_id)
+                          for session_id in updated_ids])
+            
+            # Write-through : les entrées en cache suivent le commit
+            for session_id in updated_ids:
+                self.cache.advance(session_id, versions[session_id], versions[session_id] + 1,
+                                   contexts[session_id], written[session_id])
+            
+            # Messages réellement insérés (ceux d'une session inconnue sont écartés du lot)
+            self.write_stats["batches"] += 1
+            self.write_stats["messages"] += sum(len(messages) for messages in written.values())
+            self.write_stats["max_batch"] = max(self.write_stats["max_batch"], len(batch))
+            logger.debug(f"💬 Lot de {len(batch)} messages écrit ({len(updated_ids)} sessions)")
+            
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'écriture d'un lot de messages: {e}")
+            # Transaction annulée : aucun message du lot n'est écrit, y compris ceux déjà insérés
+            for message in batch:
+                message.message_id = None
+                if message.error is None:
+                    message.error = e
+        finally:
+            for message in batch:
+                if message.error is not None and self.durability == DURABILITY_ASYNC:
+                    logger.error(f"❌ Message perdu pour la session {message.session_id}: {message.error}")
+                message.done.set()
+            with self._pending_lock:
+                self._pending_count -= len(batch)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "durability": self.durability,
+            "writes": dict(self.write_stats),
+            "cache": self.cache.get_stats()
+        }
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Attend que tous les messages mis en file avant l'appel soient écrits"""
+        if self._writer_thread is None or not self._writer_thread.is_alive():
+            return True
+        request = _FlushRequest()
+        self._write_queue.put(request)
+        return request.done.wait(timeout)
+    
+    def _flush_pending(self):
+        """En mode async, garantit la lecture de ses propres écritures"""
+        if self.durability == DURABILITY_ASYNC and self._pending_count > 0:
+            self.flush()
+    
+    def close(self):
+        """Vide la file d'écriture puis ferme toutes les connexions ouvertes"""
+        with self._writer_lock:
+            writer, self._writer_thread = self._writer_thread, None
+        if writer is not None and writer.is_alive():
+            self._write_queue.put(_STOP)
+            writer.join()
+            # Messages arrivés après l'arrêt du thread : écriture directe
+            remaining = []
+            while True:
+                try:
+                    item = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, _PendingMessage):
+                    remaining.append(item)
+                elif isinstance(item, _FlushRequest):
+                    item.done.set()
+            if remaining:
+                self._write_batch(remaining)
+        
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.warning(f"⚠️ Erreur lors de la fermeture d'une connexion: {e}")
+            self._connections.clear()
+        # Les threads recréeront une connexion à la prochaine utilisation
+        self._local = threading.local()
     
     def _init_database(self):
         """Initialise la base de données SQLite avec les tables nécessaires"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 
                 # Table des sessions
@@ -45,17 +399,49 @@ class SessionManager:
                     )
                 """)
                 
-                # Index pour améliorer les performances
+                # Index pour améliorer les performances : (session_id, id DESC) sert la fin de
+                # l'historique d'une session et sa pagination par curseur sans tri ni parcours complet
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_messages_session_id 
-                    ON messages (session_id)
+                    CREATE INDEX IF NOT EXISTS idx_messages_session_id_desc 
+                    ON messages (session_id, id DESC)
                 """)
+                # Ancien index sur session_id seul, couvert par le précédent
+                cursor.execute("DROP INDEX IF EXISTS idx_messages_session_id")
                 
                 cursor.execute("""
                     CREATE INDEX IF NOT EXISTS idx_messages_timestamp 
                     ON messages (timestamp)
                 """)
                 
+                # Contexte de session précalculé (bases créées avant son ajout : colonne ajoutée,
+                # contexte reconstruit à la première lecture ou écriture de chaque session)
+                cursor.execute("PRAGMA table_info(sessions)")
+                columns = {row[1] for row in cursor.fetchall()}
+                if "context" not in columns:
+                    cursor.execute("ALTER TABLE sessions ADD COLUMN context TEXT")
+                # Version incrémentée à chaque écriture : validation des caches des workers
+                if "version" not in columns:
+                    cursor.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+                # Compteurs dénormalisés de la liste des sessions, tenus à jour par _write_batch
+                # (bases existantes : calculés une fois depuis les messages)
+                if "message_count" not in columns or "last_message_at" not in columns:
+                    if "message_count" not in columns:
+                        cursor.execute("ALTER TABLE sessions ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+                    if "last_message_at" not in columns:
+                        cursor.execute("ALTER TABLE sessions ADD COLUMN last_message_at TIMESTAMP")
+                    cursor.execute("""
+                        UPDATE sessions SET
+                            message_count = (SELECT COUNT(*) FROM messages WHERE messages.session_id = sessions.id),
+                            last_message_at = (SELECT timestamp FROM messages WHERE messages.session_id = sessions.id
+                                               ORDER BY id DESC LIMIT 1)
+                    """)
+                
+                # Liste des sessions par date de mise à jour, paginée par curseur (updated_at, id)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_sessions_updated_at 
+                    ON sessions (updated_at, id)
+                """)
+                
                 conn.commit()
                 logger.info(f"✅ Base de données des sessions initialisée: {self.db_path}")
                 
@@ -70,18 +456,24 @@ class SessionManager:
             
             # Générer un titre automatique si non fourni
             if not title:
-                title = f"Session {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+                title = self.default_title()
             
             metadata_json = json.dumps(metadata or {})
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO sessions (id, title, metadata)
                     VALUES (?, ?, ?)
                 """, (session_id, title, metadata_json))
+                # Valeurs par défaut relues dans la même transaction (pas de RETURNING avant SQLite 3.35)
+                cursor.execute("SELECT created_at, version FROM sessions WHERE id = ?", (session_id,))
+                created_at, version = cursor.fetchone()
                 conn.commit()
             
+            # Session nouvelle : entièrement connue, sans lecture à la première question
+            self.cache.put(session_id, CachedSession(version, title, created_at, metadata or {},
+                                                     self.summarizer.empty(), [], True))
             logger.info(f"📝 Nouvelle session créée: {session_id} - {title}")
             return session_id
             
@@ -89,89 +481,117 @@ class SessionManager:
             logger.error(f"❌ Erreur lors de la création de session: {e}")
             raise
     
-    def add_message(self, session_id: str, role: str, content: str, metadata: Dict[str, Any] = None) -> int:
-        """Ajoute un message à l'historique d'une session"""
+    def add_message(self, session_id: str, role: str, content: str, metadata: Dict[str, Any] = None) -> Optional[int]:
+        """
+        Ajoute un message à l'historique d'une session.
+        
+        Les messages sont écrits par lots (group commit). En mode sync l'appel attend le commit
+        et retourne l'id du message ; en mode async il retourne None dès la mise en file.
+        """
         try:
-            # Vérifier que la session existe
-            if not self.session_exists(session_id):
+            if self.durability == DURABILITY_ASYNC and not self.session_exists(session_id):
+                # Vérification anticipée : l'erreur ne pourrait plus remonter après la mise en file
                 raise ValueError(f"Session {session_id} n'existe pas")
             
-            metadata_json = json.dumps(metadata or {})
+            message = _PendingMessage(session_id, role, content, json.dumps(metadata or {}))
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO messages (session_id, role, content, metadata)
-                    VALUES (?, ?, ?, ?)
-                """, (session_id, role, content, metadata_json))
-                
-                # Mettre à jour le timestamp de la session
-                cursor.execute("""
-                    UPDATE sessions 
-                    SET updated_at = CURRENT_TIMESTAMP 
-                    WHERE id = ?
-                """, (session_id,))
-                
-                message_id = cursor.lastrowid
-                conn.commit()
+            with self._pending_lock:
+                self._pending_count += 1
+            self._ensure_writer()
+            self._write_queue.put(message)
+            if self._writer_thread is None:
+                # close() concurrent : redémarrer un thread pour ne pas laisser le message en file
+                self._ensure_writer()
+            
+            if self.durability == DURABILITY_ASYNC:
+                return None
+            
+            message.done.wait()
+            if message.error is not None:
+                raise message.error
             
             logger.debug(f"💬 Message ajouté à la session {session_id}: {role}")
-            return message_id
+            return message.message_id
             
         except Exception as e:
             logger.error(f"❌ Erreur lors de l'ajout du message: {e}")
             raise
     
-    def get_session_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Récupère l'historique des messages d'une session"""
+    def get_session_history(self, session_id: str, limit: int = 50,
+                            before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Récupère les limit derniers messages d'une session (antérieurs au message before_id s'il est
+        donné), dans l'ordre chronologique. Pagination par curseur : la page précédente s'obtient avec
+        before_id = id du premier message de la page ; coût proportionnel à limit, pas à la session.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            self._flush_pending()
+            if limit <= 0:
+                return []
+            
+            if before_id is None:
+                # Fin de l'historique : servie par le cache si elle y tient
+                entry = self._cached_session(session_id)
+                if entry is None:
+                    return []
+                if limit <= len(entry.tail) or entry.complete:
+                    return [dict(message) for message in entry.tail[-limit:]]
+            
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT id, timestamp, role, content, metadata
                     FROM messages
-                    WHERE session_id = ?
-                    ORDER BY timestamp ASC
+                    WHERE session_id = ? AND id < ?
+                    ORDER BY id DESC
                     LIMIT ?
-                """, (session_id, limit))
+                """, (session_id, before_id if before_id is not None else 2 ** 63 - 1, limit))
                 
-                messages = []
-                for row in cursor.fetchall():
-                    message_id, timestamp, role, content, metadata_json = row
-                    metadata = json.loads(metadata_json) if metadata_json else {}
-                    
-                    messages.append({
-                        "id": message_id,
-                        "timestamp": timestamp,
-                        "role": role,
-                        "content": content,
-                        "metadata": metadata
-                    })
-                
-                return messages
+                return [self._message_row(row) for row in reversed(cursor.fetchall())]
                 
         except Exception as e:
             logger.error(f"❌ Erreur lors de la récupération de l'historique: {e}")
             raise
     
-    def get_sessions(self, limit: int = 20) -> List[Dict[str, Any]]:
-        """Récupère la liste des sessions"""
+    def get_sessions(self, limit: int = 20, cursor: Optional[str] = None, title: Optional[str] = None,
+                     updated_after: Optional[str] = None, min_messages: int = 0) -> List[Dict[str, Any]]:
+        """
+        Récupère une page de sessions, des plus récemment mises à jour aux plus anciennes : parcours de
+        l'index (updated_at, id) à partir du curseur, compteurs lus sur la ligne de la session
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT s.id, s.created_at, s.updated_at, s.title, s.metadata,
-                           COUNT(m.id) as message_count
-                    FROM sessions s
-                    LEFT JOIN messages m ON s.id = m.session_id
-                    GROUP BY s.id, s.created_at, s.updated_at, s.title, s.metadata
-                    ORDER BY s.updated_at DESC
+            self._flush_pending()
+            
+            conditions, params = [], []
+            if cursor:
+                # Équivaut à (updated_at, id) < (?, ?), sans valeurs de ligne (SQLite < 3.15) et en
+                # gardant la borne updated_at <= ? sur l'index
+                updated_at, session_id = decode_session_cursor(cursor)
+                conditions.append("updated_at <= ? AND (updated_at < ? OR id < ?)")
+                params.extend((updated_at, updated_at, session_id))
+            if title:
+                conditions.append("title LIKE ? ESCAPE '\\'")
+                params.append("%" + re.sub(r"([%_\\])", r"\\\1", title) + "%")
+            if updated_after:
+                conditions.append("updated_at >= ?")
+                params.append(check_session_timestamp(updated_after))
+            if min_messages > 0:
+                conditions.append("message_count >= ?")
+                params.append(min_messages)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            
+            with self._connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT id, created_at, updated_at, title, metadata, message_count, last_message_at
+                    FROM sessions
+                    {where}
+                    ORDER BY updated_at DESC, id DESC
                     LIMIT ?
-                """, (limit,))
+                """, (*params, limit)).fetchall()
                 
                 sessions = []
-                for row in cursor.fetchall():
-                    session_id, created_at, updated_at, title, metadata_json, message_count = row
+                for row in rows:
+                    session_id, created_at, updated_at, title, metadata_json, message_count, last_message_at = row
                     metadata = json.loads(metadata_json) if metadata_json else {}
                     
                     sessions.append({
@@ -180,7 +600,8 @@ class SessionManager:
                         "updated_at": updated_at,
                         "title": title,
                         "metadata": metadata,
-                        "message_count": message_count
+                        "message_count": message_count,
+                        "last_message_at": last_message_at
                     })
                 
                 return sessions
@@ -192,14 +613,14 @@ class SessionManager:
     def session_exists(self, session_id: str) -> bool:
         """Vérifie si une session existe"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT COUNT(*) FROM sessions WHERE id = ?
-                """, (session_id,))
-                
-                count = cursor.fetchone()[0]
-                return count > 0
+            # Seule la version est lue : une entrée en cache périmée est retirée, sans rechargement
+            with self._connection() as conn:
+                row = conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                self.cache.invalidate(session_id)
+                return False
+            self.cache.get(session_id, row[0])
+            return True
                 
         except Exception as e:
             logger.error(f"❌ Erreur lors de la vérification de session: {e}")
@@ -208,20 +629,14 @@ class SessionManager:
     def get_session_info(self, session_id: str) -> dict:
         """Récupère les informations d'une session"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT id, title, created_at FROM sessions WHERE id = ?",
-                    (session_id,)
-                )
-                result = cursor.fetchone()
-                if result:
-                    return {
-                        "session_id": result[0],
-                        "title": result[1],
-                        "created_at": result[2]
-                    }
-                return None
+            entry = self._cached_session(session_id)
+            if entry:
+                return {
+                    "session_id": session_id,
+                    "title": entry.title,
+                    "created_at": entry.created_at
+                }
+            return None
         except Exception as e:
             logger.error(f"❌ Erreur lors de la récupération des informations de session: {e}")
             return None
@@ -229,7 +644,9 @@ class SessionManager:
     def delete_session(self, session_id: str) -> bool:
         """Supprime une session et tous ses messages"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            self._flush_pending()
+            
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 
                 # Supprimer les messages (CASCADE devrait le faire automatiquement)
@@ -240,14 +657,15 @@ class SessionManager:
                 
                 deleted_count = cursor.rowcount
                 conn.commit()
+            
+            self.cache.invalidate(session_id)
+            if deleted_count > 0:
+                logger.info(f"🗑️ Session supprimée: {session_id}")
+                return True
+            else:
+                logger.warning(f"⚠️ Session non trouvée: {session_id}")
+                return False
                 
-                if deleted_count > 0:
-                    logger.info(f"🗑️ Session supprimée: {session_id}")
-                    return True
-                else:
-                    logger.warning(f"⚠️ Session non trouvée: {session_id}")
-                    return False
-                    
         except Exception as e:
             logger.error(f"❌ Erreur lors de la suppression de session: {e}")
             raise
@@ -255,52 +673,41 @@ class SessionManager:
     def update_session_title(self, session_id: str, title: str) -> bool:
         """Met à jour le titre d'une session"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     UPDATE sessions 
-                    SET title = ?, updated_at = CURRENT_TIMESTAMP 
+                    SET title = ?, updated_at = CURRENT_TIMESTAMP, version = version + 1 
                     WHERE id = ?
                 """, (title, session_id))
                 
                 updated_count = cursor.rowcount
                 conn.commit()
+            
+            self.cache.invalidate(session_id)
+            if updated_count > 0:
+                logger.info(f"✏️ Titre de session mis à jour: {session_id} -> {title}")
+                return True
+            else:
+                logger.warning(f"⚠️ Session non trouvée pour mise à jour: {session_id}")
+                return False
                 
-                if updated_count > 0:
-                    logger.info(f"✏️ Titre de session mis à jour: {session_id} -> {title}")
-                    return True
-                else:
-                    logger.warning(f"⚠️ Session non trouvée pour mise à jour: {session_id}")
-                    return False
-                    
         except Exception as e:
             logger.error(f"❌ Erreur lors de la mise à jour du titre: {e}")
             raise
     
     def get_session_context(self, session_id: str, max_messages: int = 10) -> str:
-        """Récupère le contexte récent d'une session pour l'IA"""
+        """
+        Récupère le contexte d'une session pour l'IA : résumé des échanges précédents et
+        max_messages derniers messages (contexte tenu à jour par _write_batch, servi par le cache)
+        """
         try:
-            messages = self.get_session_history(session_id, limit=max_messages)
+            self._flush_pending()
             
-            if not messages:
+            entry = self._cached_session(session_id)
+            if entry is None:
                 return ""
-            
-            # Construire le contexte
-            context_parts = []
-            for msg in messages[-max_messages:]:  # Prendre les derniers messages
-                role = msg['role']
-                content = msg['content']
-                
-                if role == 'user':
-                    context_parts.append(f"Utilisateur: {content}")
-                elif role == 'assistant':
-                    # Pour l'assistant, on peut raccourcir le JSON si c'est trop long
-                    if len(content) > 500:
-                        context_parts.append(f"Assistant: [Réponse JSON générée]")
-                    else:
-                        context_parts.append(f"Assistant: {content}")
-            
-            return "\n".join(context_parts)
+            return self.summarizer.render(entry.context, max_messages)
             
         except Exception as e:
             logger.error(f"❌ Erreur lors de la récupération du contexte: {e}")
@@ -309,7 +716,7 @@ class SessionManager:
     def cleanup_old_sessions(self, days_old: int = 30) -> int:
         """Supprime les sessions anciennes"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 
                 # Supprimer les sessions non mises à jour depuis X jours
@@ -322,10 +729,11 @@ class SessionManager:
                 conn.commit()
                 
                 if deleted_count > 0:
+                    self.cache.clear()
                     logger.info(f"🧹 {deleted_count} sessions anciennes supprimées")
                 
                 return deleted_count
                 
         except Exception as e:
             logger.error(f"❌ Erreur lors du nettoyage: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,179 @@
+import asyncio
+import base64
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+# Backends de stockage des sessions (SESSION_STORE)
+SESSION_STORES = ("sqlite", "redis")
+
+# Format des dates des sessions et des messages (CURRENT_TIMESTAMP de SQLite, UTC)
+SESSION_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SessionStore(ABC):
+    """
+    Interface du stockage des sessions et de l'historique des conversations, utilisée par l'API.
+
+    - sqlite (SessionManager) : fichier local, group commit et cache des sessions actives ;
+    - redis (RedisSessionStore) : serveur partagé par plusieurs réplicas de l'API, historique en
+      listes plafonnées et sessions expirées par TTL.
+
+    Les messages d'une session ont des ids croissants (curseur de get_session_history) ; le contexte
+    de session (résumé + derniers messages, voir session_summary.py) est tenu à jour à l'écriture.
+    Un backend doit implémenter toutes les méthodes abstraites pour être instancié.
+    """
+
+    backend = ""
+
+    @staticmethod
+    def default_title() -> str:
+        return f"Session {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+
+    @abstractmethod
+    def create_session(self, title: str = None, metadata: Dict[str, Any] = None) -> str:
+        """Crée une nouvelle session et retourne son ID"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_message(self, session_id: str, role: str, content: str, metadata: Dict[str, Any] = None) -> Optional[int]:
+        """Ajoute un message à une session et retourne son id (None si l'écriture est différée)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_session_history(self, session_id: str, limit: int = 50,
+                            before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """limit derniers messages (antérieurs à before_id s'il est donné), dans l'ordre chronologique"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_sessions(self, limit: int = 20, cursor: Optional[str] = None, title: Optional[str] = None,
+                     updated_after: Optional[str] = None, min_messages: int = 0) -> List[Dict[str, Any]]:
+        """
+        Sessions les plus récemment mises à jour (avec message_count et last_message_at), à partir du
+        curseur de encode_session_cursor ; filtres : titre contenant title, updated_at >= updated_after
+        (format 'YYYY-MM-DD HH:MM:SS', UTC, ValueError sinon, voir check_session_timestamp), au moins
+        min_messages messages
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def session_exists(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_session_info(self, session_id: str) -> Optional[dict]:
+        """session_id, title et created_at de la session, None si elle n'existe pas"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_session(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_session_title(self, session_id: str, title: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_session_context(self, session_id: str, max_messages: int = 10) -> str:
+        """Contexte de la session pour le prompt : résumé des échanges précédents et derniers messages"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def cleanup_old_sessions(self, days_old: int = 30) -> int:
+        """Supprime les sessions non mises à jour depuis days_old jours et retourne leur nombre"""
+        raise NotImplementedError
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Attend l'écriture des messages différés (rien à faire si les écritures sont synchrones)"""
+        return True
+
+    def close(self):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend}
+
+    # Variantes asynchrones : les accès au stockage sont exécutés dans un thread
+    # pour ne pas bloquer la boucle d'événements des handlers FastAPI
+
+    async def acreate_session(self, title: str = None, metadata: Dict[str, Any] = None) -> str:
+        """Version asynchrone de create_session"""
+        return await asyncio.to_thread(self.create_session, title, metadata)
+
+    async def aadd_message(self, session_id: str, role: str, content: str, metadata: Dict[str, Any] = None) -> int:
+        """Version asynchrone de add_message"""
+        return await asyncio.to_thread(self.add_message, session_id, role, content, metadata)
+
+    async def aget_session_history(self, session_id: str, limit: int = 50,
+                                   before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Version asynchrone de get_session_history"""
+        return await asyncio.to_thread(self.get_session_history, session_id, limit, before_id)
+
+    async def aget_session_context(self, session_id: str, max_messages: int = 10) -> str:
+        """Version asynchrone de get_session_context"""
+        return await asyncio.to_thread(self.get_session_context, session_id, max_messages)
+
+    async def aget_sessions(self, limit: int = 20, cursor: Optional[str] = None, title: Optional[str] = None,
+                            updated_after: Optional[str] = None, min_messages: int = 0) -> List[Dict[str, Any]]:
+        """Version asynchrone de get_sessions"""
+        return await asyncio.to_thread(self.get_sessions, limit, cursor, title, updated_after, min_messages)
+
+    async def asession_exists(self, session_id: str) -> bool:
+        """Version asynchrone de session_exists"""
+        return await asyncio.to_thread(self.session_exists, session_id)
+
+    async def aget_session_info(self, session_id: str) -> Optional[dict]:
+        """Version asynchrone de get_session_info"""
+        return await asyncio.to_thread(self.get_session_info, session_id)
+
+    async def aupdate_session_title(self, session_id: str, title: str) -> bool:
+        """Version asynchrone de update_session_title"""
+        return await asyncio.to_thread(self.update_session_title, session_id, title)
+
+    async def adelete_session(self, session_id: str) -> bool:
+        """Version asynchrone de delete_session"""
+        return await asyncio.to_thread(self.delete_session, session_id)
+
+
+def check_session_timestamp(value: str) -> str:
+    """Horodatage au format des sessions ('YYYY-MM-DD HH:MM:SS', UTC), ValueError sinon"""
+    try:
+        # Comparé comme texte par SQLite : champs à deux chiffres exigés ("2024-1-5" est refusé)
+        valid = datetime.strptime(value, SESSION_TIMESTAMP_FORMAT).strftime(SESSION_TIMESTAMP_FORMAT) == value
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError(f"Horodatage invalide: {value} (attendu: YYYY-MM-DD HH:MM:SS)")
+    return value
+
+
+def encode_session_cursor(session: Dict[str, Any]) -> str:
+    """Curseur de la page suivante de get_sessions : (updated_at, id) de la dernière session de la page"""
+    return base64.urlsafe_b64encode(f"{session['updated_at']}|{session['id']}".encode("utf-8")).decode("ascii")
+
+
+def decode_session_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        updated_at, session_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        check_session_timestamp(updated_at)
+    except ValueError:
+        raise ValueError(f"Curseur de sessions invalide: {cursor}")
+    return updated_at, session_id
+
+
+def create_session_store(backend: str, db_path: str = "sessions.db", redis_url: str = "redis://localhost:6379/0",
+                         ttl_seconds: int = 30 * 86400, max_messages: int = 500, **options) -> SessionStore:
+    """
+    Stockage des sessions demandé. options : paramètres du SessionManager (durability, summarizer,
+    cache_sessions, cache_tail) ; summarizer est aussi utilisé par le backend redis.
+    """
+    # Imports locaux : les deux implémentations dépendent de cette interface
+    if backend == "sqlite":
+        from session_manager import SessionManager
+        return SessionManager(db_path, **options)
+    if backend == "redis":
+        from redis_session_store import RedisSessionStore
+        return RedisSessionStore(redis_url, ttl_seconds=ttl_seconds, max_messages=max_messages,
+                                 summarizer=options.get("summarizer"))
+    raise ValueError(f"Stockage de sessions inconnu: {backend} (attendu: {', '.join(SESSION_STORES)})")
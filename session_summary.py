@@ -0,0 +1,146 @@
+import json
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+from bm25_index import tokenize
+
+ROLE_LABELS = {"user": "Utilisateur", "assistant": "Assistant"}
+
+# Composants dont le texte résume une réponse : titres, produits présentés, premier paragraphe
+_TITLE_COMPONENTS = ("Heading", "Hero")
+_PRODUCT_COMPONENTS = ("ProductCard", "ZaraProductCard")
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+def _walk_components(node: Any, titles: List[str], products: List[str], texts: List[str]):
+    if isinstance(node, list):
+        for child in node:
+            _walk_components(child, titles, products, texts)
+        return
+    if not isinstance(node, dict):
+        return
+    component_type = node.get("type")
+    props = node.get("props") if isinstance(node.get("props"), dict) else {}
+    # Le LLM place les enfants dans props ou directement sur le composant, le texte dans children ou text
+    children = props.get("children", node.get("children"))
+    text = children if isinstance(children, str) else props.get("text")
+    if component_type in _TITLE_COMPONENTS:
+        title = props.get("title") or text
+        if isinstance(title, str):
+            titles.append(title)
+    elif component_type in _PRODUCT_COMPONENTS:
+        product = props.get("product") if isinstance(props.get("product"), dict) else props
+        name = product.get("title") or product.get("name")
+        if isinstance(name, str):
+            price = product.get("price")
+            products.append(f"{name} ({price})" if isinstance(price, (str, int, float)) and price != "" else name)
+    elif component_type == "Text" and isinstance(text, str):
+        texts.append(text)
+    _walk_components(children, titles, products, texts)
+    _walk_components(node.get("components"), titles, products, texts)
+
+
+def digest_answer(content: str, max_chars: int = 300) -> str:
+    """
+    Résumé extractif d'une réponse de l'assistant : pour une interface JSON, template, titres,
+    produits présentés et premier texte (au lieu de "[Réponse JSON générée]") ; sinon le texte raccourci
+    """
+    # Réponse éventuellement entourée d'un bloc ```json
+    start, end = content.find("{"), content.rfind("}")
+    try:
+        data = json.loads(content[start:end + 1]) if start != -1 else None
+    except ValueError:
+        return _shorten(content, max_chars)
+    if not isinstance(data, dict):
+        return _shorten(content, max_chars)
+
+    titles: List[str] = []
+    products: List[str] = []
+    texts: List[str] = []
+    _walk_components(data.get("components"), titles, products, texts)
+    parts = [f"[{data.get('template', 'interface')}]"]
+    if titles:
+        parts.append(" / ".join(dict.fromkeys(titles)))
+    if products:
+        parts.append("Produits: " + ", ".join(dict.fromkeys(products)))
+    if texts:
+        parts.append(texts[0])
+    return _shorten(" ".join(parts), max_chars)
+
+
+class SessionSummarizer:
+    """
+    Contexte de session maintenu au fil des messages (état JSON stocké avec la session) :
+
+    - recent : les recent_messages derniers messages, presque complets ;
+    - summary : une ligne courte par message sorti de la fenêtre récente (question, résumé de réponse) ;
+    - topics : quand summary dépasse summary_chars, ses lignes les plus anciennes sont fondues en
+      mots-clés (termes les plus fréquents), eux-mêmes en nombre limité.
+
+    Chaque niveau est borné : la taille du contexte ne dépend pas de la longueur de la conversation,
+    et son rendu ne demande aucune lecture de l'historique.
+    """
+
+    def __init__(self, recent_messages: int = 6, recent_chars: int = 1000, line_chars: int = 160,
+                 summary_chars: int = 1500, max_topics: int = 20):
+        self.recent_messages = recent_messages
+        self.recent_chars = recent_chars
+        self.line_chars = line_chars
+        self.summary_chars = summary_chars
+        self.max_topics = max_topics
+
+    @staticmethod
+    def empty() -> Dict[str, Any]:
+        return {"topics": [], "summary": [], "recent": []}
+
+    def _message_text(self, role: str, content: str, max_chars: int) -> str:
+        if role == "assistant":
+            return digest_answer(content, max_chars)
+        return _shorten(content, max_chars)
+
+    def add(self, state: Optional[Dict[str, Any]], role: str, content: str) -> Dict[str, Any]:
+        """Intègre un nouveau message à l'état (modifié en place et retourné)"""
+        state = state or self.empty()
+        recent = state["recent"]
+        recent.append([role, self._message_text(role, content, self.recent_chars)])
+        while len(recent) > self.recent_messages:
+            old_role, old_text = recent.pop(0)
+            label = ROLE_LABELS.get(old_role, old_role)
+            state["summary"].append(f"{label}: {_shorten(old_text, self.line_chars)}")
+
+        summary = state["summary"]
+        if sum(len(line) for line in summary) > self.summary_chars:
+            # Niveau supérieur : la moitié la plus ancienne du résumé devient des mots-clés
+            folded, state["summary"] = summary[:len(summary) // 2 or 1], summary[len(summary) // 2 or 1:]
+            counts = Counter({topic: weight for weight, topic in
+                              enumerate(reversed(state["topics"]), start=1)})
+            for line in folded:
+                counts.update(term for term in tokenize(line.split(":", 1)[-1]) if not term.isdigit())
+            state["topics"] = [topic for topic, _ in counts.most_common(self.max_topics)]
+        return state
+
+    def build(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """État reconstruit à partir de l'historique complet (sessions créées avant les résumés)"""
+        state = self.empty()
+        for message in messages:
+            self.add(state, message["role"], message["content"])
+        return state
+
+    def render(self, state: Dict[str, Any], max_messages: int) -> str:
+        """Texte du contexte : sujets, résumé des échanges précédents, puis derniers messages"""
+        parts = []
+        recent = state["recent"][-max_messages:] if max_messages > 0 else []
+        older = state["recent"][:len(state["recent"]) - len(recent)]
+        if state["topics"]:
+            parts.append("Sujets abordés: " + ", ".join(state["topics"]))
+        summary = state["summary"] + [f"{ROLE_LABELS.get(role, role)}: {_shorten(text, self.line_chars)}"
+                                      for role, text in older]
+        if summary:
+            parts.append("Résumé des échanges précédents:\n" + "\n".join(summary))
+        if recent:
+            parts.append("\n".join(f"{ROLE_LABELS.get(role, role)}: {text}" for role, text in recent))
+        return "\n\n".join(parts)
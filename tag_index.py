@@ -0,0 +1,188 @@
+import threading
+import hashlib
+import logging
+from typing import List, Dict, Any, Optional, Iterable, Sequence
+from itertools import islice
+
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+
+def parse_tags(metadata: Optional[Dict[str, Any]]) -> List[str]:
+    """Extrait la liste des tags d'un dictionnaire de métadonnées de chunk"""
+    if not metadata or 'tags' not in metadata:
+        return []
+    tags = metadata['tags']
+    if isinstance(tags, list):
+        return [tag for tag in tags if tag]
+    return [tag for tag in str(tags).split(',') if tag]
+
+
+# Préfixe des champs booléens de tags dans les métadonnées : un champ par tag, filtrable par la base
+# vectorielle (la chaîne 'tags' reste pour l'affichage et la compatibilité)
+TAG_FIELD_PREFIX = "tag_"
+
+
+def tag_field(tag: str) -> str:
+    """Nom du champ de métadonnées booléen d'un tag"""
+    return f"{TAG_FIELD_PREFIX}{tag}"
+
+
+def tag_fields(tags: Iterable[str]) -> Dict[str, bool]:
+    """Champs de métadonnées booléens d'une liste de tags"""
+    return {tag_field(tag): True for tag in tags if tag}
+
+
+def tag_filter(tags: Sequence[str]) -> Optional[Dict[str, Any]]:
+    """Filtre de métadonnées (syntaxe where de ChromaDB) : chunks portant tous les tags, None sans tag"""
+    clauses = [{tag_field(tag): True} for tag in dict.fromkeys(tags) if tag]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def filter_tags(where: Optional[Dict[str, Any]]) -> List[str]:
+    """Tags exigés par un filtre produit par tag_filter (ValueError pour tout autre filtre)"""
+    if not where:
+        return []
+    tags = []
+    for key, value in where.items():
+        if key == "$and":
+            for clause in value:
+                tags.extend(filter_tags(clause))
+        elif key.startswith(TAG_FIELD_PREFIX) and value in (True, {"$eq": True}):
+            tags.append(key[len(TAG_FIELD_PREFIX):])
+        else:
+            raise ValueError(f"Filtre non supporté (seuls les tags sont filtrables): {key}")
+    return tags
+
+
+class TagIndex:
+    """Index inversé en mémoire : tag -> ids de chunks ordonnés + contenu des documents"""
+
+    def __init__(self):
+        # tag -> ids dans l'ordre d'insertion (dict utilisé comme ensemble ordonné)
+        self._postings: Dict[str, Dict[str, None]] = {}
+        # id -> (contenu, métadonnées)
+        self._documents: Dict[str, tuple] = {}
+        # Empreinte du contenu indexé (XOR des empreintes des chunks, indépendante de l'ordre)
+        self._fingerprint = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @property
+    def version(self) -> str:
+        """Version du contenu indexé : change dès qu'un chunk est ajouté, modifié ou retiré"""
+        with self._lock:
+            return f"{self._fingerprint:016x}-{len(self._documents)}"
+
+    @staticmethod
+    def _chunk_fingerprint(chunk_id: str, content: str, metadata: Dict[str, Any]) -> int:
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(chunk_id.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update((content or "").encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(metadata.get('tags', '')).encode("utf-8"))
+        return int.from_bytes(digest.digest(), "big")
+
+    def clear(self):
+        """Vide l'index"""
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._fingerprint = 0
+
+    def build_from_collection(self, collection, batch_size: int = 5000) -> int:
+        """Reconstruit l'index à partir d'une collection ChromaDB (lecture paginée)"""
+        try:
+            total = collection.count()
+            with self._lock:
+                self.clear()
+                for offset in range(0, total, batch_size):
+                    results = collection.get(
+                        include=["documents", "metadatas"],
+                        limit=batch_size,
+                        offset=offset
+                    )
+                    self._add_rows(
+                        results.get('ids', []),
+                        results.get('documents', []),
+                        results.get('metadatas', [])
+                    )
+
+            logger.info(f"🏷️ Index de tags construit: {len(self)} chunks, {len(self._postings)} tags")
+            return len(self)
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la construction de l'index de tags: {e}")
+            raise
+
+    def add_documents(self, ids: List[str], documents: List[Document]):
+        """Ajoute (ou remplace) des documents dans l'index"""
+        if len(ids) != len(documents):
+            raise ValueError("Le nombre d'ids ne correspond pas au nombre de documents")
+
+        with self._lock:
+            self._add_rows(
+                ids,
+                [doc.page_content for doc in documents],
+                [doc.metadata for doc in documents]
+            )
+
+    def remove(self, ids: Iterable[str]):
+        """Retire des chunks de l'index"""
+        with self._lock:
+            for chunk_id in ids:
+                entry = self._documents.pop(chunk_id, None)
+                if entry is None:
+                    continue
+                self._fingerprint ^= self._chunk_fingerprint(chunk_id, entry[0], entry[1])
+                for tag in parse_tags(entry[1]):
+                    postings = self._postings.get(tag)
+                    if postings is not None:
+                        postings.pop(chunk_id, None)
+                        if not postings:
+                            del self._postings[tag]
+
+    def get(self, tag: str, limit: Optional[int] = None) -> List[Document]:
+        """Retourne les documents portant un tag, dans l'ordre d'insertion"""
+        with self._lock:
+            postings = self._postings.get(tag)
+            if not postings:
+                return []
+
+            documents = []
+            for chunk_id in islice(postings, limit):
+                content, metadata = self._documents[chunk_id]
+                documents.append(Document(page_content=content, metadata=dict(metadata)))
+            return documents
+
+    def count(self, tag: str) -> int:
+        """Nombre de chunks portant un tag"""
+        with self._lock:
+            return len(self._postings.get(tag, ()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques de l'index"""
+        with self._lock:
+            return {
+                "chunks": len(self._documents),
+                "version": self.version,
+                "tags": {tag: len(ids) for tag, ids in self._postings.items()}
+            }
+
+    def _add_rows(self, ids: List[str], contents: List[str], metadatas: List[Dict[str, Any]]):
+        """Insère des lignes brutes (verrou déjà acquis)"""
+        for chunk_id, content, metadata in zip(ids, contents, metadatas):
+            if chunk_id in self._documents:
+                self.remove([chunk_id])
+
+            metadata = metadata or {}
+            self._documents[chunk_id] = (content, metadata)
+            self._fingerprint ^= self._chunk_fingerprint(chunk_id, content, metadata)
+            for tag in parse_tags(metadata):
+                self._postings.setdefault(tag, {})[chunk_id] = None
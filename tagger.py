@@ -0,0 +1,234 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+from tag_index import TAG_FIELD_PREFIX, tag_fields
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tagging_rules.json")
+
+# Format des métadonnées de tags écrites par tag_documents (inclus dans l'empreinte : un changement
+# de format ré-étiquette la base à la prochaine synchronisation)
+# 2 : un champ booléen tag_<nom> par tag en plus de la chaîne 'tags'
+TAG_METADATA_VERSION = 2
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Expression régulière factorisée en trie (préfixes communs partagés, plus long d'abord)"""
+    trie: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        pattern = "(?:" + "|".join(branches) + ")"
+        return pattern + "?" if "" in node else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Recherche simultanée de groupes de mots-clés avec la sémantique de `any(mot in texte)` :
+    match() retourne le masque des groupes dont au moins un mot-clé apparaît dans le texte.
+
+    Stratégie "regex" : tous les mots-clés sont compilés en une seule expression factorisée en trie,
+    parcourue en une passe ; chaque position de départ est examinée une fois (reprise à start + 1)
+    et le mot-clé le plus long trouvé crédite aussi ses préfixes, les occurrences qui se chevauchent
+    ne sont donc pas perdues. Le parcours s'arrête dès que tous les groupes sont trouvés.
+
+    Stratégie "substring" (sur demande) : un test `in` par mot-clé, un parcours du texte par mot-clé.
+    Pour quelques dizaines de mots-clés, la recherche de sous-chaîne de CPython reste plus rapide, mais
+    son coût croît avec le nombre de règles alors que celui de "regex" en dépend peu (voir bench_tagger.py).
+    """
+
+    def __init__(self, groups: Sequence[Iterable[str]], strategy: str = "regex"):
+        self.groups = [list(dict.fromkeys(keyword for keyword in group if keyword)) for group in groups]
+        self.full_mask = (1 << len(self.groups)) - 1
+
+        # mot-clé -> masque des groupes qui le contiennent
+        masks: Dict[str, int] = {}
+        for index, group in enumerate(self.groups):
+            for keyword in group:
+                masks[keyword] = masks.get(keyword, 0) | (1 << index)
+
+        # Fermeture par préfixe : trouver "paiement" vaut aussi pour un mot-clé "paie"
+        self._masks = {
+            keyword: mask | self._prefix_mask(keyword, masks)
+            for keyword, mask in masks.items()
+        }
+
+        if strategy not in ("regex", "substring"):
+            raise ValueError(f"Stratégie de recherche inconnue: {strategy}")
+        self.strategy = strategy
+        self._regex = re.compile(_trie_pattern(masks)) if masks else None
+
+    @staticmethod
+    def _prefix_mask(keyword: str, masks: Dict[str, int]) -> int:
+        mask = 0
+        for length in range(1, len(keyword)):
+            mask |= masks.get(keyword[:length], 0)
+        return mask
+
+    def __len__(self) -> int:
+        return len(self._masks)
+
+    def match(self, text: str) -> int:
+        """Masque des groupes trouvés dans le texte"""
+        if self.strategy == "substring":
+            return self._match_substring(text)
+        return self._match_regex(text)
+
+    def matches(self, text: str) -> List[int]:
+        """Indices des groupes trouvés dans le texte"""
+        mask = self.match(text)
+        return [index for index in range(len(self.groups)) if mask >> index & 1]
+
+    def _match_regex(self, text: str) -> int:
+        if self._regex is None:
+            return 0
+        search = self._regex.search
+        masks = self._masks
+        full_mask = self.full_mask
+        mask = 0
+        position = 0
+        while True:
+            found = search(text, position)
+            if found is None:
+                return mask
+            mask |= masks[found.group()]
+            if mask == full_mask:
+                return mask
+            position = found.start() + 1
+
+    def _match_substring(self, text: str) -> int:
+        mask = 0
+        for index, group in enumerate(self.groups):
+            for keyword in group:
+                if keyword in text:
+                    mask |= 1 << index
+                    break
+        return mask
+
+
+class Tagger:
+    """
+    Étiquetage des chunks : règles sur le nom du fichier et sur le contenu, chargées depuis
+    tagging_rules.json et compilées chacune en un KeywordMatcher.
+    """
+
+    def __init__(self, filename_rules: List[Dict[str, Any]], content_rules: List[Dict[str, Any]],
+                 default_tag: str = "general", content_types: Optional[Dict[str, str]] = None,
+                 default_content_type: str = "general"):
+        self.filename_rules = filename_rules
+        self.content_rules = content_rules
+        self.default_tag = default_tag
+        # tag -> type de contenu (le premier tag présent l'emporte)
+        self.content_types = content_types or {}
+        self.default_content_type = default_content_type
+
+        self._filename_matcher = KeywordMatcher([rule["keywords"] for rule in filename_rules])
+        self._content_matcher = KeywordMatcher([rule["keywords"] for rule in content_rules])
+        # Caches : nom de fichier -> masque, (masque fichier, masque contenu) -> résultat
+        self._filename_masks: Dict[str, int] = {}
+        self._results: Dict[Tuple[int, int], Tuple[List[str], str]] = {}
+        self.fingerprint = hashlib.sha256(json.dumps(
+            {"metadata_version": TAG_METADATA_VERSION, **self.to_config()}, sort_keys=True
+        ).encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "Tagger":
+        return cls(
+            filename_rules=config.get("filename_rules", []),
+            content_rules=config.get("content_rules", []),
+            default_tag=config.get("default_tag", "general"),
+            content_types=config.get("content_types", {}),
+            default_content_type=config.get("default_content_type", "general")
+        )
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_RULES_PATH) -> "Tagger":
+        """Charge les règles depuis un fichier JSON"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_config(json.load(f))
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du chargement des règles de tags {path}: {e}")
+            raise
+
+    def to_config(self) -> Dict[str, Any]:
+        return {
+            "filename_rules": self.filename_rules,
+            "content_rules": self.content_rules,
+            "default_tag": self.default_tag,
+            "content_types": self.content_types,
+            "default_content_type": self.default_content_type
+        }
+
+    def tag(self, source_file: str, content: str) -> Tuple[List[str], str]:
+        """Retourne (tags triés, type de contenu) ; le contenu est comparé en minuscules"""
+        filename_mask = self._filename_masks.get(source_file)
+        if filename_mask is None:
+            filename_mask = self._filename_matcher.match(source_file)
+            if len(self._filename_masks) < 100_000:
+                self._filename_masks[source_file] = filename_mask
+        key = (filename_mask, self._content_matcher.match(content.lower()))
+
+        result = self._results.get(key)
+        if result is None:
+            result = self._resolve(*key)
+            self._results[key] = result
+        return list(result[0]), result[1]
+
+    def _resolve(self, filename_mask: int, content_mask: int) -> Tuple[List[str], str]:
+        """Tags et type de contenu correspondant à une combinaison de règles"""
+        tags = set()
+        for index, rule in enumerate(self.filename_rules):
+            if filename_mask >> index & 1:
+                tags.update(rule["tags"])
+        for index, rule in enumerate(self.content_rules):
+            if content_mask >> index & 1:
+                tags.update(rule["tags"])
+
+        content_type = next(
+            (value for tag, value in self.content_types.items() if tag in tags),
+            self.default_content_type
+        )
+        return (sorted(tags) if tags else [self.default_tag]), content_type
+
+    def tag_documents(self, texts: List[Document]) -> List[Document]:
+        """Ajoute les tags et le type de contenu aux métadonnées des chunks"""
+        for text in texts:
+            source_file = os.path.basename(text.metadata.get('source', ''))
+            tags, content_type = self.tag(source_file, text.page_content)
+            # Les métadonnées ChromaDB sont scalaires : chaîne pour l'affichage, un booléen par tag pour filtrer
+            for key in [key for key in text.metadata if key.startswith(TAG_FIELD_PREFIX)]:
+                del text.metadata[key]
+            text.metadata['tags'] = ','.join(tags)
+            text.metadata.update(tag_fields(tags))
+            text.metadata['content_type'] = content_type
+        return texts
+
+
+_default_tagger: Optional[Tagger] = None
+
+
+def get_default_tagger() -> Tagger:
+    """Tagger partagé (règles de TAGGING_RULES_PATH ou tagging_rules.json), chargé une fois par processus"""
+    global _default_tagger
+    if _default_tagger is None:
+        _default_tagger = Tagger.from_file(os.getenv("TAGGING_RULES_PATH", DEFAULT_RULES_PATH))
+    return _default_tagger
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Script de test des stockages de sessions (SessionStore) : même scénario sur SQLite et sur le backend
+Redis, ce dernier exécuté contre un faux serveur Redis en mémoire (protocole RESP, lancé dans le
+processus) : aucun serveur à démarrer. Vérifie aussi le partage entre réplicas, les listes plafonnées,
+l'expiration par TTL et les écritures concurrentes sur une même session.
+"""
+
+import fnmatch
+import os
+import socketserver
+import tempfile
+import threading
+import time
+
+from redis_session_store import RedisSessionStore
+from session_manager import SessionManager
+from session_store import SessionStore, encode_session_cursor
+
+
+class FakeRedisServer:
+    """
+    Faux serveur Redis en mémoire, limité aux commandes du RedisSessionStore (hash, listes, ensembles
+    triés, expiration, WATCH/MULTI/EXEC). advance(secondes) avance son horloge pour tester les TTL.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.versions = {}
+        self.offset = 0.0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                state = {"watched": {}, "queue": None}
+                while True:
+                    command = server.read_command(self.rfile)
+                    if command is None:
+                        return
+                    self.wfile.write(server.encode(server.dispatch(command, state)))
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"redis://127.0.0.1:{self.server.server_address[1]}/0"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def advance(self, seconds: float):
+        with self.lock:
+            self.offset += seconds
+
+    # Protocole
+
+    @staticmethod
+    def read_command(reader):
+        line = reader.readline()
+        if not line:
+            return None
+        count = int(line[1:])
+        command = []
+        for _ in range(count):
+            length = int(reader.readline()[1:])
+            command.append(reader.read(length + 2)[:-2].decode("utf-8"))
+        return command
+
+    def encode(self, value) -> bytes:
+        if isinstance(value, Exception):
+            return f"-{value}\r\n".encode()
+        if isinstance(value, tuple):  # réponse simple (+OK)
+            return f"+{value[0]}\r\n".encode()
+        if isinstance(value, bool) or isinstance(value, int):
+            return f":{int(value)}\r\n".encode()
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, list):
+            return f"*{len(value)}\r\n".encode() + b"".join(self.encode(item) for item in value)
+        data = str(value).encode("utf-8")
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    # Données
+
+    def now(self) -> float:
+        return time.time() + self.offset
+
+    def touch(self, key: str):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def get(self, key: str, kind, create: bool = False):
+        expire = self.expires.get(key)
+        if expire is not None and expire <= self.now():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+            self.touch(key)
+        value = self.data.get(key)
+        if value is None and create:
+            value = self.data[key] = kind()
+        if value is not None and not isinstance(value, kind):
+            raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def dispatch(self, command, state):
+        name, args = command[0].upper(), command[1:]
+        with self.lock:
+            if state["queue"] is not None and name not in ("EXEC", "DISCARD", "MULTI", "WATCH"):
+                state["queue"].append((name, args))
+                return ("QUEUED",)
+            if name == "MULTI":
+                state["queue"] = []
+                return ("OK",)
+            if name == "DISCARD":
+                state["queue"], state["watched"] = None, {}
+                return ("OK",)
+            if name == "WATCH":
+                for key in args:
+                    self.get(key, object)
+                    state["watched"][key] = self.versions.get(key, 0)
+                return ("OK",)
+            if name == "UNWATCH":
+                state["watched"] = {}
+                return ("OK",)
+            if name == "EXEC":
+                queue, watched = state["queue"], state["watched"]
+                state["queue"], state["watched"] = None, {}
+                for key, version in watched.items():
+                    self.get(key, object)
+                    if self.versions.get(key, 0) != version:
+                        return None
+                return [self.run(queued, queued_args) for queued, queued_args in queue]
+            return self.run(name, args)
+
+    def run(self, name, args):
+        try:
+            return getattr(self, f"cmd_{name.lower()}")(*args)
+        except AttributeError:
+            return Exception(f"ERR unknown command '{name}'")
+        except (TypeError, ValueError) as e:
+            return Exception(str(e))
+
+    def cmd_ping(self):
+        return ("PONG",)
+
+    def cmd_select(self, db):
+        return ("OK",)
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self.get(key, object) is not None)
+
+    def cmd_del(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self.get(key, object) is not None:
+                del self.data[key]
+                self.expires.pop(key, None)
+                self.touch(key)
+                deleted += 1
+        return deleted
+
+    def cmd_keys(self, pattern):
+        return [key for key in list(self.data) if self.get(key, object) is not None and fnmatch.fnmatch(key, pattern)]
+
+    def cmd_expire(self, key, seconds):
+        if self.get(key, object) is None:
+            return 0
+        self.expires[key] = self.now() + int(seconds)
+        self.touch(key)
+        return 1
+
+    def cmd_ttl(self, key):
+        if self.get(key, object) is None:
+            return -2
+        expire = self.expires.get(key)
+        return -1 if expire is None else int(expire - self.now())
+
+    def cmd_hset(self, key, *pairs):
+        values = self.get(key, dict, create=True)
+        added = sum(1 for field in pairs[::2] if field not in values)
+        values.update(zip(pairs[::2], pairs[1::2]))
+        self.touch(key)
+        return added
+
+    def cmd_hget(self, key, field):
+        return (self.get(key, dict) or {}).get(field)
+
+    def cmd_hmget(self, key, *fields):
+        values = self.get(key, dict) or {}
+        return [values.get(field) for field in fields]
+
+    def cmd_hincrby(self, key, field, amount):
+        values = self.get(key, dict, create=True)
+        values[field] = str(int(values.get(field, 0)) + int(amount))
+        self.touch(key)
+        return int(values[field])
+
+    def cmd_rpush(self, key, *items):
+        values = self.get(key, list, create=True)
+        values.extend(items)
+        self.touch(key)
+        return len(values)
+
+    @staticmethod
+    def _range(length, start, stop):
+        start, stop = int(start), int(stop)
+        start = max(start + length, 0) if start < 0 else start
+        stop = stop + length if stop < 0 else min(stop, length - 1)
+        return start, stop
+
+    def cmd_lrange(self, key, start, stop):
+        values = self.get(key, list) or []
+        start, stop = self._range(len(values), start, stop)
+        return values[start:stop + 1]
+
+    def cmd_ltrim(self, key, start, stop):
+        values = self.get(key, list)
+        if values is not None:
+            start, stop = self._range(len(values), start, stop)
+            values[:] = values[start:stop + 1]
+            self.touch(key)
+        return ("OK",)
+
+    def cmd_llen(self, key):
+        return len(self.get(key, list) or [])
+
+    def cmd_zadd(self, key, *pairs):
+        values = self.get(key, dict, create=True)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in values
+            values[member] = float(score)
+        self.touch(key)
+        return added
+
+    def cmd_zrem(self, key, *members):
+        values = self.get(key, dict) or {}
+        removed = sum(1 for member in members if values.pop(member, None) is not None)
+        self.touch(key)
+        return removed
+
+    def _sorted(self, key):
+        return sorted((self.get(key, dict) or {}).items(), key=lambda item: (item[1], item[0]))
+
+    def cmd_zrevrange(self, key, start, stop):
+        members = [member for member, _ in reversed(self._sorted(key))]
+        start, stop = self._range(len(members), start, stop)
+        return members[start:stop + 1]
+
+    def cmd_zrevrangebyscore(self, key, high, low, *options):
+        members = [(member, score) for member, score in reversed(self._sorted(key))
+                   if float(low) <= score <= float(high)]
+        if "LIMIT" in options:
+            offset, count = (int(value) for value in options[options.index("LIMIT") + 1:][:2])
+            members = members[offset:offset + count]
+        if "WITHSCORES" in options:
+            return [value for member, score in members for value in (member, repr(score))]
+        return [member for member, _ in members]
+
+    def cmd_zrangebyscore(self, key, low, high):
+        return [member for member, score in self._sorted(key) if float(low) <= score <= float(high)]
+
+    def cmd_zremrangebyscore(self, key, low, high):
+        members = self.cmd_zrangebyscore(key, low, high)
+        return self.cmd_zrem(key, *members) if members else 0
+
+
+def check_store(store, label: str):
+    """Scénario commun aux deux backends"""
+    print(f"\n🧪 {label}")
+    session_id = store.create_session("Test store", {"source": "test"})
+    assert store.session_exists(session_id)
+    assert store.get_session_info(session_id)["title"] == "Test store"
+    assert store.get_session_history(session_id, limit=1) == []
+
+    ids = []
+    for turn in range(30):
+        ids.append(store.add_message(session_id, "user", f"Question {turn} sur la livraison"))
+        ids.append(store.add_message(session_id, "assistant",
+                                     '{"template": "centered", "components": [{"type": "Heading", '
+                                     f'"props": {{"children": "Réponse {turn}"}}}}]}}'))
+    assert ids == sorted(ids) and len(set(ids)) == 60
+
+    tail = store.get_session_history(session_id, limit=4)
+    assert [message["content"] for message in tail][-2] == "Question 29 sur la livraison"
+    page = store.get_session_history(session_id, limit=4, before_id=tail[0]["id"])
+    assert page[-1]["id"] < tail[0]["id"] and len(page) == 4
+    print(f"✅ Historique: fin et page précédente ({tail[0]['id']} -> {page[0]['id']})")
+
+    context = store.get_session_context(session_id, max_messages=2)
+    assert "Réponse 29" in context and "Résumé des échanges précédents" in context
+    print(f"✅ Contexte: {len(context)} caractères")
+
+    assert store.update_session_title(session_id, "Nouveau titre")
+    assert store.get_session_info(session_id)["title"] == "Nouveau titre"
+    listed = {session["id"]: session for session in store.get_sessions()}
+    assert listed[session_id]["message_count"] == 60 and listed[session_id]["metadata"] == {"source": "test"}
+    assert listed[session_id]["last_message_at"] is not None
+    print("✅ Titre et liste des sessions")
+
+    others = [store.create_session(f"Autre {index}") for index in range(5)]
+    store.add_message(others[0], "user", "Bonjour")
+    seen, cursor = [], None
+    while True:
+        page = store.get_sessions(limit=2, cursor=cursor)
+        seen += [session["id"] for session in page]
+        if len(page) < 2:
+            break
+        cursor = encode_session_cursor(page[-1])
+    assert sorted(seen) == sorted([session_id, *others])
+    assert [session["id"] for session in store.get_sessions(title="autre 3")] == [others[3]]
+    assert {session["id"] for session in store.get_sessions(min_messages=1)} == {session_id, others[0]}
+    assert store.get_sessions(updated_after="2999-01-01 00:00:00") == []
+    for invalid in ("2024-1-5", "2024-01-05", "2024-01-05 1:00:00"):
+        try:
+            store.get_sessions(updated_after=invalid)
+            raise AssertionError(f"updated_after={invalid} accepté")
+        except ValueError:
+            pass
+    for other in others:
+        store.delete_session(other)
+    print(f"✅ Liste paginée par curseur ({len(seen)} sessions par pages de 2) et filtres")
+
+    assert store.delete_session(session_id) and not store.session_exists(session_id)
+    assert store.get_session_context(session_id) == "" and store.get_session_info(session_id) is None
+    assert not store.update_session_title(session_id, "x")
+    print("✅ Suppression")
+
+
+def test_sqlite_store():
+    with tempfile.TemporaryDirectory() as workdir:
+        store = SessionManager(os.path.join(workdir, "sessions.db"))
+        check_store(store, "SQLite")
+        store.close()
+
+
+def test_incomplete_store():
+    class PartialStore(SessionStore):
+        backend = "partial"
+
+        def create_session(self, title: str = None, metadata=None) -> str:
+            return "session"
+
+    try:
+        PartialStore()
+    except TypeError as e:
+        print(f"✅ Backend incomplet refusé à la construction ({e})")
+    else:
+        raise AssertionError("Un backend sans toutes les méthodes de SessionStore a été instancié")
+
+
+def test_redis_store():
+    server = FakeRedisServer()
+    try:
+        check_store(RedisSessionStore(server.url), "Redis (faux serveur)")
+    finally:
+        server.close()
+
+
+def test_redis_replicas_and_limits():
+    print("\n🧪 Redis : réplicas, listes plafonnées, TTL, écritures concurrentes")
+    server = FakeRedisServer()
+    try:
+        first = RedisSessionStore(server.url, ttl_seconds=60, max_messages=10)
+        second = RedisSessionStore(server.url, ttl_seconds=60, max_messages=10)
+
+        session_id = first.create_session()
+        for turn in range(25):
+            (first if turn % 2 else second).add_message(session_id, "user", f"Message {turn}")
+        history = second.get_session_history(session_id, limit=50)
+        assert [message["id"] for message in history] == list(range(16, 26))
+        assert "Message 24" in first.get_session_context(session_id, 1)
+        print(f"✅ Deux réplicas, liste plafonnée à 10 messages ({len(history)} gardés sur 25)")
+
+        concurrent = first.create_session()
+
+        def writer(store, index):
+            for turn in range(20):
+                store.add_message(concurrent, "user", f"{index}-{turn}")
+
+        threads = [threading.Thread(target=writer, args=(store, index))
+                   for index, store in enumerate((first, second, first, second))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        info = {session["id"]: session for session in first.get_sessions()}[concurrent]
+        history = first.get_session_history(concurrent, limit=10)
+        assert info["message_count"] == 80 and [message["id"] for message in history] == list(range(71, 81))
+        conflicts = first.get_stats()["conflicts"] + second.get_stats()["conflicts"]
+        print(f"✅ 80 écritures concurrentes sans perte ({conflicts} transactions rejouées)")
+
+        server.advance(30)
+        first.add_message(session_id, "user", "Toujours active")
+        server.advance(45)
+        assert first.session_exists(session_id) and not first.session_exists(concurrent)
+        assert [session["id"] for session in second.get_sessions()] == [session_id]
+        print("✅ Expiration par TTL (session inactive supprimée, session active prolongée)")
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    try:
+        test_sqlite_store()
+        test_incomplete_store()
+        test_redis_store()
+        test_redis_replicas_and_limits()
+        print("\n✅ Tous les tests des stockages de sessions sont passés")
+    except AssertionError as e:
+        print(f"❌ Test échoué: {e!r}")
+        raise